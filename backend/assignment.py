@@ -0,0 +1,263 @@
+# Capacity-constrained mentee -> mentor assignment.
+# Given a (mentees x mentors) score matrix and per-mentor capacities, every solver
+# returns an array with one mentor index per mentee (-1 when no valid slot is left)
+# that never exceeds a capacity and never uses a pair scored -inf (excluded).
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("auto", "optimal", "greedy")
+
+# "auto" solves exactly up to this many mentee x mentor cells and greedily beyond;
+# about 1.5s for 2000 mentees x 700 mentors of capacity 3 (python -m benchmarks.assignment)
+OPTIMAL_MAX_CELLS = 2_000_000
+
+
+def _capacities(capacities, n_mentors):
+    """Non-negative int64 copy of the per-mentor capacities"""
+    return np.broadcast_to(np.asarray(capacities, dtype=np.int64), (n_mentors,)).clip(min=0).copy()
+
+
+def total_score(scores, assignment):
+    """Sum of the scores of the assigned pairs"""
+    assignment = np.asarray(assignment)
+    assigned = np.flatnonzero(assignment >= 0)
+    return float(scores[assigned, assignment[assigned]].sum())
+
+
+def assign_greedy(scores, capacities):
+    """
+    Approximate assignment in rounds: every open mentee proposes to its best open
+    mentor and each mentor keeps its highest-scoring proposals up to its capacity
+
+    Every round is a handful of vectorized passes over the open rows, so a
+    5000 x 5000 cohort takes a fraction of a second.
+
+    Args:
+        scores: Array of shape (n_mentees, n_mentors)
+        capacities: Per-mentor capacity, or one capacity for every mentor
+
+    Returns:
+        Array with the mentor index for each mentee, -1 where none was left
+    """
+    n_mentees, n_mentors = scores.shape
+    assignment = np.full(n_mentees, -1, dtype=np.int64)
+    remaining = _capacities(capacities, n_mentors)
+    if n_mentees == 0 or n_mentors == 0:
+        return assignment
+
+    open_rows = np.arange(n_mentees)
+    while len(open_rows) and remaining.any():
+        block = scores[open_rows]
+        block = np.where(remaining > 0, block, -np.inf)
+        choice = block.argmax(axis=1)
+        best = block[np.arange(len(open_rows)), choice]
+        valid = np.isfinite(best)
+        # Rows with no finite open pair left can never be placed
+        open_rows, choice, best = open_rows[valid], choice[valid], best[valid]
+        if not len(open_rows):
+            break
+
+        # Rank the proposals to each mentor, best first (stable on mentee order for ties)
+        order = np.lexsort((open_rows, -best, choice))
+        sorted_choice = choice[order]
+        group_start = np.searchsorted(sorted_choice, sorted_choice, side="left")
+        rank = np.arange(len(order)) - group_start
+        accepted = order[rank < remaining[sorted_choice]]
+
+        assignment[open_rows[accepted]] = choice[accepted]
+        remaining -= np.bincount(choice[accepted], minlength=n_mentors)
+        open_rows = np.setdiff1d(open_rows, open_rows[accepted], assume_unique=True)
+    return assignment
+
+
+def _costs_with_dummy(scores):
+    """
+    Minimization costs with an extra "unassigned" column
+
+    Real pairs cost (best - score) and the dummy column costs more than any chain of
+    reassignments could save, so the solver places as many mentees as possible
+    before it maximizes the total score. Excluded pairs cost inf.
+    """
+    n_mentees = scores.shape[0]
+    finite = np.isfinite(scores)
+    if finite.any():
+        high, low = float(scores[finite].max()), float(scores[finite].min())
+    else:
+        high = low = 0.0
+    costs = np.empty((n_mentees, scores.shape[1] + 1), dtype=np.float64)
+    costs[:, :-1] = np.where(finite, high - scores, np.inf)
+    costs[:, -1] = (high - low + 1.0) * (n_mentees + 1)
+    return costs
+
+
+def _hungarian(scores, capacities):
+    """
+    Exact assignment with the shortest augmenting path (Hungarian) method
+
+    Mentees are added one at a time. A mentor with open slots ends a path; a full
+    mentor brings all of its current mentees into the search tree at once, which is
+    the same as expanding it into identical slot columns without the memory cost.
+    Potential updates are applied lazily so each step is O(mentors).
+    """
+    n_mentees, n_mentors = scores.shape
+    costs = _costs_with_dummy(scores)
+    costs[:, :n_mentors][:, capacities == 0] = np.inf
+    dummy = n_mentors
+    remaining = np.append(capacities, n_mentees).astype(np.int64)
+    column_rows = [[] for _ in range(n_mentors + 1)]
+    assignment = np.full(n_mentees, -1, dtype=np.int64)
+    u = np.zeros(n_mentees)
+    v = np.zeros(n_mentors + 1)
+
+    for start in range(n_mentees):
+        # Slack of each unused column (inf once used), offset by the total potential change
+        slack = np.full(n_mentors + 1, np.inf)
+        blocked = np.zeros(n_mentors + 1)
+        way = np.full(n_mentors + 1, -1, dtype=np.int64)
+        offset = 0.0
+        tree_rows = {start: 0.0}
+        used_columns = {}
+        rows = [start]
+        while True:
+            for row in rows:
+                candidate = costs[row] - v
+                candidate += blocked
+                candidate += offset - u[row]
+                better = candidate < slack
+                np.copyto(slack, candidate, where=better)
+                np.copyto(way, row, where=better)
+
+            column = int(slack.argmin())
+            offset = float(slack[column])
+            slack[column] = blocked[column] = np.inf
+            used_columns[column] = offset
+            if remaining[column] > 0:
+                break
+            rows = column_rows[column]
+            for row in rows:
+                tree_rows[row] = offset
+
+        for row, entered in tree_rows.items():
+            u[row] += offset - entered
+        for used_column, entered in used_columns.items():
+            v[used_column] -= offset - entered
+
+        # Shift every mentee along the path one column over
+        remaining[column] -= 1
+        while True:
+            row = int(way[column])
+            previous = int(assignment[row])
+            assignment[row] = column
+            column_rows[column].append(row)
+            if row == start:
+                break
+            column_rows[previous].remove(row)
+            column = previous
+
+    assignment[assignment == dummy] = -1
+    return assignment
+
+
+def assign_optimal(scores, capacities):
+    """
+    Maximum-total-score assignment that places as many mentees as capacity allows
+
+    Args:
+        scores: Array of shape (n_mentees, n_mentors); -inf marks an excluded pair
+        capacities: Per-mentor capacity, or one capacity for every mentor
+
+    Returns:
+        Array with the mentor index for each mentee, -1 where none was left
+    """
+    n_mentees, n_mentors = scores.shape
+    capacities = _capacities(capacities, n_mentors)
+    if n_mentees == 0 or n_mentors == 0 or not capacities.any():
+        return np.full(n_mentees, -1, dtype=np.int64)
+    return _hungarian(np.asarray(scores, dtype=np.float64), capacities)
+
+
+def solve(scores, capacities, method="auto"):
+    """
+    Assign mentees with the given method
+
+    Args:
+        method: "optimal", "greedy", or "auto" (optimal up to OPTIMAL_MAX_CELLS cells)
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown assignment method: {method}. Use one of: {', '.join(METHODS)}")
+    if method == "auto":
+        method = "optimal" if scores.size <= OPTIMAL_MAX_CELLS else "greedy"
+    if method == "optimal":
+        return assign_optimal(scores, capacities)
+    return assign_greedy(scores, capacities)
+
+
+def find_violations(scores, capacities, assignment):
+    """
+    Constraint violations in a proposed assignment
+
+    Returns:
+        Dict with "invalid" (mentee indexes whose mentor is out of range or excluded)
+        and "over_capacity" (mentor index -> number of mentees above capacity)
+    """
+    n_mentees, n_mentors = scores.shape
+    capacities = _capacities(capacities, n_mentors)
+    assignment = np.asarray(assignment, dtype=np.int64)
+    placed = assignment >= 0
+    invalid = placed & (assignment >= n_mentors)
+    in_range = placed & ~invalid
+    rows = np.flatnonzero(in_range)
+    invalid[rows[~np.isfinite(scores[rows, assignment[rows]])]] = True
+
+    load = np.bincount(assignment[placed & ~invalid], minlength=n_mentors)
+    over = np.flatnonzero(load > capacities)
+    return {
+        "invalid": np.flatnonzero(invalid).tolist(),
+        "over_capacity": {int(j): int(load[j] - capacities[j]) for j in over}
+    }
+
+
+def repair(scores, capacities, proposed, method="auto"):
+    """
+    Make a proposed (e.g. LLM-generated) assignment satisfy the constraints
+
+    Invalid pairs are dropped, over-capacity mentors keep their highest-scoring
+    mentees, and every mentee left without a mentor is assigned with the remaining
+    capacity using the given method.
+
+    Args:
+        proposed: Mentor index per mentee, -1 for none
+
+    Returns:
+        Tuple of (assignment, report) where report counts "invalid", "over_capacity"
+        and "filled" mentees
+    """
+    n_mentees, n_mentors = scores.shape
+    capacities = _capacities(capacities, n_mentors)
+    assignment = np.asarray(proposed, dtype=np.int64).copy()
+    violations = find_violations(scores, capacities, assignment)
+    assignment[violations["invalid"]] = -1
+
+    dropped = 0
+    for mentor_idx, excess in violations["over_capacity"].items():
+        members = np.flatnonzero(assignment == mentor_idx)
+        weakest = members[np.argsort(scores[members, mentor_idx], kind="stable")[:excess]]
+        assignment[weakest] = -1
+        dropped += len(weakest)
+
+    open_rows = np.flatnonzero(assignment < 0)
+    filled = 0
+    if len(open_rows):
+        remaining = capacities - np.bincount(assignment[assignment >= 0], minlength=n_mentors)
+        fill = solve(scores[open_rows], remaining, method)
+        assignment[open_rows] = fill
+        filled = int((fill >= 0).sum())
+
+    report = {"invalid": len(violations["invalid"]), "over_capacity": dropped, "filled": filled}
+    if report["invalid"] or report["over_capacity"]:
+        logger.warning(f"Repaired proposed assignment: {report}")
+    return assignment, report
@@ -0,0 +1,339 @@
+# Latency, throughput and memory of the API hot paths, tracked for regressions.
+# Run from backend/ with:  python -m benchmarks.api [--quick] [--only process_file] [--save FILE] [--compare FILE]
+# Every case runs in a fresh interpreter that serves the Flask app in process with the
+# deterministic fake LLM (no network) and the storage backend picked with --backend
+# (memory by default; sqlite, or firestore with FIREBASE_CREDENTIALS_PATH set, ideally
+# against the emulator), and drives one route from a pool of client threads:
+#   process_file         synthetic PDF and DOCX resumes of 1-200 pages
+#   generate_matches     cohorts of 10 to 10,000 mentees, matched locally with LLM-written reasons
+#   update_match_status  random status changes on a large set of matches; with sqlite they come from
+#                        a mentorship_matches.json imported on first start, as for old deployments
+#   check_signup_status  concurrent lookups of existing and unknown users
+# Peak RSS covers the case's interpreter and its parse workers. A saved baseline records
+# the backend it was taken with and is only compared against runs on the same backend.
+# --compare exits with status 1 when a case is slower or larger than the baseline by more
+# than --tolerance; tail latencies of the threaded cases are noisy, so gate with --runs 3 or more.
+
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ("process_file", "generate_matches", "update_match_status", "check_signup_status")
+
+BACKENDS = ("memory", "sqlite", "firestore")
+
+MAJORS = ["Computer Science", "Biology", "Economics", "History", "Neuroscience", "Engineering", "Psychology"]
+
+
+def cases(quick=False):
+    """Every benchmark case as a dict of its scenario and parameters"""
+    page_counts = (1, 50) if quick else (1, 10, 50, 200)
+    cohort_sizes = (10, 100, 1000) if quick else (10, 100, 1000, 10000)
+    result = []
+    for file_format in ("pdf", "docx"):
+        for pages in page_counts:
+            result.append({"scenario": "process_file", "format": file_format, "pages": pages,
+                           "requests": 6 if quick else 20, "concurrency": 4})
+    for mentees in cohort_sizes:
+        result.append({"scenario": "generate_matches", "mentees": mentees, "mentors": max(2, mentees // 3),
+                       "requests": max(1, min(20, 2000 // mentees)), "concurrency": 1})
+    result.append({"scenario": "update_match_status", "matches": 2000 if quick else 20000,
+                   "requests": 200 if quick else 1000, "concurrency": 8})
+    result.append({"scenario": "check_signup_status", "signups": 5000,
+                   "requests": 500 if quick else 2000, "concurrency": 16})
+    return result
+
+
+def case_name(case):
+    params = ",".join(f"{key}={value}" for key, value in case.items()
+                      if key not in ("scenario", "requests", "concurrency"))
+    return f"{case['scenario']}[{params}]"
+
+
+def profiles(rng, kind, count):
+    words = "research software medicine finance policy writing internships graduate lab coding data teaching " \
+            "robotics statistics outreach design chemistry tutoring leadership startups".split()
+    return [{
+        "id": f"{kind}-{i}",
+        "name": f"{kind.title()} {i}",
+        "major": rng.choice(MAJORS),
+        "academicInterests": " ".join(rng.sample(words, 5)),
+        "mentorStrengths": " ".join(rng.sample(words, 3)),
+        "careerGoals": " ".join(rng.sample(words, 4)),
+        "challenges": " ".join(rng.sample(words, 3))
+    } for i in range(count)]
+
+
+# --- runs inside the child interpreter ---
+
+def drive(app, requests, concurrency):
+    """
+    Send every request from a pool of client threads
+
+    Args:
+        requests: List of callables taking a test client and returning a response
+
+    Returns:
+        Dict of request count, errors, throughput and latency percentiles
+    """
+    local = threading.local()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def send(make_request):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        started = time.perf_counter()
+        response = make_request(local.client)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, requests))
+    wall = time.perf_counter() - started
+    values = np.array(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput_rps": len(latencies) / wall,
+        "p50_ms": float(np.percentile(values, 50)) * 1000,
+        "p95_ms": float(np.percentile(values, 95)) * 1000,
+        "p99_ms": float(np.percentile(values, 99)) * 1000
+    }
+
+
+def run_process_file(server01, case, tmp):
+    from benchmarks.documents import make_document
+    document = make_document(case["format"], case["pages"])
+    filename = f"resume.{case['format']}"
+
+    def upload(i):
+        def make_request(client):
+            return client.post("/process-file", content_type="multipart/form-data", data={
+                "file": (io.BytesIO(document), filename),
+                "userId": f"user-{i}",
+                "role": "Mentee" if i % 2 else "Mentor"
+            })
+        return make_request
+
+    # One untimed upload so the parse workers have imported the parsers
+    drive(server01.app, [upload(-1)], 1)
+    return drive(server01.app, [upload(i) for i in range(case["requests"])], case["concurrency"])
+
+
+def run_generate_matches(server01, case, tmp):
+    rng = random.Random(case["mentees"])
+    body = {
+        "mentors": profiles(rng, "mentor", case["mentors"]),
+        "mentees": profiles(rng, "mentee", case["mentees"]),
+        "maxMenteesPerMentor": 3,
+        "saveToDatabase": True
+    }
+
+    def run(i):
+        def make_request(client):
+            return client.post("/generate-matches", json=dict(body, cohort=f"cohort-{i}"))
+        return make_request
+    return drive(server01.app, [run(i) for i in range(case["requests"])], case["concurrency"])
+
+
+def run_update_match_status(server01, case, tmp):
+    import metrics
+    import storage
+    rng = random.Random(case["matches"])
+    matches = [{
+        "id": f"match-{i}", "mentorId": f"mentor-{i % 500}", "menteeId": f"mentee-{i}", "status": "pending",
+        "cohort": "benchmark", "compatibilityScore": rng.randint(50, 100),
+        "matchReason": "Their interests and goals align well. " * 4, "createdAt": "2025-01-01T00:00:00"
+    } for i in range(case["matches"])]
+    if server01.data_store.name == "sqlite":
+        legacy_path = os.path.join(tmp, "mentorship_matches.json")
+        with open(legacy_path, "w") as f:
+            json.dump(matches, f)
+        server01.data_store = metrics.instrument_storage(storage.create_storage(
+            "sqlite", sqlite_path=os.path.join(tmp, "mentorship.db"), legacy_json_path=legacy_path))
+    else:
+        # create_many replaces each "id" with the one the backend stored the match under
+        server01.data_store.matches.create_many(matches)
+
+    def update(match, status):
+        def make_request(client):
+            return client.post("/update-match-status", json={
+                "matchId": match["id"], "status": status, "userId": match["menteeId"]
+            })
+        return make_request
+    requests = [update(rng.choice(matches), rng.choice(("approved", "confirmed", "rejected")))
+                for _ in range(case["requests"])]
+    return drive(server01.app, requests, case["concurrency"])
+
+
+def run_check_signup_status(server01, case, tmp):
+    rng = random.Random(case["signups"])
+    signups = {f"user-{i}": {"userId": f"user-{i}", "mentorshipRole": "Mentee" if i % 3 else "Mentor"}
+               for i in range(case["signups"])}
+    server01.data_store.signups.set_many(signups)
+
+    def check(user_id):
+        def make_request(client):
+            return client.post("/check-signup-status", json={"userId": user_id})
+        return make_request
+    # Half the lookups are for users who never signed up, which also check their matches
+    user_ids = [f"user-{rng.randrange(case['signups'] * 2)}" for _ in range(case["requests"])]
+    return drive(server01.app, [check(user_id) for user_id in user_ids], case["concurrency"])
+
+
+RUNNERS = {
+    "process_file": run_process_file,
+    "generate_matches": run_generate_matches,
+    "update_match_status": run_update_match_status,
+    "check_signup_status": run_check_signup_status
+}
+
+
+def run_case_in_process(case):
+    import server01
+    server01.init_services()
+    backend = os.environ["STORAGE_BACKEND"]
+    if server01.data_store.name != backend:
+        raise RuntimeError(f"Asked for the {backend} storage backend but the server is using {server01.data_store.name}")
+    with tempfile.TemporaryDirectory() as tmp:
+        stats = RUNNERS[case["scenario"]](server01, case, tmp)
+    # Reap the parse workers so their peak RSS is counted
+    server01.shutdown_services(timeout=10)
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    stats["peak_rss_mb"] = peak_kb / 1024
+    return stats
+
+
+# --- parent ---
+
+def measure(case, backend="memory", runs=1):
+    """Median of each statistic over runs fresh interpreters"""
+    samples = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as tmp:
+            samples.append(_measure(case, backend, tmp))
+    return {key: float(np.median([sample[key] for sample in samples])) for key in samples[0]}
+
+
+def _measure(case, backend, tmp):
+    env = dict(os.environ)
+    env.update({
+        "LLM_BACKEND": "fake",
+        "LLM_FAKE_LATENCY": "0",
+        "STORAGE_BACKEND": backend,
+        "STORAGE_SQLITE_PATH": os.path.join(tmp, "mentorship.db"),
+        "CONTENT_CACHE_BACKEND": "none",
+        "ENABLE_RATE_LIMITING": "false",
+        "JOB_STORE_PATH": os.path.join(tmp, "jobs.db"),
+        "EMBEDDING_INDEX_DIR": os.path.join(tmp, "embeddings"),
+        "LOG_LEVEL": "WARNING",
+        "PYTHONDONTWRITEBYTECODE": "1"
+    })
+    if backend != "firestore":
+        # Never touch a configured Firebase project from the local backends
+        env["FIREBASE_CREDENTIALS_PATH"] = ""
+    output = subprocess.run([sys.executable, "-m", "benchmarks.api", "--case", json.dumps(case)], cwd=BACKEND_DIR,
+                            env=env, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"{case_name(case)} failed:\n{output.stderr[-2000:]}")
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Cases whose throughput, p95 latency or peak RSS is worse than the baseline by more than tolerance"""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if stats["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {stats['throughput_rps']:.1f} req/s < baseline {base['throughput_rps']:.1f}")
+        if stats["p95_ms"] > max(base["p95_ms"] * (1 + tolerance), base["p95_ms"] + min_delta_ms):
+            regressions.append(f"{name}: p95 {stats['p95_ms']:.1f}ms > baseline {base['p95_ms']:.1f}ms")
+        if stats["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {stats['peak_rss_mb']:.0f}MB > baseline {base['peak_rss_mb']:.0f}MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="Smaller documents, cohorts and request counts")
+    parser.add_argument("--runs", type=int, default=1,
+                        help="Fresh interpreters per case; the median of each statistic is reported")
+    parser.add_argument("--only", help=f"Comma-separated scenarios to run ({', '.join(SCENARIOS)})")
+    parser.add_argument("--backend", choices=BACKENDS, default="memory",
+                        help="Storage backend the server uses; firestore needs FIREBASE_CREDENTIALS_PATH")
+    parser.add_argument("--save", help="Write the results to this JSON file as the new baseline")
+    parser.add_argument("--compare", help="Baseline JSON file to check the results against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression over the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=20.0,
+                        help="p95 increases of fewer milliseconds than this are noise, not regressions")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case_in_process(json.loads(args.case))))
+        return 0
+
+    only = set(args.only.split(",")) if args.only else set(SCENARIOS)
+    unknown = only - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        if "results" not in saved:
+            # Saved before the backend was recorded; those baselines all used memory storage
+            saved = {"backend": "memory", "results": saved}
+        if saved["backend"] != args.backend:
+            parser.error(f"{args.compare} was taken with the {saved['backend']} backend, not {args.backend}; "
+                         f"rerun with --backend {saved['backend']}")
+        baseline = saved["results"]
+
+    results = {}
+    print(f"Storage backend: {args.backend}")
+    print(f"{'case':<58} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'RSS MB':>7} {'err':>4}")
+    for case in cases(args.quick):
+        if case["scenario"] not in only:
+            continue
+        stats = measure(case, args.backend, args.runs)
+        results[case_name(case)] = stats
+        print(f"{case_name(case):<58} {stats['throughput_rps']:>9.1f} {stats['p50_ms']:>9.1f} "
+              f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['peak_rss_mb']:>7.0f} "
+              f"{stats['errors']:>4.0f}", flush=True)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"backend": args.backend, "quick": args.quick, "results": results}, f, indent=2)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# Solve time and objective of the assignment methods across cohort sizes.
+# Run from backend/ with:  python -m benchmarks.assignment [--max-optimal-cells N]
+# Score matrices come from the real scorer on synthetic profiles whose words follow a
+# Zipf distribution, so some mentors are popular with everyone (the hard case).
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import assignment
+import scoring
+
+# (mentees, mentors, capacity)
+COHORTS = [
+    (100, 40, 3),
+    (300, 100, 3),
+    (500, 170, 3),
+    (500, 500, 3),
+    (1000, 340, 3),
+    (1000, 1000, 3),
+    (2000, 700, 3),
+    (5000, 1700, 3),
+    (5000, 5000, 3)
+]
+
+MAJORS = ["Computer Science", "Biology", "Economics", "History", "Neuroscience", "Engineering",
+          "Mathematics", "Political Science", "Psychology", "English", ""]
+VOCABULARY = [f"term{i}" for i in range(2000)]
+
+
+def synthetic_profiles(rng, count, fields, words_per_field=20):
+    """Profiles whose field text is drawn from a Zipf-distributed vocabulary"""
+    ranks = np.minimum(rng.zipf(1.3, size=(count, len(fields), words_per_field)), len(VOCABULARY)) - 1
+    return [
+        dict({field: " ".join(VOCABULARY[r] for r in ranks[i, f]) for f, field in enumerate(fields)},
+             id=str(i), major=MAJORS[rng.integers(len(MAJORS))])
+        for i in range(count)
+    ]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def run(max_optimal_cells):
+    rng = np.random.default_rng(7)
+    mentee_fields = scoring.INTEREST_FIELDS[0] + scoring.SUPPORT_FIELDS[0]
+    mentor_fields = scoring.INTEREST_FIELDS[1] + scoring.SUPPORT_FIELDS[1]
+
+    print(f"{'mentees':>7} {'mentors':>7} {'cap':>3}  {'method':<8} {'seconds':>8} {'placed':>6} "
+          f"{'objective':>10} {'gap':>7}")
+    for n_mentees, n_mentors, capacity in COHORTS:
+        mentees = synthetic_profiles(rng, n_mentees, mentee_fields)
+        mentors = synthetic_profiles(rng, n_mentors, mentor_fields)
+        scores = scoring.score_matrix(mentors, mentees).astype(np.float64)
+        capacities = np.full(n_mentors, capacity, dtype=np.int64)
+
+        results = [("greedy", *timed(assignment.assign_greedy, scores, capacities))]
+        if scores.size <= max_optimal_cells:
+            results.append(("optimal", *timed(assignment.assign_optimal, scores, capacities)))
+
+        # The gap is measured against the optimum, so it is only known when the exact solver ran
+        best = assignment.total_score(scores, results[-1][1]) if len(results) > 1 else None
+        for name, result, seconds in results:
+            objective = assignment.total_score(scores, result)
+            gap = f"{(best - objective) / best:.2%}" if best else "-"
+            print(f"{n_mentees:>7} {n_mentors:>7} {capacity:>3}  {name:<8} {seconds:>8.3f} "
+                  f"{int((result >= 0).sum()):>6} {objective:>10.2f} {gap:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--max-optimal-cells", type=int, default=4 * assignment.OPTIMAL_MAX_CELLS,
+                        help="Skip the exact solver above this many mentee x mentor cells")
+    args = parser.parse_args()
+    run(args.max_optimal_cells)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
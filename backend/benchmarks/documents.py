@@ -0,0 +1,102 @@
+# Synthetic resumes for the extraction benchmarks.
+# Builds text PDFs and DOCX files of any page count without PyPDF2 or python-docx, so
+# the inputs are byte-for-byte the same on every machine.
+
+import io
+import random
+import zipfile
+
+WORDS = ("research software engineering biology economics history tutoring internship laboratory "
+         "volunteer leadership python statistics writing teaching analysis project community data "
+         "mentoring chemistry design finance policy outreach robotics neuroscience").split()
+
+# Lines per page and words per line, close to a dense one-page resume
+LINES_PER_PAGE = 40
+WORDS_PER_LINE = 12
+
+
+def page_lines(page_number, seed=0):
+    """Deterministic resume-like lines for one page"""
+    rng = random.Random(seed * 100003 + page_number)
+    lines = [f"Page {page_number + 1} - Experience and Activities"]
+    for _ in range(LINES_PER_PAGE - 1):
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(WORDS_PER_LINE)))
+    return lines
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages, seed=0):
+    """Bytes of a text PDF with the given number of pages, one Helvetica text block per page"""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    page_tree = add(None)
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for page_number in range(pages):
+        text = " T* ".join(f"({_pdf_escape(line)}) Tj" for line in page_lines(page_number, seed))
+        stream = f"BT /F1 10 Tf 14 TL 50 770 Td {text} ET".encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add((f"<< /Type /Page /Parent {page_tree} 0 R /MediaBox [0 0 612 792] "
+                             f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {content} 0 R >>").encode()))
+    objects[catalog - 1] = f"<< /Type /Catalog /Pages {page_tree} 0 R >>".encode()
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[page_tree - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+    return out.getvalue()
+
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml"
+ ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+</Types>"""
+
+_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Target="word/document.xml"
+ Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>
+</Relationships>"""
+
+
+def make_docx(pages, seed=0):
+    """Bytes of a DOCX with the given number of pages, separated by explicit page breaks"""
+    paragraphs = []
+    for page_number in range(pages):
+        if page_number:
+            paragraphs.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+        paragraphs.extend(f"<w:p><w:r><w:t>{line}</w:t></w:r></w:p>" for line in page_lines(page_number, seed))
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f'<w:body>{"".join(paragraphs)}</w:body></w:document>')
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _RELS)
+        archive.writestr("word/document.xml", document)
+    return out.getvalue()
+
+
+def make_document(file_format, pages, seed=0):
+    """make_pdf or make_docx by extension ("pdf" or "docx")"""
+    return make_pdf(pages, seed) if file_format == "pdf" else make_docx(pages, seed)
@@ -0,0 +1,162 @@
+# Throughput of the API under concurrent /generate-matches requests.
+# Run from backend/ with:  python -m benchmarks.load [--clients 32] [--seconds 20]
+# Starts the development server (python server01.py) and gunicorn (gunicorn.conf.py)
+# in turn with the fake LLM backend, so every request spends most of its time waiting
+# on a simulated Gemini call, and drives the same load against each.
+# Pass --url to load an already running server instead.
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MAJORS = ["Computer Science", "Biology", "Economics", "History"]
+WORDS = "research software medicine finance policy writing internships graduate lab coding data teaching".split()
+
+
+def cohort(n_mentors=4, n_mentees=10):
+    """A small cohort; with reasons enabled each request makes one LLM call per mentor"""
+    def profile(i, kind):
+        return {"id": f"{kind}-{i}", "name": f"{kind} {i}", "major": MAJORS[i % len(MAJORS)],
+                "academicInterests": " ".join(WORDS[i % 5:i % 5 + 4]), "careerGoals": " ".join(WORDS[i % 7:i % 7 + 3])}
+    return {
+        "mentors": [profile(i, "mentor") for i in range(n_mentors)],
+        "mentees": [profile(i, "mentee") for i in range(n_mentees)],
+        "maxMenteesPerMentor": 3,
+        "saveToDatabase": False
+    }
+
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=2):
+                return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up within {timeout}s")
+
+
+def drive(url, clients, seconds, body):
+    """Closed-loop load: every client sends its next request as soon as the last one returns"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.time() + seconds
+
+    def client():
+        while time.time() < deadline:
+            started = time.perf_counter()
+            request = urllib.request.Request(f"{url}/generate-matches", data=body,
+                                             headers={"Content-Type": "application/json"})
+            try:
+                with urllib.request.urlopen(request, timeout=120) as response:
+                    response.read()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+            except (urllib.error.URLError, ConnectionError, OSError):
+                with lock:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    completed = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / wall,
+        "p50": float(np.percentile(completed, 50)),
+        "p95": float(np.percentile(completed, 95))
+    }
+
+
+def server_env(tmp, llm_latency):
+    env = dict(os.environ)
+    env.update({
+        "LLM_BACKEND": "fake",
+        "LLM_FAKE_LATENCY": str(llm_latency),
+        "STORAGE_BACKEND": "sqlite",
+        "STORAGE_SQLITE_PATH": os.path.join(tmp, "mentorship.db"),
+        "JOB_STORE_PATH": os.path.join(tmp, "jobs.db"),
+        "EMBEDDING_INDEX_DIR": os.path.join(tmp, "embeddings"),
+        "FIREBASE_CREDENTIALS_PATH": "",
+        # Every client shares one IP; the benchmark measures throughput, not the limits
+        "ENABLE_RATE_LIMITING": "false",
+        "PYTHONUNBUFFERED": "1"
+    })
+    return env
+
+
+def run_server(command, env, port, clients, seconds, body):
+    env = dict(env, PORT=str(port))
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_up(url, process)
+        drive(url, min(clients, 4), 2, body)  # warm up
+        return drive(url, clients, seconds, body)
+    finally:
+        # The development server's reloader runs the app in a child process
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+def print_row(name, stats):
+    print(f"{name:<22} {stats['rps']:>8.1f} {stats['p50']:>8.3f} {stats['p95']:>8.3f} {stats['errors']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--seconds", type=float, default=20, help="Duration of each run")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Simulated seconds per LLM call")
+    parser.add_argument("--mentors", type=int, default=4, help="Mentors per request")
+    parser.add_argument("--mentees", type=int, default=10, help="Mentees per request; raise both to add CPU work")
+    parser.add_argument("--port", type=int, default=5090)
+    parser.add_argument("--url", help="Load this server instead of starting the dev server and gunicorn")
+    args = parser.parse_args()
+
+    body = json.dumps(cohort(args.mentors, args.mentees)).encode("utf-8")
+    print(f"{args.clients} clients, {args.seconds:.0f}s per run, fake LLM latency {args.llm_latency}s")
+    print(f"{'server':<22} {'req/s':>8} {'p50 s':>8} {'p95 s':>8} {'errors':>6}")
+    if args.url:
+        print_row(args.url, drive(args.url.rstrip("/"), args.clients, args.seconds, body))
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = server_env(tmp, args.llm_latency)
+        servers = [
+            ("flask dev server", [sys.executable, "server01.py"]),
+            ("gunicorn gthread", [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"])
+        ]
+        for offset, (name, command) in enumerate(servers):
+            print_row(name, run_server(command, env, args.port + offset, args.clients, args.seconds, body))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# Cold-start time of the API server, tracked for regressions.
+# Run from backend/ with:  python -m benchmarks.startup [--runs 5] [--save FILE] [--compare FILE]
+# Every run is a fresh interpreter that imports server01, initializes the per-process
+# services and polls /ready until the background dependency checks finish.
+# --compare exits with status 1 when a median is slower than the saved baseline by more
+# than --tolerance, so it can gate CI.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+METRICS = ("import_seconds", "init_seconds", "ready_seconds")
+
+# Runs inside the child interpreter; times are measured from just before the import
+CHILD = """
+import json, time
+started = time.perf_counter()
+import server01
+imported = time.perf_counter()
+server01.init_services()
+initialized = time.perf_counter()
+client = server01.app.test_client()
+while client.get("/ready").status_code != 200:
+    if time.perf_counter() - started > 120:
+        raise SystemExit("not ready after 120s")
+    time.sleep(0.01)
+ready = time.perf_counter()
+print(json.dumps({"import_seconds": imported - started, "init_seconds": initialized - imported,
+                  "ready_seconds": ready - started}))
+"""
+
+
+def measure(env):
+    output = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=env, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def run(runs):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault("STORAGE_BACKEND", "memory")
+        env.update({
+            "JOB_STORE_PATH": os.path.join(tmp, "jobs.db"),
+            "EMBEDDING_INDEX_DIR": os.path.join(tmp, "embeddings"),
+            "PYTHONDONTWRITEBYTECODE": "1"
+        })
+        samples = [measure(env) for _ in range(runs)]
+    return {metric: {"median": median([s[metric] for s in samples]),
+                     "min": min(s[metric] for s in samples),
+                     "max": max(s[metric] for s in samples)} for metric in METRICS}
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """Metrics whose median exceeds the baseline median by more than tolerance and min_delta seconds"""
+    regressions = []
+    for metric in METRICS:
+        if metric not in baseline:
+            continue
+        limit = max(baseline[metric]["median"] * (1 + tolerance), baseline[metric]["median"] + min_delta)
+        if results[metric]["median"] > limit:
+            regressions.append(f"{metric}: {results[metric]['median']:.3f}s > {limit:.3f}s "
+                               f"(baseline {baseline[metric]['median']:.3f}s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--save", help="Write the results to this JSON file as the new baseline")
+    parser.add_argument("--compare", help="Baseline JSON file to check the results against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown over the baseline")
+    parser.add_argument("--min-delta", type=float, default=0.05,
+                        help="Slowdowns of fewer seconds than this are noise, not regressions")
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    print(f"{'metric':<16} {'median':>8} {'min':>8} {'max':>8}")
+    for metric in METRICS:
+        stats = results[metric]
+        print(f"{metric:<16} {stats['median']:>8.3f} {stats['min']:>8.3f} {stats['max']:>8.3f}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+# Content-addressed cache for LLM-generated form content.
+# Entries are keyed by a hash of everything that determines the output, so
+# re-uploading the same resume for the same role skips the LLM round trip.
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 1000
+
+
+def make_key(*parts):
+    """Stable SHA-256 key for the given JSON-serializable parts"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryBackend:
+    """In-process LRU store with per-entry expiry"""
+
+    name = "memory"
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteBackend:
+    """On-disk store that survives restarts, evicting least recently used rows"""
+
+    name = "sqlite"
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS content_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_content_cache_access ON content_cache (last_access)")
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections are not shareable across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute("SELECT value, expires_at FROM content_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        with conn:
+            if row[1] < now:
+                conn.execute("DELETE FROM content_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE content_cache SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO content_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now)
+            )
+            conn.execute("DELETE FROM content_cache WHERE expires_at < ?", (now,))
+            conn.execute("""
+                DELETE FROM content_cache WHERE key IN (
+                    SELECT key FROM content_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def size(self):
+        return self._connect().execute("SELECT COUNT(*) FROM content_cache").fetchone()[0]
+
+
+class RedisBackend:
+    """Redis-compatible store; expiry uses native TTLs and eviction the server's maxmemory policy"""
+
+    name = "redis"
+
+    def __init__(self, url, prefix="trinity:content:"):
+        import redis  # Optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, json.dumps(value), ex=int(ttl))
+
+    def size(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*", count=500))
+
+
+class ContentCache:
+    """Cache front-end that tracks hit/miss counts; backend errors count as misses"""
+
+    def __init__(self, backend, ttl=DEFAULT_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Content cache read failed: {str(e)}")
+            self._count("errors")
+            value = None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Content cache write failed: {str(e)}")
+            self._count("errors")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": size,
+            "ttl_seconds": self.ttl
+        }
+
+
+def create_cache_from_env(default_dir):
+    """
+    Build the content cache configured by environment variables
+
+    CONTENT_CACHE_BACKEND: memory (default), sqlite, redis or none
+    CONTENT_CACHE_TTL: Entry lifetime in seconds
+    CONTENT_CACHE_MAX_ENTRIES: LRU bound for the memory and sqlite backends
+    CONTENT_CACHE_PATH: SQLite file (defaults to <default_dir>/content_cache.db)
+    REDIS_URL: Connection URL for the redis backend
+
+    Returns:
+        ContentCache, or None when caching is disabled
+    """
+    backend_name = os.environ.get("CONTENT_CACHE_BACKEND", "memory").lower()
+    ttl = int(os.environ.get("CONTENT_CACHE_TTL", DEFAULT_TTL_SECONDS))
+    max_entries = int(os.environ.get("CONTENT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+
+    if backend_name == "none":
+        return None
+    try:
+        if backend_name == "sqlite":
+            path = os.environ.get("CONTENT_CACHE_PATH", os.path.join(default_dir, "content_cache.db"))
+            backend = SQLiteBackend(path, max_entries)
+        elif backend_name == "redis":
+            backend = RedisBackend(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+        else:
+            backend = MemoryBackend(max_entries)
+    except Exception as e:
+        logger.error(f"Could not initialize {backend_name} content cache, using memory: {str(e)}")
+        backend = MemoryBackend(max_entries)
+    return ContentCache(backend, ttl)
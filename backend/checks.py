@@ -0,0 +1,142 @@
+# Behaviour checks for the API and its helpers.
+# Run from backend/ with:  python -m checks
+# The server is imported with the fake LLM, in-memory storage and a temporary job store,
+# so no check touches Gemini, Firebase or the local databases.
+
+import json
+import os
+import queue
+import sys
+import tempfile
+
+
+def check_conditional_listing(client, data_store):
+    data_store.matches.create_many([{"mentorId": "mentor-1", "menteeId": f"mentee-{i}", "status": "pending"}
+                                    for i in range(3)])
+    for method, path, body in (("post", "/get-user-matches", {"userId": "mentor-1"}),
+                               ("get", "/get-all-matches", None)):
+        first = getattr(client, method)(path, json=body)
+        assert first.status_code == 200 and first.headers.get("ETag"), (path, first.status_code)
+        etag = first.headers["ETag"]
+
+        repeated = getattr(client, method)(path, json=body, headers={"If-None-Match": etag})
+        assert repeated.status_code == 304 and repeated.get_data() == b"", (path, repeated.status_code)
+        assert repeated.headers.get("ETag") == etag
+
+        stale = getattr(client, method)(path, json=body, headers={"If-None-Match": '"stale"'})
+        assert stale.status_code == 200 and stale.get_json(), (path, stale.status_code)
+
+
+def check_prompt_compaction():
+    from prompts import CHARS_PER_TOKEN, ELLIPSIS, Prompt, compact_lines, truncate
+
+    text = """
+        Resume
+        Page 1 of 2
+        3/4
+        \u2022   Research   assistant, Biology lab
+        2021
+        Research assistant, biology lab
+        ---------
+        References available upon request.
+        References available on request
+        references are available upon request
+        Tutoring center volunteer
+    """
+    assert compact_lines(text) == ["Research assistant, Biology lab", "2021", "Tutoring center volunteer"], \
+        compact_lines(text)
+    # Lines that only mention references are kept
+    assert compact_lines("References from two professors") == ["References from two professors"]
+
+    assert truncate("short", 10) == "short"
+    cut = truncate("word " * 40, 5)
+    assert cut.endswith(ELLIPSIS) and len(cut) <= 5 * CHARS_PER_TOKEN and " ..." not in cut, cut
+
+    prompt = Prompt("check")
+    assert prompt.document("line one\nline two\nline three", max_tokens=4) == "line one\nline two"
+    assert prompt.truncated == 1
+    assert prompt.field("  a   b  ", "major") == "a b"
+
+
+def read_sse(messages):
+    """(event, data) pairs of an SSE stream, without keepalives"""
+    events = []
+    for message in messages:
+        lines = dict(line.split(": ", 1) for line in message.strip().split("\n") if not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def check_stream_corrections(server01):
+    # A streamed match that repair moves or drops is replaced or retracted, and the stream
+    # ends agreeing with the stored result whatever was sent before
+    events = queue.Queue()
+    for event in [("match", {"menteeId": "a", "mentorId": "m1"}), ("match", {"menteeId": "b", "mentorId": "m1"}),
+                  ("match", {"menteeId": "a", "mentorId": "m2"}), ("retract", {"menteeId": "b", "mentorId": "m1"}),
+                  ("match", {"menteeId": "c", "mentorId": "m1"}),
+                  ("done", ({"matches": [{"menteeId": "a", "mentorId": "m2", "id": "1"},
+                                         {"menteeId": "d", "mentorId": "m1", "id": "2"}]}, 200))]:
+        events.put(event)
+    sent = read_sse(server01.match_stream_events(events))
+    assert [name for name, _ in sent] == ["progress", "match", "match", "replace", "retract", "match",
+                                          "retract", "match", "done"], sent
+    assert sent[3][1]["previousMentorId"] == "m1" and sent[3][1]["match"]["mentorId"] == "m2"
+    assert sent[6][1] == {"menteeId": "c", "mentorId": "m1", "matched": 1}
+    assert sent[-1][1]["matched"] == 2 and sent[-1][1]["match_ids"] == {"a": "1", "d": "2"}
+
+    # Sharded matching reports the matches repair takes back
+    import numpy as np
+
+    import assignment
+    import matching
+    mentors = [{"id": "m1"}, {"id": "m2"}]
+    mentees = [{"id": "a"}, {"id": "b"}]
+    proposals = json.dumps([{"menteeId": "a", "mentorId": "m1", "score": 90},
+                            {"menteeId": "b", "mentorId": "m2", "score": 80}])
+    # Stand-in repair that keeps the first mentee's proposal and drops the second
+    repair = assignment.repair
+    assignment.repair = lambda scores, capacities, proposed, method: (
+        np.array([proposed[0], -1]), {"invalid": 0, "over_capacity": 0, "filled": 0})
+    accepted, retracted = [], []
+    try:
+        matches, unmatched, _ = matching.match_cohort_sharded(
+            mentors, mentees, 1, lambda prompt, schema=None: proposals,
+            on_match=accepted.append, on_retract=retracted.append)
+    finally:
+        assignment.repair = repair
+    assert len(accepted) == 2 and [m["menteeId"] for m in retracted] == ["b"], (accepted, retracted)
+    assert [m["menteeId"] for m in matches] == ["a"] and unmatched == ["b"]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "LLM_BACKEND": "fake",
+            "STORAGE_BACKEND": "memory",
+            "CONTENT_CACHE_BACKEND": "none",
+            "ENABLE_RATE_LIMITING": "false",
+            "FIREBASE_CREDENTIALS_PATH": "",
+            "JOB_STORE_PATH": os.path.join(tmp, "jobs.db"),
+            "EMBEDDING_INDEX_DIR": os.path.join(tmp, "embeddings"),
+            "LOG_LEVEL": "WARNING"
+        })
+        import server01
+        server01.init_services()
+        client = server01.app.test_client()
+        checks = [
+            ("conditional match listings", lambda: check_conditional_listing(client, server01.data_store)),
+            ("prompt compaction", check_prompt_compaction),
+            ("streamed match corrections", lambda: check_stream_corrections(server01))
+        ]
+        try:
+            for name, check in checks:
+                check()
+                print(f"  ok  {name}")
+        finally:
+            server01.shutdown_services(timeout=5)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+# Precomputed profile vectors for candidate retrieval.
+# Each signup is embedded once when /match stores it. Vectors live in a float32 file that
+# is memory-mapped (one row per user) next to a small SQLite table mapping user ID -> row
+# and a hash of the profile fields the vector was built from, so a profile is only
+# re-embedded when those fields change. Top-k searches are a single matrix-vector product.
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+
+import numpy as np
+
+import matching
+from scoring import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Size of the hashed term space used by the model-free embedder
+VECTOR_DIM = 1024
+
+# Rows added to the vector file each time it grows
+GROW_ROWS = 1024
+
+DEFAULT_GEMINI_MODEL = "models/text-embedding-004"
+DEFAULT_GEMINI_DIM = 768
+
+ROLE_FIELDS = {
+    "mentor": matching.MENTOR_TEXT_FIELDS,
+    "mentee": matching.MENTEE_TEXT_FIELDS
+}
+
+
+def normalize_role(role):
+    """"mentor" or "mentee" from a mentorshipRole value such as "Mentor", else None"""
+    role = str(role or "").strip().lower()
+    return role if role in ROLE_FIELDS else None
+
+
+def fields_hash(profile, role):
+    """Fingerprint of the profile fields a role's vector is built from"""
+    values = [role] + [profile.get(field) or "" for field in ROLE_FIELDS[role]]
+    return hashlib.sha256(json.dumps(values, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class HashingEmbedder:
+    """Model-free vectors: sublinear term counts over the matcher's hashed vocabulary"""
+
+    name = "hashing"
+
+    def __init__(self, dim=VECTOR_DIM):
+        self.dim = dim
+
+    def warm(self):
+        """Nothing to load"""
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for tok in tokenize(text):
+                idx = zlib.crc32(tok.encode("utf-8")) % self.dim
+                counts[idx] = counts.get(idx, 0) + 1
+            for idx, count in counts.items():
+                matrix[row, idx] = 1.0 + np.log(count)
+        return _normalize_rows(matrix)
+
+
+class GeminiEmbedder:
+    """Gemini text embeddings, one batched request per call"""
+
+    name = "gemini"
+
+    def __init__(self, api_key, model_name=DEFAULT_GEMINI_MODEL, dim=DEFAULT_GEMINI_DIM):
+        self._api_key = api_key
+        self._genai = None
+        self._lock = threading.Lock()
+        self.model_name = model_name
+        self.dim = dim
+
+    def warm(self):
+        """Import and configure the SDK (about a second) ahead of the first request"""
+        if self._genai is None:
+            with self._lock:
+                if self._genai is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self._api_key)
+                    self._genai = genai
+        return self._genai
+
+    def embed(self, texts):
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        # The API rejects empty strings; a blank profile gets the embedding of a space
+        result = self.warm().embed_content(model=self.model_name, content=[t or " " for t in texts],
+                                           task_type="semantic_similarity")
+        matrix = np.asarray(result["embedding"], dtype=np.float32).reshape(len(texts), -1)
+        if matrix.shape[1] != self.dim:
+            raise ValueError(f"{self.model_name} returned {matrix.shape[1]}-dim vectors, expected {self.dim}")
+        return _normalize_rows(matrix)
+
+
+class EmbeddingIndex:
+    """
+    Memory-mapped float32 vectors keyed by user ID
+
+    Each embedder gets its own subdirectory, so switching backends or dimensions never
+    mixes incompatible vectors. Safe to share between threads and worker processes:
+    row allocation happens inside an IMMEDIATE SQLite transaction.
+    """
+
+    def __init__(self, directory, embedder):
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.directory = os.path.join(directory, f"{embedder.name}-{embedder.dim}")
+        os.makedirs(self.directory, exist_ok=True)
+        self.vector_path = os.path.join(self.directory, "vectors.f32")
+        self.db_path = os.path.join(self.directory, "index.db")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._capacity = 0
+        self._writes = 0
+        # role -> (data_version, writes, ids, matrix) for repeated searches
+        self._role_cache = {}
+        if not os.path.exists(self.vector_path):
+            open(self.vector_path, "wb").close()
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS vectors (
+                user_id TEXT PRIMARY KEY,
+                role TEXT NOT NULL,
+                row INTEGER NOT NULL UNIQUE,
+                fields_hash TEXT NOT NULL
+            )
+        """)
+        self._connect().execute("CREATE INDEX IF NOT EXISTS idx_vectors_role ON vectors (role)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _mapped(self, min_rows=0):
+        """The vector memmap, remapped when the file grew (here or in another process)"""
+        row_bytes = self.dim * 4
+        with self._lock:
+            file_rows = os.path.getsize(self.vector_path) // row_bytes
+            if file_rows < min_rows:
+                file_rows = max(min_rows, file_rows * 2, GROW_ROWS)
+                with open(self.vector_path, "r+b") as f:
+                    f.truncate(file_rows * row_bytes)
+            if self._vectors is None or file_rows != self._capacity:
+                self._vectors = np.memmap(self.vector_path, dtype=np.float32, mode="r+",
+                                          shape=(file_rows, self.dim)) if file_rows else None
+                self._capacity = file_rows
+            return self._vectors
+
+    def _rows_for(self, user_ids):
+        found = {}
+        ids = list(user_ids)
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            placeholders = ",".join("?" * len(chunk))
+            for user_id, role, row, digest in self._connect().execute(
+                    f"SELECT user_id, role, row, fields_hash FROM vectors WHERE user_id IN ({placeholders})", chunk):
+                found[user_id] = (role, row, digest)
+        return found
+
+    def ensure(self, profiles, role):
+        """
+        Vectors for the given profiles, embedding only the ones that are new or changed
+
+        Args:
+            profiles: Profile dicts carrying 'id'
+            role: "mentor" or "mentee"; selects the profile fields that are embedded
+
+        Returns:
+            float32 array of shape (len(profiles), dim), rows in input order
+        """
+        ids = [str(p.get("id")) for p in profiles]
+        digests = [fields_hash(p, role) for p in profiles]
+        existing = self._rows_for(ids)
+        stale = [i for i, (user_id, digest) in enumerate(zip(ids, digests))
+                 if user_id not in existing or existing[user_id][0] != role or existing[user_id][2] != digest]
+        if stale:
+            texts = [matching.profile_text(profiles[i], ROLE_FIELDS[role]) for i in stale]
+            self._write([ids[i] for i in stale], role, [digests[i] for i in stale], self.embedder.embed(texts))
+            existing = self._rows_for(ids)
+        vectors = self._mapped()
+        return np.asarray(vectors[[existing[user_id][1] for user_id in ids]], dtype=np.float32) \
+            if ids else np.zeros((0, self.dim), dtype=np.float32)
+
+    def upsert(self, user_id, role, profile):
+        """Embed one profile unless its fields are unchanged; True if a vector was written"""
+        digest = fields_hash(profile, role)
+        current = self._rows_for([str(user_id)]).get(str(user_id))
+        if current and current[0] == role and current[2] == digest:
+            return False
+        vector = self.embedder.embed([matching.profile_text(profile, ROLE_FIELDS[role])])
+        self._write([str(user_id)], role, [digest], vector)
+        return True
+
+    def _write(self, user_ids, role, digests, vectors):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = {}
+            next_row = conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM vectors").fetchone()[0]
+            for user_id in user_ids:
+                found = conn.execute("SELECT row FROM vectors WHERE user_id = ?", (user_id,)).fetchone()
+                if found:
+                    rows[user_id] = found[0]
+                else:
+                    rows[user_id] = next_row
+                    next_row += 1
+            mapped = self._mapped(min_rows=next_row)
+            for user_id, vector in zip(user_ids, vectors):
+                mapped[rows[user_id]] = vector
+            mapped.flush()
+            conn.executemany(
+                "INSERT OR REPLACE INTO vectors (user_id, role, row, fields_hash) VALUES (?, ?, ?, ?)",
+                [(user_id, role, rows[user_id], digest) for user_id, digest in zip(user_ids, digests)]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self._writes += 1
+
+    def get(self, user_id):
+        """Stored vector for a user, or None"""
+        current = self._rows_for([str(user_id)]).get(str(user_id))
+        if current is None:
+            return None
+        return np.array(self._mapped()[current[1]], dtype=np.float32)
+
+    def remove(self, user_id):
+        """Forget a user's vector (its row is not reused)"""
+        cursor = self._connect().execute("DELETE FROM vectors WHERE user_id = ?", (str(user_id),))
+        with self._lock:
+            self._writes += 1
+        return cursor.rowcount > 0
+
+    def _role_matrix(self, role):
+        """IDs and vectors of every user with a role, cached until the index changes"""
+        data_version = self._connect().execute("PRAGMA data_version").fetchone()[0]
+        with self._lock:
+            cached = self._role_cache.get(role)
+            writes = self._writes
+        if cached and cached[0] == data_version and cached[1] == writes:
+            return cached[2], cached[3]
+        pairs = self._connect().execute("SELECT user_id, row FROM vectors WHERE role = ? ORDER BY row",
+                                        (role,)).fetchall()
+        ids = [user_id for user_id, _ in pairs]
+        mapped = self._mapped()
+        matrix = np.asarray(mapped[[row for _, row in pairs]], dtype=np.float32) if pairs \
+            else np.zeros((0, self.dim), dtype=np.float32)
+        with self._lock:
+            self._role_cache[role] = (data_version, writes, ids, matrix)
+        return ids, matrix
+
+    def search(self, vector, role, k=10, exclude_ids=()):
+        """
+        Top-k users of a role by cosine similarity to a vector
+
+        Returns:
+            List of (user_id, similarity) pairs, best first
+        """
+        ids, matrix = self._role_matrix(role)
+        if not ids:
+            return []
+        scores = matrix @ np.asarray(vector, dtype=np.float32)
+        excluded = set(exclude_ids)
+        if excluded:
+            scores = scores.copy()
+            for i, user_id in enumerate(ids):
+                if user_id in excluded:
+                    scores[i] = -np.inf
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(ids[i], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def stats(self):
+        counts = dict(self._connect().execute("SELECT role, COUNT(*) FROM vectors GROUP BY role").fetchall())
+        return {
+            "backend": self.embedder.name,
+            "dim": self.dim,
+            "mentors": counts.get("mentor", 0),
+            "mentees": counts.get("mentee", 0),
+            "capacity_rows": os.path.getsize(self.vector_path) // (self.dim * 4)
+        }
+
+
+def create_index_from_env(default_dir, api_key=None):
+    """
+    Index selected by EMBEDDING_BACKEND
+
+    EMBEDDING_BACKEND: hashing (default) or gemini
+    EMBEDDING_INDEX_DIR: Directory holding the vector files
+    EMBEDDING_MODEL / EMBEDDING_DIM: Gemini embedding model and its vector size
+    """
+    backend = os.environ.get("EMBEDDING_BACKEND", "hashing").lower()
+    directory = os.environ.get("EMBEDDING_INDEX_DIR", default_dir)
+    if backend == "gemini":
+        if not api_key:
+            raise ValueError("EMBEDDING_BACKEND=gemini needs GEMINI_API_KEY")
+        embedder = GeminiEmbedder(api_key, os.environ.get("EMBEDDING_MODEL", DEFAULT_GEMINI_MODEL),
+                                  int(os.environ.get("EMBEDDING_DIM", DEFAULT_GEMINI_DIM)))
+    elif backend == "hashing":
+        embedder = HashingEmbedder()
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}. Use hashing or gemini")
+    return EmbeddingIndex(directory, embedder)
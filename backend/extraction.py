@@ -0,0 +1,372 @@
+# Text extraction for uploaded resumes.
+# Reads PDF/DOCX content straight from the upload stream, page by page or paragraph
+# by paragraph, and stops once the character budget for the prompt is reached.
+# Parsing is CPU-bound and holds the GIL, so ParsePool runs it in worker processes.
+
+import bisect
+import importlib.util
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# PyPDF2 and python-docx are only imported when a document is parsed (usually in a
+# parse pool worker, see _warm_worker), so importing this module stays cheap
+PDF_DOCX_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("PyPDF2", "docx"))
+if not PDF_DOCX_AVAILABLE:
+    logger.warning("PyPDF2 or python-docx not available. Text extraction will be limited.")
+
+# Text beyond this many characters never makes it into the prompt
+DEFAULT_CHAR_BUDGET = int(os.environ.get("EXTRACTION_CHAR_BUDGET", 20000))
+
+# Limits applied to every document parsed by the pool
+DEFAULT_MAX_PAGES = int(os.environ.get("PARSE_MAX_PAGES", 50))
+DEFAULT_MAX_BYTES = int(os.environ.get("PARSE_MAX_BYTES", 5 * 1024 * 1024))
+DEFAULT_TIMEOUT_SECONDS = float(os.environ.get("PARSE_TIMEOUT_SECONDS", 20))
+
+# How often a waiting request checks whether its document has overrun the timeout
+PARSE_POLL_SECONDS = 0.25
+
+# Upper bounds (seconds) of the parse-time histogram buckets
+PARSE_TIME_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PDF_EXTENSIONS = (".pdf",)
+WORD_EXTENSIONS = (".docx", ".doc")
+
+
+class UnsupportedFormatError(ValueError):
+    """Raised when no extractor is available for a file type"""
+
+
+class DocumentTooLargeError(ValueError):
+    """Raised when a document exceeds the byte cap for parsing"""
+
+
+class ParseTimeoutError(RuntimeError):
+    """Raised when a document takes longer than the per-document timeout to parse"""
+
+
+def iter_pdf_text(stream, max_pages=None):
+    """Yield the text of each PDF page, up to max_pages"""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(stream)
+    for page_number, page in enumerate(reader.pages):
+        if max_pages is not None and page_number >= max_pages:
+            logger.info(f"Stopped PDF extraction at the {max_pages} page cap")
+            break
+        yield page.extract_text() or ""
+
+
+def iter_docx_text(stream):
+    """Yield the text of each Word paragraph"""
+    import docx
+    document = docx.Document(stream)
+    for paragraph in document.paragraphs:
+        yield paragraph.text
+
+
+def iter_text(stream, file_extension, max_pages=None):
+    """Pick the extractor for a file extension such as '.pdf'"""
+    file_extension = file_extension.lower()
+    if not PDF_DOCX_AVAILABLE:
+        raise UnsupportedFormatError("PyPDF2 or python-docx not available")
+    if file_extension in PDF_EXTENSIONS:
+        return iter_pdf_text(stream, max_pages)
+    if file_extension in WORD_EXTENSIONS:
+        return iter_docx_text(stream)
+    raise UnsupportedFormatError(f"Unsupported file format: {file_extension}")
+
+
+def extract_text(stream, file_extension, char_budget=DEFAULT_CHAR_BUDGET, max_pages=None):
+    """
+    Extract text from a binary file-like object without touching disk
+
+    Args:
+        stream: Seekable binary stream with the uploaded document
+        file_extension: Extension including the dot, e.g. '.pdf'
+        char_budget: Maximum number of characters to extract (None for no limit)
+        max_pages: Maximum number of PDF pages to read (None for no limit)
+
+    Returns:
+        Tuple of (text, truncated)
+    """
+    parts = []
+    length = 0
+    truncated = False
+    for chunk in iter_text(stream, file_extension, max_pages):
+        parts.append(chunk)
+        length += len(chunk) + 1
+        if char_budget is not None and length >= char_budget:
+            # Remaining pages or paragraphs would be cut from the prompt anyway
+            truncated = True
+            break
+
+    text = "\n".join(parts)
+    if truncated:
+        text = text[:char_budget]
+        logger.info(f"Stopped text extraction at the {char_budget} character budget")
+    return text, truncated
+
+
+# Set in each worker process by _init_worker; the worker reports on it when it starts a document
+_start_queue = None
+
+
+def _warm_worker():
+    """Pay the PyPDF2/python-docx import cost once per worker"""
+    import PyPDF2  # noqa: F401
+    import docx  # noqa: F401
+
+
+def _init_worker(start_queue, warm):
+    """Pool initializer"""
+    global _start_queue
+    _start_queue = start_queue
+    if warm:
+        _warm_worker()
+
+
+def _noop():
+    return os.getpid()
+
+
+def _parse_document(task_id, data, file_extension, char_budget, max_pages):
+    """Runs in a worker process; returns (text, truncated, seconds)"""
+    if _start_queue is not None:
+        # The timeout runs from here, not from submission, so time spent queued never counts
+        _start_queue.put((task_id, time.time()))
+    started = time.perf_counter()
+    text, truncated = extract_text(io.BytesIO(data), file_extension, char_budget, max_pages)
+    return text, truncated, time.perf_counter() - started
+
+
+class ParsePool:
+    """
+    Bounded process pool for document parsing with per-document limits
+
+    Workers are started and warmed when the pool starts, so requests never pay the
+    process start-up or import cost. The timeout counts from the moment a worker picks
+    up the document, so a document queued behind others is never timed out for waiting.
+    A document that exceeds it causes the pool to be recycled, since a stuck worker
+    cannot be interrupted any other way; the other documents the recycle interrupted
+    are parsed again on the new pool.
+    """
+
+    def __init__(self, max_workers=2, timeout=DEFAULT_TIMEOUT_SECONDS,
+                 max_bytes=DEFAULT_MAX_BYTES, max_pages=DEFAULT_MAX_PAGES):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+        self._executor = None
+        self._lock = threading.Lock()
+        self._task_ids = itertools.count()
+        # Queue the workers report started documents on, and task ID -> wall clock start
+        self._start_queue = None
+        self._started = {}
+        self._pending = 0
+        self._bucket_counts = [0] * (len(PARSE_TIME_BUCKETS) + 1)
+        self._parse_count = 0
+        self._parse_seconds = 0.0
+        self._timeouts = 0
+        self._failures = 0
+        self._retried = 0
+        self._rejected = 0
+        self._warmup = []
+
+    @classmethod
+    def from_env(cls):
+        """PARSE_POOL_WORKERS=0 parses inline in the request thread"""
+        default_workers = max(1, min(2, os.cpu_count() or 1))
+        return cls(max_workers=int(os.environ.get("PARSE_POOL_WORKERS", default_workers)))
+
+    def start(self, wait=True):
+        """
+        Create the worker processes and warm them up
+
+        With wait=False the workers are forked right away but import the parsers in
+        the background; ready() tells when they are done.
+        """
+        if self.max_workers <= 0:
+            return
+        with self._lock:
+            if self._executor is not None:
+                return
+            # Workers come from a forkserver (spawn where there is none), never from a fork of
+            # this process: by now it runs job, logging and LLM threads, and a fork would copy
+            # any lock they hold (logging, sqlite, grpc) into a worker that then deadlocks
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            if context.get_start_method() == "forkserver":
+                # The forkserver imports the entry module (guarded by __name__ == "__main__" under
+                # gunicorn and python -m), this module and the parsers once, so every (re)started
+                # worker forks from a warm single-threaded process instead of importing them again
+                context.set_forkserver_preload(["__main__", __name__] +
+                                               (["PyPDF2", "docx"] if PDF_DOCX_AVAILABLE else []))
+            # A fresh queue per pool: a worker killed by _recycle may leave the old one unusable
+            self._start_queue = context.Queue()
+            self._started = {}
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                                 initializer=_init_worker,
+                                                 initargs=(self._start_queue, PDF_DOCX_AVAILABLE))
+            self._warmup = [self._executor.submit(_noop) for _ in range(self.max_workers)]
+            warmup = self._warmup
+        if wait:
+            for future in warmup:
+                future.result()
+        logger.info(f"Document parse pool started with {self.max_workers} workers")
+
+    def ready(self):
+        """True once every worker has been warmed up, or when documents are parsed inline"""
+        if self.max_workers <= 0:
+            return True
+        with self._lock:
+            warmup = self._warmup
+        return bool(warmup) and all(future.done() for future in warmup)
+
+    def _recycle(self, executor):
+        """Kill all workers of executor (one of them is stuck or dead) and start a fresh pool"""
+        with self._lock:
+            if self._executor is not executor:
+                # Another request already replaced it
+                return
+            self._executor = None
+        if executor is not None:
+            # ProcessPoolExecutor has no public way to stop a running task
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                process.terminate()
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def shutdown(self):
+        """Stop the worker processes; the next extract() starts a fresh pool"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._warmup = []
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _started_at(self, task_id):
+        """Wall clock time a worker picked up the task, or None while it is still queued"""
+        with self._lock:
+            while self._start_queue is not None:
+                try:
+                    started_id, started_at = self._start_queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._started[started_id] = started_at
+            return self._started.get(task_id)
+
+    def _run(self, executor, data, file_extension, char_budget):
+        """Submit one document and wait for it, timing it from when a worker starts on it"""
+        task_id = next(self._task_ids)
+        future = executor.submit(_parse_document, task_id, data, file_extension, char_budget, self.max_pages)
+        try:
+            while True:
+                try:
+                    return future.result(timeout=min(PARSE_POLL_SECONDS, self.timeout))
+                except FutureTimeoutError:
+                    started_at = self._started_at(task_id)
+                    if started_at is not None and time.time() - started_at > self.timeout:
+                        raise ParseTimeoutError(f"Document parsing exceeded {self.timeout} seconds")
+        finally:
+            with self._lock:
+                self._started.pop(task_id, None)
+
+    def _observe(self, seconds):
+        with self._lock:
+            self._bucket_counts[bisect.bisect_left(PARSE_TIME_BUCKETS, seconds)] += 1
+            self._parse_count += 1
+            self._parse_seconds += seconds
+
+    def extract(self, data, file_extension, char_budget=DEFAULT_CHAR_BUDGET):
+        """
+        Parse document bytes in a worker process
+
+        Returns:
+            Tuple of (text, truncated)
+
+        Raises:
+            DocumentTooLargeError, UnsupportedFormatError, ParseTimeoutError
+        """
+        if len(data) > self.max_bytes:
+            with self._lock:
+                self._rejected += 1
+            raise DocumentTooLargeError(f"Document is {len(data)} bytes, limit is {self.max_bytes}")
+        # Fail fast on formats we cannot parse instead of shipping them to a worker
+        if file_extension.lower() not in PDF_EXTENSIONS + WORD_EXTENSIONS or not PDF_DOCX_AVAILABLE:
+            raise UnsupportedFormatError(f"Unsupported file format: {file_extension}")
+
+        if self.max_workers <= 0:
+            started = time.perf_counter()
+            text, truncated = extract_text(io.BytesIO(data), file_extension, char_budget, self.max_pages)
+            self._observe(time.perf_counter() - started)
+            return text, truncated
+
+        with self._lock:
+            self._pending += 1
+        try:
+            for attempt in range(2):
+                self.start()
+                with self._lock:
+                    executor = self._executor
+                try:
+                    text, truncated, seconds = self._run(executor, data, file_extension, char_budget)
+                    break
+                except ParseTimeoutError:
+                    with self._lock:
+                        self._timeouts += 1
+                    logger.error(f"Document parsing exceeded {self.timeout}s, recycling parse pool")
+                    self._recycle(executor)
+                    raise
+                except (BrokenProcessPool, CancelledError):
+                    # Another document's timeout (or a crashed worker) took the pool down
+                    # with this document in it; it did nothing wrong, so parse it again
+                    self._recycle(executor)
+                    if attempt:
+                        raise
+                    with self._lock:
+                        self._retried += 1
+                    logger.warning("Parse pool was recycled while parsing a document, retrying it")
+        except ParseTimeoutError:
+            raise
+        except Exception:
+            with self._lock:
+                self._failures += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+        self._observe(seconds)
+        return text, truncated
+
+    def stats(self):
+        with self._lock:
+            cumulative = []
+            running = 0
+            for bound, count in zip(PARSE_TIME_BUCKETS + (float("inf"),), self._bucket_counts):
+                running += count
+                cumulative.append({"le": "+Inf" if bound == float("inf") else bound, "count": running})
+            return {
+                "workers": self.max_workers,
+                "in_flight": self._pending,
+                "queue_depth": max(0, self._pending - self.max_workers),
+                "parsed": self._parse_count,
+                "parse_seconds_total": round(self._parse_seconds, 4),
+                "parse_seconds_histogram": cumulative,
+                "timeouts": self._timeouts,
+                "failures": self._failures,
+                "retried": self._retried,
+                "rejected_too_large": self._rejected,
+                "max_pages": self.max_pages,
+                "max_bytes": self.max_bytes,
+                "timeout_seconds": self.timeout
+            }
@@ -0,0 +1,68 @@
+# Batched Firestore writes.
+# Documents are written in WriteBatch chunks (Firestore allows up to 500 writes per
+# batch) that commit in parallel, so saving N matches costs about N/500 round trips.
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Firestore's limit on writes per batch
+MAX_BATCH_SIZE = 500
+DEFAULT_MAX_WORKERS = 4
+
+
+def _commit_chunk(db, chunk):
+    batch = db.batch()
+    for ref, document in chunk:
+        batch.set(ref, document)
+    batch.commit()
+
+
+def save_documents_batched(db, collection_name, documents, chunk_size=MAX_BATCH_SIZE,
+                           max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Create documents with auto-generated IDs using parallel batch commits
+
+    Each document gets its Firestore ID stored under "id" before it is written.
+    A batch is atomic, so when a commit fails every document in that chunk is
+    reported as failed and none of them were written.
+
+    Args:
+        db: Firestore client
+        collection_name: Target collection
+        documents: List of dicts, updated in place with their "id"
+        chunk_size: Writes per batch (at most 500)
+
+    Returns:
+        Tuple of (stored_ids, failed) where failed maps document ID -> error message
+    """
+    chunk_size = max(1, min(chunk_size, MAX_BATCH_SIZE))
+    collection = db.collection(collection_name)
+
+    refs = []
+    for document in documents:
+        ref = collection.document()
+        document["id"] = ref.id
+        refs.append((ref, document))
+    chunks = [refs[i:i + chunk_size] for i in range(0, len(refs), chunk_size)]
+    if not chunks:
+        return [], {}
+
+    stored_ids = []
+    failed = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        futures = [(chunk, pool.submit(_commit_chunk, db, chunk)) for chunk in chunks]
+        for chunk, future in futures:
+            ids = [document["id"] for _, document in chunk]
+            try:
+                future.result()
+                stored_ids.extend(ids)
+            except Exception as e:
+                logger.error(f"Batch commit of {len(chunk)} documents to {collection_name} failed: {str(e)}")
+                for document_id in ids:
+                    failed[document_id] = str(e)
+
+    logger.info(f"Saved {len(stored_ids)} of {len(documents)} documents to {collection_name} "
+                f"in {len(chunks)} batch commits")
+    return stored_ids, failed
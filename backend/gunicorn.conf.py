@@ -0,0 +1,57 @@
+# Gunicorn settings for serving the API in production:
+#   cd backend && gunicorn -c gunicorn.conf.py wsgi:app
+# Most request time is spent waiting on Gemini and Firestore, not on the CPU, so each
+# worker process runs a pool of threads (gthread) rather than one request at a time.
+# CPU-heavy work (document parsing, scoring) already runs in numpy or the parse pool,
+# so a few processes per machine are enough.
+
+import multiprocessing
+import os
+import time
+
+from dotenv import load_dotenv
+
+# Settings in .env apply to the gunicorn settings below as well as to the app
+load_dotenv()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5002)}"
+
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", max(1, min(4, multiprocessing.cpu_count()))))
+# Threads per worker; every in-flight LLM call or SSE stream holds one
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+
+# In-memory storage is per process, so every request must reach the same worker
+if os.environ.get("STORAGE_BACKEND", "").lower() == "memory":
+    workers = 1
+
+# Import the app once in the master; workers connect their own clients after the fork
+preload_app = True
+
+# gthread workers heartbeat from their main loop, so this only catches hung workers
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+# Time a stopping worker gets to finish requests and drain background jobs
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 90))
+keepalive = 5
+
+# Requests are logged by the app through its queued JSON logger (see log_config.py);
+# set GUNICORN_ACCESS_LOG=- to also get gunicorn's synchronous access log
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+
+
+def on_starting(server):
+    # Jobs last updated before this moment were left by a previous server and are re-queued
+    os.environ["SERVER_STARTED_AT"] = str(time.time())
+
+
+def post_fork(server, worker):
+    """Connect Firebase and Gemini and start the worker pools inside the new worker"""
+    import server01
+    server01.init_services()
+
+
+def worker_exit(server, worker):
+    """Give running background jobs the rest of the grace period; unstarted ones stay queued"""
+    import server01
+    server01.shutdown_services(timeout=max(1, graceful_timeout - 10))
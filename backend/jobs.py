@@ -0,0 +1,397 @@
+# Background job queue for slow endpoints.
+# Jobs are persisted in SQLite so queued work survives a restart, run on a bounded
+# thread pool per job type, and report progress that clients can poll or stream as SSE.
+
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL_STATUSES = (SUCCEEDED, FAILED)
+
+# Finished jobs older than this are removed when the queue starts
+DEFAULT_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Every process refreshes the jobs it holds this often; a queued or running job not
+# refreshed for DEFAULT_STALE_SECONDS belongs to a process that died and is taken over
+DEFAULT_HEARTBEAT_SECONDS = 10
+DEFAULT_STALE_SECONDS = 60
+
+# How often an SSE stream re-reads its job from the store, for jobs run by another worker
+DEFAULT_EVENT_POLL_SECONDS = 1
+
+
+def _now():
+    return datetime.datetime.now().isoformat()
+
+
+def format_sse(data, event=None):
+    """Encode one Server-Sent Events message"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+class JobStore:
+    """SQLite-backed job records; one connection per thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT,
+                    progress TEXT,
+                    result TEXT,
+                    status_code INTEGER,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    updated_ts REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_type, payload):
+        job_id = uuid.uuid4().hex
+        now = _now()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, type, status, payload, created_at, updated_at, updated_ts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, job_type, QUEUED, json.dumps(payload), now, now, time.time())
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        columns = []
+        values = []
+        for column, value in fields.items():
+            if column in ("payload", "progress", "result") and value is not None:
+                value = json.dumps(value)
+            columns.append(f"{column} = ?")
+            values.append(value)
+        columns += ["updated_at = ?", "updated_ts = ?"]
+        values += [_now(), time.time(), job_id]
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {', '.join(columns)} WHERE id = ?", values)
+
+    def get(self, job_id, include_payload=False):
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "id": row["id"],
+            "type": row["type"],
+            "status": row["status"],
+            "progress": json.loads(row["progress"]) if row["progress"] else None,
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "statusCode": row["status_code"],
+            "error": row["error"],
+            "createdAt": row["created_at"],
+            "updatedAt": row["updated_at"]
+        }
+        if include_payload:
+            job["payload"] = json.loads(row["payload"]) if row["payload"] else None
+        return job
+
+    def unfinished(self, updated_before=None):
+        rows = self._connect().execute(
+            "SELECT id, type FROM jobs WHERE status IN (?, ?) AND updated_ts < ? ORDER BY created_at",
+            (QUEUED, RUNNING, updated_before if updated_before is not None else float("inf"))
+        ).fetchall()
+        return [(row["id"], row["type"]) for row in rows]
+
+    def touch(self, job_ids):
+        """Mark unfinished jobs as still held; only updated_ts changes, so clients see no update"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET updated_ts = ? WHERE id IN ({', '.join('?' * len(job_ids))}) "
+                "AND status IN (?, ?)",
+                [time.time()] + job_ids + [QUEUED, RUNNING]
+            )
+
+    def claim(self, job_id, updated_before):
+        """
+        Re-queue an unfinished job not touched since updated_before
+
+        Returns True for exactly one caller when several processes recover the same store.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, updated_ts = ? "
+                "WHERE id = ? AND status IN (?, ?) AND updated_ts < ?",
+                (QUEUED, _now(), time.time(), job_id, QUEUED, RUNNING, updated_before)
+            )
+        return cursor.rowcount == 1
+
+    def purge_finished(self, older_than_seconds):
+        cutoff = time.time() - older_than_seconds
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_ts < ?", (SUCCEEDED, FAILED, cutoff)
+            )
+        return cursor.rowcount
+
+    def counts(self):
+        rows = self._connect().execute("SELECT type, status, COUNT(*) FROM jobs GROUP BY type, status").fetchall()
+        counts = {}
+        for job_type, status, count in rows:
+            counts.setdefault(job_type, {})[status] = count
+        return counts
+
+
+class JobQueue:
+    """
+    Runs registered job handlers on a bounded thread pool per job type
+
+    A handler is called as handler(payload, report_progress) and returns a
+    (result_dict, status_code) tuple, mirroring what the synchronous route returns.
+    Once start_heartbeat() is called, the queue keeps the jobs it holds fresh in the
+    store and takes over jobs left behind by a process that died.
+    """
+
+    def __init__(self, store, context_factory=None, heartbeat_seconds=DEFAULT_HEARTBEAT_SECONDS,
+                 stale_seconds=DEFAULT_STALE_SECONDS):
+        self.store = store
+        self.context_factory = context_factory
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self._handlers = {}
+        self._pools = {}
+        self._limits = {}
+        self._changed = threading.Condition()
+        self._running = 0
+        self._draining = False
+        # Jobs queued on this process's pools or running in it, and the running subset
+        self._held = set()
+        self._active = set()
+        self._stopped = threading.Event()
+        self._heartbeat = None
+
+    def register(self, job_type, handler, concurrency):
+        self._handlers[job_type] = handler
+        self._limits[job_type] = concurrency
+        self._pools[job_type] = ThreadPoolExecutor(max_workers=concurrency,
+                                                   thread_name_prefix=f"job-{job_type}")
+
+    def submit(self, job_type, payload):
+        if job_type not in self._handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job_id = self.store.create(job_type, payload)
+        if self._draining:
+            # Stays queued in the store and runs after the restart
+            logger.warning(f"Queued {job_type} job {job_id} while shutting down, it will run after the restart")
+            return job_id
+        self._enqueue(job_id, job_type)
+        logger.info(f"Queued {job_type} job {job_id}")
+        return job_id
+
+    def _enqueue(self, job_id, job_type):
+        with self._changed:
+            self._held.add(job_id)
+        # The job keeps the submitting request's ID in its log lines
+        self._pools[job_type].submit(metrics.bind_context(self._run), job_id, job_type)
+
+    def recover(self, retention_seconds=DEFAULT_RETENTION_SECONDS, started_before=None):
+        """
+        Re-queue jobs interrupted by a restart and drop old finished ones
+
+        Args:
+            started_before: Only jobs last updated before this time.time() value are
+                taken; server workers pass the server start time so they never take
+                jobs that a sibling worker is running, and each job is claimed once
+        """
+        purged = self.store.purge_finished(retention_seconds)
+        recovered = self._take_over(time.time() if started_before is None else started_before)
+        if recovered or purged:
+            logger.info(f"Recovered {recovered} unfinished jobs, purged {purged} old jobs")
+        return recovered
+
+    def _take_over(self, updated_before):
+        """Claim and queue the unfinished jobs nobody has refreshed since updated_before"""
+        taken = 0
+        for job_id, job_type in self.store.unfinished(updated_before=updated_before):
+            if job_type not in self._handlers or not self.store.claim(job_id, updated_before):
+                continue
+            self._enqueue(job_id, job_type)
+            taken += 1
+        return taken
+
+    def start_heartbeat(self):
+        """
+        Refresh this process's jobs and take over stale ones in a background thread
+
+        A server worker that crashes (and is replaced by gunicorn) leaves its jobs
+        queued or running in the store; a sibling worker re-queues them once they have
+        not been refreshed for stale_seconds.
+        """
+        if self._heartbeat is not None:
+            return
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(self.heartbeat_seconds):
+            try:
+                with self._changed:
+                    # While draining, queued jobs were cancelled here and are left for another process
+                    held = list(self._active if self._draining else self._held)
+                self.store.touch(held)
+                if self._draining:
+                    continue
+                taken = self._take_over(time.time() - self.stale_seconds)
+                if taken:
+                    logger.warning(f"Took over {taken} jobs not refreshed for {self.stale_seconds}s")
+            except Exception as e:
+                logger.error(f"Job heartbeat failed: {str(e)}")
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _run(self, job_id, job_type):
+        # Phases of a job are timed under its own route; recovered jobs log under the job ID
+        metrics.route_var.set(f"job:{job_type}")
+        if metrics.current_request_id() is None:
+            metrics.request_id_var.set(job_id)
+        job = self.store.get(job_id, include_payload=True)
+        if job is None or job["status"] in TERMINAL_STATUSES:
+            with self._changed:
+                self._held.discard(job_id)
+            return
+        with self._changed:
+            self._running += 1
+            self._active.add(job_id)
+        try:
+            self._run_handler(job_id, job_type, job)
+        finally:
+            with self._changed:
+                self._running -= 1
+                self._active.discard(job_id)
+                self._held.discard(job_id)
+                self._changed.notify_all()
+
+    def _run_handler(self, job_id, job_type, job):
+        self.store.update(job_id, status=RUNNING, progress={"stage": "started"})
+        self._notify()
+
+        def report_progress(stage, **details):
+            self.store.update(job_id, progress=dict(details, stage=stage))
+            self._notify()
+
+        try:
+            if self.context_factory:
+                with self.context_factory():
+                    result, status_code = self._handlers[job_type](job["payload"], report_progress)
+            else:
+                result, status_code = self._handlers[job_type](job["payload"], report_progress)
+            status = SUCCEEDED if status_code < 400 else FAILED
+            metrics.jobs_finished.inc(job_type=job_type, status=status)
+            # Drop the payload once done; uploads can be several megabytes
+            self.store.update(job_id, status=status, result=result, status_code=status_code,
+                              payload=None, progress={"stage": "finished"})
+        except Exception as e:
+            metrics.jobs_finished.inc(job_type=job_type, status=FAILED)
+            logger.error(f"Job {job_id} ({job_type}) failed: {str(e)}")
+            self.store.update(job_id, status=FAILED, error=str(e), status_code=500,
+                              payload=None, progress={"stage": "failed"})
+        self._notify()
+
+    def events(self, job_id, keepalive_seconds=15, max_seconds=600, poll_seconds=DEFAULT_EVENT_POLL_SECONDS):
+        """
+        Yield SSE messages for a job's progress until it finishes
+
+        A job running in this process wakes the stream as soon as it reports progress.
+        A job running in another server worker is only seen in the store, which is
+        re-read every poll_seconds.
+        """
+        last_seen = None
+        deadline = time.time() + max_seconds
+        last_sent = time.time()
+        while time.time() < deadline:
+            job = self.store.get(job_id)
+            if job is None:
+                yield format_sse({"error": "Job not found"}, event="error")
+                return
+            snapshot = (job["status"], job["updatedAt"])
+            if snapshot != last_seen:
+                last_seen = snapshot
+                if job["status"] in TERMINAL_STATUSES:
+                    yield format_sse(job, event="done")
+                    return
+                yield format_sse({"status": job["status"], "progress": job["progress"]}, event="progress")
+                last_sent = time.time()
+            elif time.time() - last_sent >= keepalive_seconds:
+                yield ": keepalive\n\n"
+                last_sent = time.time()
+            with self._changed:
+                self._changed.wait(timeout=poll_seconds)
+        yield format_sse({"error": "Stream timed out, poll the job instead"}, event="timeout")
+
+    def stats(self):
+        return {
+            "concurrency": dict(self._limits),
+            "running": self._running,
+            "queue_depth": {job_type: pool._work_queue.qsize() for job_type, pool in self._pools.items()},
+            "jobs": self.store.counts()
+        }
+
+    def drain(self, timeout=None):
+        """
+        Stop starting jobs and wait up to timeout seconds for the running ones
+
+        Jobs that have not started stay queued in the store for the next process to
+        recover, as do running jobs that outlast the timeout.
+
+        Returns:
+            True when no job is still running
+        """
+        self._draining = True
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        deadline = None if timeout is None else time.time() + timeout
+        with self._changed:
+            while self._running:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            running = self._running
+        if running:
+            logger.warning(f"{running} jobs still running after {timeout}s, they will be re-queued on restart")
+        return running == 0
+
+    def shutdown(self, wait=True):
+        self._stopped.set()
+        for pool in self._pools.values():
+            pool.shutdown(wait=wait)
@@ -0,0 +1,234 @@
+# Incremental parsing of JSON produced by the LLM.
+# Responses are scanned once, left to right, as chunks arrive: JSONArrayStream hands
+# back each element of the top-level array as soon as its closing bracket is seen, so
+# callers can act on the first match long before the last one has been generated.
+# Code fences and prose around the JSON are skipped.
+
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Characters that change the scanner state outside and inside strings
+_STRUCTURAL = re.compile(r'[\[\]{}",]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class JSONArrayStream:
+    """
+    Yields the elements of the first top-level JSON array in a streamed response
+
+    Usage:
+        stream = JSONArrayStream()
+        for chunk in chunks:
+            for item in stream.feed(chunk):
+                ...
+        remaining = stream.close()
+
+    Elements that are not valid JSON are skipped and counted in `errors`.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        # Start of the current top-level element, or None once it has been emitted
+        self._element_start = None
+        self._object_start = None
+        self.started = False
+        self.finished = False
+        self.count = 0
+        self.errors = 0
+
+    def _emit(self, raw, items):
+        raw = raw.strip()
+        if not raw:
+            return
+        try:
+            items.append(json.loads(raw))
+            self.count += 1
+        except json.JSONDecodeError as e:
+            self.errors += 1
+            logger.debug(f"Skipping invalid array element ({str(e)}): {raw[:80]}")
+
+    def feed(self, chunk):
+        """Add the next piece of the response; returns the elements it completed"""
+        items = []
+        if self._object_start is not None:
+            self._text += chunk or ""
+            return items
+        if self.finished or not chunk:
+            return items
+        text = self._text + chunk
+        pos = self._pos
+        while True:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(text, pos)
+                if match is None:
+                    pos = len(text)
+                    break
+                if match.group() == "\\":
+                    if match.end() >= len(text):
+                        # The escaped character has not arrived yet
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                continue
+
+            match = _STRUCTURAL.search(text, pos)
+            if match is None:
+                pos = len(text)
+                break
+            char = match.group()
+            pos = match.end()
+
+            if not self.started:
+                if char == "[":
+                    self.started = True
+                    self._depth = 1
+                    self._element_start = pos
+                elif char == "{":
+                    # A single object (e.g. {"matches": [...]}) is only parsed by close()
+                    self._object_start = match.start()
+                    break
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 1 and self._element_start is not None:
+                    self._emit(text[self._element_start:pos], items)
+                    self._element_start = None
+                elif self._depth == 0:
+                    # End of the array; a scalar last element is still pending
+                    if self._element_start is not None:
+                        self._emit(text[self._element_start:match.start()], items)
+                    self.finished = True
+                    break
+            elif self._depth == 1:
+                # Comma between elements
+                if self._element_start is not None:
+                    self._emit(text[self._element_start:match.start()], items)
+                self._element_start = pos
+
+        # Drop what has been consumed so the buffer only holds the element in progress
+        keep_from = pos if self._element_start is None else min(pos, self._element_start)
+        if self._object_start is not None:
+            keep_from = self._object_start
+            self._object_start = 0
+        self._text = text[keep_from:]
+        self._pos = pos - keep_from
+        if self._element_start is not None:
+            self._element_start -= keep_from
+        return items
+
+    def close(self):
+        """
+        Finish the stream; returns any elements still pending
+
+        Raises:
+            ValueError if the response held no JSON array
+        """
+        if self._object_start is not None:
+            value = parse_json_object(self._text)
+            lists = [v for v in value.values() if isinstance(v, list)]
+            if not lists:
+                raise ValueError("Response is a JSON object without an array")
+            self.finished = True
+            self.count += len(lists[0])
+            return lists[0]
+        if not self.started:
+            raise ValueError("No JSON array in response")
+        if not self.finished:
+            logger.warning(f"JSON array ended early after {self.count} elements")
+        return []
+
+
+def iter_json_array(chunks):
+    """Yield each element of the JSON array spread over an iterable of text chunks"""
+    stream = JSONArrayStream()
+    for chunk in chunks:
+        yield from stream.feed(chunk)
+    yield from stream.close()
+
+
+def parse_json_array(text):
+    """Every element of the JSON array in a complete response"""
+    stripped = (text or "").strip()
+    if stripped.startswith("["):
+        # Schema-constrained responses are plain JSON, which json.loads handles fastest
+        try:
+            value = json.loads(stripped)
+            if isinstance(value, list):
+                return value
+        except json.JSONDecodeError:
+            pass
+    return list(iter_json_array([stripped]))
+
+
+def parse_json_object(text):
+    """
+    The first complete JSON object in a response, skipping code fences and prose
+
+    Raises:
+        ValueError if no complete object is found
+    """
+    text = (text or "").strip()
+    if text.startswith("{"):
+        try:
+            value = json.loads(text)
+            if isinstance(value, dict):
+                return value
+        except json.JSONDecodeError:
+            pass
+    # One left-to-right pass: a candidate runs from an opening brace at depth 0 to the
+    # brace that closes it, and a candidate that is not valid JSON is skipped, never
+    # rescanned, so unbalanced or garbage output costs linear time
+    depth = 0
+    in_string = False
+    start = None
+    pos = 0
+    while True:
+        if in_string:
+            match = _STRING_SPECIAL.search(text, pos)
+            if match is None:
+                break
+            if match.group() == "\\":
+                pos = match.end() + 1
+                continue
+            in_string = False
+            pos = match.end()
+            continue
+        match = _STRUCTURAL.search(text, pos)
+        if match is None:
+            break
+        char = match.group()
+        pos = match.end()
+        if depth == 0:
+            # Between candidates only an opening brace matters; prose may hold stray quotes
+            if char == "{":
+                start = match.start()
+                depth = 1
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+            if depth == 0:
+                try:
+                    value = json.loads(text[start:pos])
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(value, dict):
+                    return value
+    raise ValueError("No JSON object in response")
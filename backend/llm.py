@@ -0,0 +1,433 @@
+# Shared LLM client layer.
+# One process-wide client builds the model handle once and reuses its transport,
+# applies a deadline and jittered retries to every call, and records latency and
+# token counts. FakeLLMClient implements the same interface for tests and benchmarks.
+
+import contextlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", 60))
+DEFAULT_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_CAP_SECONDS = 8.0
+
+# Characters per chunk when the fake backend streams
+FAKE_CHUNK_CHARS = 64
+
+# Admission control per process: calls running at once, calls allowed to wait for a
+# slot, and the longest wait before a call is turned away without reaching the backend
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+DEFAULT_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", 16))
+DEFAULT_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("LLM_QUEUE_TIMEOUT_SECONDS", 10))
+
+
+class LLMError(RuntimeError):
+    """Raised when an LLM call fails after all retries or its deadline"""
+
+
+class LLMOverloadedError(LLMError):
+    """Raised when a call is refused because the LLM backend is saturated"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """
+    Bounded concurrency with a bounded wait queue in front of the LLM backend
+
+    Requests beyond max_concurrency wait for a slot; when max_queue requests are
+    already waiting, or no slot frees up within queue_timeout, LLMOverloadedError is
+    raised right away, so request threads never pile up behind a slow backend.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_queue=DEFAULT_MAX_QUEUE,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        # Moving average of how long a call holds its slot, for Retry-After estimates
+        self._hold_seconds = 1.0
+        self._stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    def saturated(self):
+        """True when a new call would be rejected immediately"""
+        with self._condition:
+            return self._in_flight >= self.max_concurrency and self._waiting >= self.max_queue
+
+    def _estimate_retry_after(self):
+        backlog = (self._waiting + 1) / self.max_concurrency
+        return max(1, min(60, math.ceil(self._hold_seconds * backlog)))
+
+    def retry_after(self):
+        """Whole seconds until a slot is likely to be free"""
+        with self._condition:
+            return self._estimate_retry_after()
+
+    def _reject(self, counter, message):
+        self._stats[counter] += 1
+        metrics.llm_rejections.inc(reason=counter[len("rejected_"):])
+        logger.warning(f"LLM call rejected: {message}")
+        raise LLMOverloadedError(message, self._estimate_retry_after())
+
+    @contextlib.contextmanager
+    def slot(self, timeout=None):
+        """Hold one of the concurrent call slots for the duration of the block"""
+        wait = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        with self._condition:
+            if self._in_flight >= self.max_concurrency:
+                if self._waiting >= self.max_queue:
+                    self._reject("rejected_queue_full", f"{self._waiting} calls already waiting")
+                self._waiting += 1
+                self._stats["queued"] += 1
+                deadline = time.monotonic() + wait
+                try:
+                    while self._in_flight >= self.max_concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject("rejected_timeout", f"no slot free after {wait}s")
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._in_flight += 1
+            self._stats["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.monotonic() - started)
+                self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return dict(self._stats, in_flight=self._in_flight, waiting=self._waiting,
+                        max_concurrency=self.max_concurrency, max_queue=self.max_queue,
+                        queue_timeout_seconds=self.queue_timeout)
+
+
+class LLMResponse:
+    """Text of a completed call plus its usage and latency"""
+
+    def __init__(self, text, prompt_tokens=0, output_tokens=0, latency=0.0, attempts=1):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+        self.latency = latency
+        self.attempts = attempts
+
+
+class BaseLLMClient:
+    """
+    Deadline, retry and accounting logic shared by every backend
+
+    Subclasses implement _call(prompt, timeout) returning (text, prompt_tokens, output_tokens).
+    """
+
+    name = "base"
+
+    def __init__(self, model_name, timeout=DEFAULT_TIMEOUT_SECONDS, max_retries=DEFAULT_MAX_RETRIES, gate=None):
+        self.model_name = model_name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.gate = gate or AdmissionGate()
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "failures": 0,
+            "retries": 0,
+            "latency_seconds_total": 0.0,
+            "latency_seconds_max": 0.0,
+            "prompt_tokens": 0,
+            "output_tokens": 0
+        }
+
+    def warm(self):
+        """Load the SDK and build the model handle ahead of the first call"""
+
+    def _call(self, prompt, timeout, schema=None):
+        raise NotImplementedError
+
+    def _stream(self, prompt, timeout, schema=None):
+        """Yield (text, prompt_tokens, output_tokens) per chunk; backends without streaming send one chunk"""
+        yield self._call(prompt, timeout, schema)
+
+    def _is_retryable(self, error):
+        # ValueError is what the SDK raises for blocked or empty candidates; retrying won't help
+        return not isinstance(error, (ValueError, TypeError))
+
+    def _backoff(self, error, attempt, started, deadline):
+        """Seconds to wait before the next attempt; raises LLMError when no attempt is left"""
+        backoff = random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+        out_of_time = time.monotonic() + backoff >= deadline
+        if attempt > self.max_retries or out_of_time or not self._is_retryable(error):
+            self._record(time.monotonic() - started, 0, 0, failed=True)
+            raise LLMError(f"{self.model_name} call failed after {attempt} attempt(s): {str(error)}") from error
+        with self._lock:
+            self._stats["retries"] += 1
+        logger.warning(f"{self.model_name} call failed ({str(error)}), retrying in {backoff:.2f}s")
+        return backoff
+
+    def generate(self, prompt, timeout=None, schema=None):
+        """
+        Run one prompt with a deadline and jittered exponential backoff between attempts
+
+        Args:
+            prompt: Prompt text
+            timeout: Overall deadline in seconds across all attempts (defaults to self.timeout)
+            schema: Optional JSON schema (dict); the response is then constrained to JSON
+                matching it where the backend supports that
+
+        Returns:
+            LLMResponse
+
+        Raises:
+            LLMOverloadedError if the admission gate turned the call away
+            LLMError if every attempt failed or the deadline passed
+        """
+        budget = timeout if timeout is not None else self.timeout
+        with self.gate.slot(budget):
+            started = time.monotonic()
+            deadline = started + budget
+            attempt = 0
+            while True:
+                attempt += 1
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise TimeoutError(f"LLM deadline of {budget}s exceeded")
+                    text, prompt_tokens, output_tokens = self._call(prompt, remaining, schema)
+                    latency = time.monotonic() - started
+                    self._record(latency, prompt_tokens, output_tokens, failed=False)
+                    return LLMResponse(text, prompt_tokens, output_tokens, latency, attempt)
+                except Exception as e:
+                    time.sleep(self._backoff(e, attempt, started, deadline))
+
+    def stream(self, prompt, timeout=None, schema=None):
+        """
+        Run one prompt and yield the response text piece by piece as it is generated
+
+        Same deadline, retries and schema as generate(), except that once any text has
+        been yielded a failure is raised instead of retried, because the caller has
+        already acted on part of the response.
+
+        Raises:
+            LLMOverloadedError if the admission gate turned the call away
+            LLMError if every attempt failed, the deadline passed or the stream broke off
+        """
+        budget = timeout if timeout is not None else self.timeout
+        # The slot is held until the caller has read the whole stream or dropped it
+        with self.gate.slot(budget):
+            started = time.monotonic()
+            deadline = started + budget
+            attempt = 0
+            while True:
+                attempt += 1
+                remaining = deadline - time.monotonic()
+                yielded = False
+                prompt_tokens = output_tokens = 0
+                try:
+                    if remaining <= 0:
+                        raise TimeoutError(f"LLM deadline of {budget}s exceeded")
+                    for text, chunk_prompt_tokens, chunk_output_tokens in self._stream(prompt, remaining, schema):
+                        prompt_tokens = chunk_prompt_tokens or prompt_tokens
+                        output_tokens = chunk_output_tokens or output_tokens
+                        if text:
+                            yielded = True
+                            yield text
+                    self._record(time.monotonic() - started, prompt_tokens, output_tokens, failed=False)
+                    return
+                except Exception as e:
+                    if yielded:
+                        self._record(time.monotonic() - started, prompt_tokens, output_tokens, failed=True)
+                        raise LLMError(f"{self.model_name} stream broke off: {str(e)}") from e
+                    time.sleep(self._backoff(e, attempt, started, deadline))
+
+    def _record(self, latency, prompt_tokens, output_tokens, failed):
+        with self._lock:
+            self._stats["calls"] += 1
+            if failed:
+                self._stats["failures"] += 1
+            self._stats["latency_seconds_total"] += latency
+            self._stats["latency_seconds_max"] = max(self._stats["latency_seconds_max"], latency)
+            self._stats["prompt_tokens"] += prompt_tokens or 0
+            self._stats["output_tokens"] += output_tokens or 0
+        metrics.llm_calls.inc(backend=self.name, outcome="failed" if failed else "ok")
+        metrics.llm_call_duration.observe(latency, backend=self.name)
+        metrics.observe_phase("llm_call", latency)
+        metrics.llm_tokens.inc(prompt_tokens or 0, backend=self.name, kind="prompt")
+        metrics.llm_tokens.inc(output_tokens or 0, backend=self.name, kind="output")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["backend"] = self.name
+        stats["model"] = self.model_name
+        stats["admission"] = self.gate.stats()
+        stats["latency_seconds_total"] = round(stats["latency_seconds_total"], 4)
+        stats["latency_seconds_max"] = round(stats["latency_seconds_max"], 4)
+        return stats
+
+
+class GeminiClient(BaseLLMClient):
+    """
+    Google Gemini backend; the model handle and its gRPC channel are built once
+
+    The SDK takes about a second to import, so it is loaded by warm() or the first
+    call rather than when the client is created.
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key, model_name, **kwargs):
+        super().__init__(model_name, **kwargs)
+        self._api_key = api_key
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    def warm(self):
+        self._get_model()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self._api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    @staticmethod
+    def _generation_config(schema):
+        if schema is None:
+            return None
+        return {"response_mime_type": "application/json", "response_schema": schema}
+
+    @staticmethod
+    def _usage(response):
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) if usage else 0
+        output_tokens = getattr(usage, "candidates_token_count", 0) if usage else 0
+        return prompt_tokens, output_tokens
+
+    def _call(self, prompt, timeout, schema=None):
+        response = self._get_model().generate_content(prompt, generation_config=self._generation_config(schema),
+                                                request_options={"timeout": timeout})
+        return (response.text, *self._usage(response))
+
+    def _stream(self, prompt, timeout, schema=None):
+        response = self._get_model().generate_content(prompt, generation_config=self._generation_config(schema),
+                                                request_options={"timeout": timeout}, stream=True)
+        for chunk in response:
+            # The closing chunk may carry only usage metadata and no text
+            yield (chunk.text if chunk.parts else ""), *self._usage(chunk)
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+
+def fake_responder(prompt):
+    """
+    Deterministic stand-in answers for the prompts this backend sends
+
+    Match prompts get every listed mentee paired with a listed mentor, reason prompts
+    get one sentence per mentee, and anything else (the resume prompts) gets a JSON
+    object filling each key named in the prompt.
+    """
+    mentor_ids = re.findall(r"^\s*-\s+(\S+) \(open slots", prompt, re.M)
+    mentee_lines = re.findall(r"^\s*-\s+(\S+?):", prompt, re.M)
+    if mentor_ids and mentee_lines:
+        return json.dumps([
+            {"menteeId": mentee_id, "mentorId": mentor_ids[i % len(mentor_ids)],
+             "reason": "Shared academic interests and goals.", "score": 80}
+            for i, mentee_id in enumerate(mentee_lines)
+        ])
+
+    reason_ids = re.findall(r"^Mentee (\S+?):", prompt, re.M)
+    if reason_ids:
+        return json.dumps([{"menteeId": mentee_id, "reason": "Their interests and goals align well."}
+                           for mentee_id in reason_ids])
+
+    keys_match = re.search(r"exactly these keys:\s*([\w, ]+)", prompt)
+    keys = [key.strip() for key in keys_match.group(1).split(",")] if keys_match else []
+    return json.dumps({key: f"Generated {key} text." for key in keys if key})
+
+
+class FakeLLMClient(BaseLLMClient):
+    """Local, deterministic backend with optional simulated latency"""
+
+    name = "fake"
+
+    def __init__(self, model_name="fake-llm", responder=fake_responder, latency=0.0, **kwargs):
+        super().__init__(model_name, **kwargs)
+        self.responder = responder
+        self.latency = latency
+
+    def _call(self, prompt, timeout, schema=None):
+        if self.latency:
+            time.sleep(min(self.latency, timeout))
+        text = self.responder(prompt)
+        return text, estimate_tokens(prompt), estimate_tokens(text)
+
+    def _stream(self, prompt, timeout, schema=None):
+        # The simulated latency is spread over the chunks, as a streaming model would
+        text = self.responder(prompt)
+        chunks = [text[i:i + FAKE_CHUNK_CHARS] for i in range(0, len(text), FAKE_CHUNK_CHARS)] or [""]
+        deadline = time.monotonic() + timeout
+        for chunk in chunks:
+            if self.latency:
+                time.sleep(max(0.0, min(self.latency / len(chunks), deadline - time.monotonic())))
+            yield chunk, estimate_tokens(prompt), estimate_tokens(text)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def create_client_from_env(api_key, model_name):
+    """
+    Build the client selected by LLM_BACKEND
+
+    LLM_BACKEND: gemini (default) or fake
+    LLM_FAKE_LATENCY: Simulated seconds per call for the fake backend
+
+    Returns:
+        A client, or None when no backend is usable
+    """
+    backend = os.environ.get("LLM_BACKEND", "gemini").lower()
+    if backend == "fake":
+        return FakeLLMClient(latency=float(os.environ.get("LLM_FAKE_LATENCY", 0)))
+    if not api_key or len(api_key) < 10:
+        return None
+    return GeminiClient(api_key, model_name)
+
+
+def get_client():
+    """The process-wide client, or None when AI is disabled"""
+    return _client
+
+
+def set_client(client):
+    """Install the process-wide client (also used to plug in FakeLLMClient)"""
+    global _client
+    with _client_lock:
+        _client = client
+    return client
@@ -0,0 +1,193 @@
+# Process-wide logging setup.
+# Request threads only put records on an in-memory queue; one listener thread per
+# process formats them (JSON lines by default) and writes them to stderr, so a slow or
+# blocked stdout never holds up a request. Each record carries the request ID and route
+# of the work that logged it (see metrics.py).
+#
+# Environment variables:
+#   LOG_FORMAT: "json" (default) or "text" for human-readable lines during development
+#   LOG_LEVEL: Root level, INFO by default
+#   LOG_LEVELS: Per-module levels, e.g. "llm=DEBUG,werkzeug=WARNING"
+#   LOG_DEBUG_SAMPLE_EVERY: Keep the first and then every Nth DEBUG line of each call site (10)
+#   LOG_QUEUE_SIZE: Records waiting for the listener before new ones are dropped (10000)
+
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+import metrics
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_DEBUG_SAMPLE_EVERY = 10
+
+# Attributes every LogRecord has; anything else was passed with extra= and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "route",
+                                                              "sampled"}
+
+
+class ContextFilter(logging.Filter):
+    """Adds the request ID and route of the current context; runs in the logging thread"""
+
+    def filter(self, record):
+        record.request_id = metrics.current_request_id() or "-"
+        record.route = metrics.current_route()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes the first and then every Nth DEBUG record of each call site
+
+    Records above DEBUG always pass. A kept record's "sampled" field says how many
+    records it stands for.
+    """
+
+    def __init__(self, every=DEFAULT_DEBUG_SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(1, every)
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        site = (record.name, record.lineno)
+        with self._lock:
+            seen = self._seen.get(site, 0)
+            self._seen[site] = seen + 1
+        if seen % self.every:
+            return False
+        record.sampled = 1 if seen == 0 else self.every
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with the message, context and any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                                          .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            "route": getattr(record, "route", None)
+        }
+        if getattr(record, "sampled", 1) != 1:
+            entry["sampled"] = record.sampled
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback in the logging thread, so the listener never
+        # touches objects the caller may still change, but keep the traceback as its own field
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        prepared = logging.makeLogRecord(dict(vars(record), exc_info=None, exc_text=exc_text))
+        prepared.message = prepared.getMessage()
+        prepared.msg, prepared.args = prepared.message, None
+        return prepared
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.log_records_dropped.inc()
+
+
+def parse_levels(text):
+    """Dict of logger name -> level from a "llm=DEBUG,werkzeug=WARNING" string"""
+    levels = {}
+    for part in (text or "").split(","):
+        name, _, level = part.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+_listener = None
+_handler = None
+_output_handler = None
+_configure_lock = threading.Lock()
+
+
+def _start_listener():
+    global _listener
+    _handler.queue = queue.Queue(maxsize=_handler.queue.maxsize)
+    _listener = logging.handlers.QueueListener(_handler.queue, _output_handler)
+    _listener.start()
+
+
+def configure():
+    """
+    Route the root logger through the queue and apply the levels from the environment
+
+    Safe to call more than once; only the first call installs the handlers. A forked
+    child (gunicorn worker, parse worker) gets its own listener thread automatically.
+    """
+    global _handler, _output_handler
+    with _configure_lock:
+        if _handler is not None:
+            return
+        _output_handler = logging.StreamHandler(sys.stderr)
+        if os.environ.get("LOG_FORMAT", "json").lower() == "text":
+            _output_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        else:
+            _output_handler.setFormatter(JsonFormatter())
+
+        _handler = NonBlockingQueueHandler(queue.Queue(maxsize=int(os.environ.get("LOG_QUEUE_SIZE",
+                                                                                  DEFAULT_QUEUE_SIZE))))
+        _handler.addFilter(SamplingFilter(int(os.environ.get("LOG_DEBUG_SAMPLE_EVERY",
+                                                             DEFAULT_DEBUG_SAMPLE_EVERY))))
+        _handler.addFilter(ContextFilter())
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(_handler)
+        root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+        for name, level in parse_levels(os.environ.get("LOG_LEVELS")).items():
+            logging.getLogger(name).setLevel(level)
+
+        _start_listener()
+        # The listener thread does not survive a fork; start a fresh one with an empty queue
+        os.register_at_fork(after_in_child=_start_listener)
+        atexit.register(shutdown)
+
+
+def shutdown():
+    """Write out the records still queued; called at exit"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def stats():
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0
+    }
@@ -0,0 +1,488 @@
+# Local mentorship matching engine.
+# Scores mentor/mentee pairs (see scoring.py) and assigns every mentee to a
+# mentor under the per-mentor capacity limit (see assignment.py), so the LLM is only needed (optionally)
+# to write the matchReason text for the pairs that were chosen.
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import assignment
+import json_stream
+import metrics
+import prompts
+from scoring import normalize_major, profile_text, score_matrix, tokenize
+
+logger = logging.getLogger(__name__)
+
+# Profile fields that describe what a mentor offers and what a mentee is looking for
+MENTOR_TEXT_FIELDS = ("major", "academicInterests", "mentorStrengths")
+MENTEE_TEXT_FIELDS = ("major", "careerGoals", "challenges")
+
+# Number of pairs sent to the LLM per matchReason request
+REASON_CHUNK_SIZE = 20
+REASON_MAX_WORKERS = 4
+
+# Sharded LLM matching: mentees per prompt, candidate mentors per mentee,
+# concurrent prompts and how often leftover mentees are re-queued
+SHARD_BATCH_SIZE = 25
+SHARD_SHORTLIST_SIZE = 5
+SHARD_MAX_WORKERS = 4
+SHARD_MAX_ROUNDS = 3
+
+# Incremental re-matching: statuses that are never reassigned, and the order in which
+# duplicate matches for one mentee are kept
+FIXED_STATUSES = ("confirmed", "approved")
+STATUS_PRIORITY = {"confirmed": 0, "approved": 1, "pending": 2, "rejected": 3}
+
+
+def to_compatibility_score(raw_score):
+    """Map a [0, 1] score onto the 0-100 compatibility scale shown to users"""
+    return int(round(50 + 50 * min(max(float(raw_score), 0.0), 1.0)))
+
+
+def template_reason(mentor, mentee):
+    """Deterministic matchReason built from what the two profiles share"""
+    reasons = []
+    mentor_major = normalize_major(mentor.get("major"))
+    if mentor_major and mentor_major == normalize_major(mentee.get("major")):
+        reasons.append(f"Both study {mentor.get('major')}")
+
+    mentee_terms = set(tokenize(profile_text(mentee, MENTEE_TEXT_FIELDS)))
+    mentor_terms = set(tokenize(profile_text(mentor, MENTOR_TEXT_FIELDS)))
+    shared = sorted(mentee_terms & mentor_terms)[:5]
+    if shared:
+        reasons.append("their profiles overlap on " + ", ".join(shared))
+
+    if not reasons:
+        return "Match based on compatible academic interests and mentorship expectations."
+    sentence = "; ".join(reasons)
+    return sentence[0].upper() + sentence[1:] + "."
+
+
+def capacity_array(max_mentees_per_mentor, n_mentors):
+    """Per-mentor capacities from one shared limit or a per-mentor sequence"""
+    return np.broadcast_to(np.asarray(max_mentees_per_mentor, dtype=np.int64), (n_mentors,)).copy()
+
+
+def exclude_pairs(scores, mentors, mentees, excluded_pairs):
+    """Set the score of every excluded (menteeId, mentorId) pair to -inf so it is never assigned"""
+    if not excluded_pairs:
+        return scores
+    mentor_index = {m.get("id"): i for i, m in enumerate(mentors)}
+    mentee_index = {m.get("id"): i for i, m in enumerate(mentees)}
+    for mentee_id, mentor_id in excluded_pairs:
+        if mentee_id in mentee_index and mentor_id in mentor_index:
+            scores[mentee_index[mentee_id], mentor_index[mentor_id]] = -np.inf
+    return scores
+
+
+def match_cohort(mentors, mentees, max_mentees_per_mentor, excluded_pairs=None, method="auto"):
+    """
+    Match every mentee to one mentor without exceeding any mentor's capacity
+
+    Args:
+        mentors: List of mentor profile dicts (must carry 'id')
+        mentees: List of mentee profile dicts (must carry 'id')
+        max_mentees_per_mentor: Capacity applied to every mentor, or a per-mentor sequence
+        excluded_pairs: Optional set of (menteeId, mentorId) pairs that must not be matched
+        method: Assignment method, see assignment.solve
+
+    Returns:
+        Tuple of (matches, unmatched_mentee_ids)
+    """
+    if not mentors or not mentees:
+        return [], [m.get("id") for m in mentees]
+    with metrics.span("matching"):
+        scores = exclude_pairs(score_matrix(mentors, mentees), mentors, mentees, excluded_pairs)
+        capacities = capacity_array(max_mentees_per_mentor, len(mentors))
+        assigned = assignment.solve(scores, capacities, method)
+
+    matches = []
+    unmatched = []
+    for mentee_idx, mentor_idx in enumerate(assigned):
+        mentee = mentees[mentee_idx]
+        if mentor_idx < 0:
+            unmatched.append(mentee.get("id"))
+            continue
+        mentor = mentors[mentor_idx]
+        matches.append({
+            "menteeId": mentee.get("id"),
+            "mentorId": mentor.get("id"),
+            "matchReason": template_reason(mentor, mentee),
+            "compatibilityScore": to_compatibility_score(scores[mentee_idx, mentor_idx])
+        })
+
+    logger.info(f"Local matching assigned {len(matches)} of {len(mentees)} mentees "
+                f"across {len(mentors)} mentors")
+    return matches, unmatched
+
+
+def _build_reason_prompt(pairs):
+    """Prompt asking the LLM to explain a small batch of already-chosen pairs"""
+    prompt = prompts.Prompt("match_reasons")
+    prompt.add(
+        "You are helping explain mentor-mentee pairings in a college mentorship program at Trinity.",
+        "For each pair below, write a 1-2 sentence explanation of why it is a good match.",
+        'Return ONLY a JSON array of objects with keys "menteeId" and "reason".',
+        ""
+    )
+    for mentor, mentee in pairs:
+        prompt.add(f"Mentee {mentee.get('id')}: major={prompt.field(mentee.get('major'), 'major')}; "
+                   f"goals={prompt.field(mentee.get('careerGoals'), 'careerGoals')}; "
+                   f"challenges={prompt.field(mentee.get('challenges'), 'challenges')}")
+        prompt.add(f"  Mentor {mentor.get('id')}: major={prompt.field(mentor.get('major'), 'major')}; "
+                   f"interests={prompt.field(mentor.get('academicInterests'), 'academicInterests')}; "
+                   f"strengths={prompt.field(mentor.get('mentorStrengths'), 'mentorStrengths')}")
+    return prompt.build()
+
+
+# Response schemas, so the model returns bare JSON that can be parsed as it streams
+REASON_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"menteeId": {"type": "string"}, "reason": {"type": "string"}},
+        "required": ["menteeId", "reason"]
+    }
+}
+SHARD_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "menteeId": {"type": "string"},
+            "mentorId": {"type": "string"},
+            "reason": {"type": "string"},
+            "score": {"type": "number"}
+        },
+        "required": ["menteeId", "mentorId", "reason", "score"]
+    }
+}
+
+
+def iter_response_items(response):
+    """
+    Objects of the JSON array in an LLM response, each as soon as it is complete
+
+    Args:
+        response: The response text, or an iterable of text chunks (see llm stream())
+    """
+    chunks = [response] if isinstance(response, str) or response is None else response
+    for item in json_stream.iter_json_array(chunks):
+        if isinstance(item, dict):
+            yield item
+
+
+def write_match_reasons(matches, mentors_by_id, mentees_by_id, generate_text,
+                        chunk_size=REASON_CHUNK_SIZE, max_workers=REASON_MAX_WORKERS, on_match=None):
+    """
+    Replace template matchReason text with LLM-written explanations
+
+    Pairs are sent in small batches on a bounded thread pool. Any batch that fails
+    keeps its template reasons, so this never drops or changes an assignment.
+
+    Args:
+        matches: Matches from match_cohort, updated in place
+        mentors_by_id: Mentor profiles keyed by ID
+        mentees_by_id: Mentee profiles keyed by ID
+        generate_text: Callable taking (prompt, schema) and returning the response text
+            or an iterable of its chunks
+        on_match: Optional callable given each match once its reason is final, as soon
+            as that reason has streamed in
+
+    Returns:
+        Number of matches whose reason was written by the LLM
+    """
+    chunks = [matches[i:i + chunk_size] for i in range(0, len(matches), chunk_size)]
+    lock = threading.Lock()
+    written = 0
+
+    def emit(match, reason=None):
+        nonlocal written
+        with lock:
+            if reason:
+                match["matchReason"] = reason
+                written += 1
+            if on_match:
+                on_match(match)
+
+    def run_chunk(chunk):
+        pairs = [(mentors_by_id[m["mentorId"]], mentees_by_id[m["menteeId"]]) for m in chunk]
+        pending = {str(m["menteeId"]): m for m in chunk}
+        try:
+            with metrics.span("prompt_build"):
+                prompt = _build_reason_prompt(pairs)
+            for item in iter_response_items(generate_text(prompt, REASON_SCHEMA)):
+                match = pending.pop(str(item.get("menteeId")), None)
+                if match is not None:
+                    emit(match, str(item["reason"]) if item.get("reason") else None)
+        finally:
+            # Whatever the response did not cover keeps its template reason
+            for match in pending.values():
+                emit(match)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks) or 1))) as pool:
+        for chunk, future in [(chunk, pool.submit(metrics.bind_context(run_chunk), chunk)) for chunk in chunks]:
+            try:
+                future.result()
+            except Exception as e:
+                logger.warning(f"Keeping template reasons for the rest of a batch of {len(chunk)} matches: {str(e)}")
+    return written
+
+
+def _build_shard_prompt(batch_mentees, shortlist_mentors, slots_left):
+    """Prompt ranking one batch of mentees against its shortlist of candidate mentors"""
+    prompt = prompts.Prompt("match_shard")
+    prompt.add(
+        "You are an AI assistant helping match mentors with mentees in a college mentorship program at Trinity.",
+        "Match each mentee below with exactly one of the listed mentors based on academic interests and major",
+        "alignment, mentor strengths vs. mentee challenges, and career goals.",
+        "Do not give a mentor more mentees than their open slots. Use only the IDs listed.",
+        'Return ONLY a JSON array of objects with keys "menteeId", "mentorId", "reason" and "score" (0-100).',
+        "",
+        "MENTORS:"
+    )
+    for mentor_idx, mentor in shortlist_mentors:
+        prompt.add(f"- {mentor.get('id')} (open slots: {int(slots_left[mentor_idx])}): "
+                   f"major={prompt.field(mentor.get('major'), 'major')}; "
+                   f"interests={prompt.field(mentor.get('academicInterests'), 'academicInterests')}; "
+                   f"strengths={prompt.field(mentor.get('mentorStrengths'), 'mentorStrengths')}")
+    prompt.add("", "MENTEES:")
+    for mentee in batch_mentees:
+        prompt.add(f"- {mentee.get('id')}: major={prompt.field(mentee.get('major'), 'major')}; "
+                   f"goals={prompt.field(mentee.get('careerGoals'), 'careerGoals')}; "
+                   f"challenges={prompt.field(mentee.get('challenges'), 'challenges')}; "
+                   f"expectations={prompt.field(mentee.get('expectations'), 'expectations')}")
+    return prompt.build()
+
+
+def _shortlist(scores, batch, remaining, shortlist_size):
+    """Union of each batch mentee's best mentors that still have capacity"""
+    available = np.flatnonzero(remaining > 0)
+    if len(available) == 0:
+        return []
+    k = min(shortlist_size, len(available))
+    block = scores[np.ix_(batch, available)]
+    top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    return sorted(set(available[top.ravel()].tolist()))
+
+
+def match_cohort_sharded(mentors, mentees, max_mentees_per_mentor, generate_text,
+                         batch_size=SHARD_BATCH_SIZE, shortlist_size=SHARD_SHORTLIST_SIZE,
+                         max_workers=SHARD_MAX_WORKERS, max_rounds=SHARD_MAX_ROUNDS, excluded_pairs=None,
+                         text_vectors=None, method="auto", on_match=None, on_retract=None):
+    """
+    LLM-ranked matching split into many small prompts that run concurrently
+
+    Mentees are split into batches, each sent with a locally pre-filtered shortlist
+    of candidate mentors. Each proposal is merged under the global per-mentor capacity
+    as soon as it has streamed in; mentees left unmatched or given an invalid ID are
+    re-queued for the next round.
+    The merged result is then validated and repaired (see assignment.repair), which
+    also assigns anything still unmatched locally.
+
+    Args:
+        mentors: List of mentor profile dicts (must carry 'id')
+        mentees: List of mentee profile dicts (must carry 'id')
+        max_mentees_per_mentor: Capacity applied to every mentor, or a per-mentor sequence
+        generate_text: Callable taking (prompt, schema) and returning the response text
+            or an iterable of its chunks
+        excluded_pairs: Optional set of (menteeId, mentorId) pairs that must not be matched
+        text_vectors: Optional precomputed (mentee_vectors, mentor_vectors) of L2-normalized rows, e.g. from
+            the embedding index; when given the shortlists are the mentors most similar to each mentee,
+            otherwise the best-scoring ones. Scores and the final assignment never use them.
+        method: Assignment method for the mentees the LLM did not place, see assignment.solve
+        on_match: Optional callable given each match as soon as it is accepted. If repair
+            moves that mentee to another mentor, it is called again with the new match,
+            which replaces the earlier one
+        on_retract: Optional callable given an accepted match that repair dropped, leaving
+            its mentee unmatched
+
+    Returns:
+        Tuple of (matches, unmatched_mentee_ids, stats)
+    """
+    stats = {"llm_calls": 0, "failed_calls": 0, "requeued": 0, "rejected_proposals": 0, "local_fallback": 0}
+    if not mentors or not mentees:
+        return [], [m.get("id") for m in mentees], stats
+    with metrics.span("matching"):
+        scores = exclude_pairs(score_matrix(mentors, mentees), mentors, mentees, excluded_pairs)
+        if text_vectors is not None:
+            mentee_vecs, mentor_vecs = text_vectors
+            similarity = np.asarray(mentee_vecs, dtype=np.float32) @ np.asarray(mentor_vecs, dtype=np.float32).T
+            retrieval = exclude_pairs(similarity, mentors, mentees, excluded_pairs)
+        else:
+            retrieval = scores
+    remaining = capacity_array(max_mentees_per_mentor, len(mentors))
+    mentor_index = {str(m.get("id")): i for i, m in enumerate(mentors)}
+    mentee_index = {str(m.get("id")): i for i, m in enumerate(mentees)}
+    assigned = {}
+    lock = threading.Lock()
+
+    def accept(item, batch_set, shortlist_set):
+        """Take one streamed proposal if it is valid and its mentor still has a slot"""
+        mentee_idx = mentee_index.get(str(item.get("menteeId")))
+        mentor_idx = mentor_index.get(str(item.get("mentorId")))
+        if (mentee_idx not in batch_set or mentor_idx not in shortlist_set
+                or not np.isfinite(scores[mentee_idx, mentor_idx])):
+            with lock:
+                stats["rejected_proposals"] += 1
+            return
+        try:
+            llm_score = float(item.get("score", item.get("compatibilityScore")))
+        except (ValueError, TypeError):
+            llm_score = to_compatibility_score(scores[mentee_idx, mentor_idx])
+        reason = item.get("reason")
+        with lock:
+            if mentee_idx in assigned or remaining[mentor_idx] <= 0:
+                stats["rejected_proposals"] += 1
+                return
+            remaining[mentor_idx] -= 1
+            match = assigned[mentee_idx] = {
+                "menteeId": mentees[mentee_idx].get("id"),
+                "mentorId": mentors[mentor_idx].get("id"),
+                "matchReason": str(reason) if reason else template_reason(mentors[mentor_idx], mentees[mentee_idx]),
+                "compatibilityScore": min(max(llm_score, 0.0), 100.0)
+            }
+            if on_match:
+                on_match(match)
+
+    def run_batch(batch, shortlist):
+        with lock, metrics.span("prompt_build"):
+            prompt = _build_shard_prompt([mentees[i] for i in batch],
+                                         [(i, mentors[i]) for i in shortlist], remaining)
+        batch_set, shortlist_set = set(batch), set(shortlist)
+        # Proposals are merged as they stream in, so the first matches are known early
+        for item in iter_response_items(generate_text(prompt, SHARD_SCHEMA)):
+            accept(item, batch_set, shortlist_set)
+
+    queue = list(range(len(mentees)))
+    for round_number in range(max_rounds):
+        if not queue or not (remaining > 0).any():
+            break
+        batches = [queue[i:i + batch_size] for i in range(0, len(queue), batch_size)]
+        jobs = [(batch, _shortlist(retrieval, batch, remaining, shortlist_size)) for batch in batches]
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as pool:
+            futures = [(batch, pool.submit(metrics.bind_context(run_batch), batch, shortlist))
+                       for batch, shortlist in jobs]
+            for batch, future in futures:
+                stats["llm_calls"] += 1
+                try:
+                    future.result()
+                except Exception as e:
+                    stats["failed_calls"] += 1
+                    logger.warning(f"Shard of {len(batch)} mentees failed in round {round_number + 1}: {str(e)}")
+
+        queue = [i for i in queue if i not in assigned]
+        if queue and round_number + 1 < max_rounds:
+            stats["requeued"] += len(queue)
+            logger.info(f"Re-queueing {len(queue)} mentees after round {round_number + 1}")
+
+    # Check the merged proposals against the constraints once more and place whatever
+    # the LLM could not with the remaining capacity
+    proposed = np.full(len(mentees), -1, dtype=np.int64)
+    for mentee_idx, match in assigned.items():
+        proposed[mentee_idx] = mentor_index[str(match["mentorId"])]
+    with metrics.span("matching"):
+        final, report = assignment.repair(scores, capacity_array(max_mentees_per_mentor, len(mentors)), proposed,
+                                          method)
+    stats["rejected_proposals"] += report["invalid"] + report["over_capacity"]
+    stats["local_fallback"] = report["filled"]
+
+    unmatched = []
+    for mentee_idx, mentor_idx in enumerate(final.tolist()):
+        if mentor_idx < 0:
+            dropped = assigned.pop(mentee_idx, None)
+            unmatched.append(mentees[mentee_idx].get("id"))
+            if dropped is not None and on_retract:
+                on_retract(dropped)
+        elif mentor_idx != proposed[mentee_idx]:
+            assigned[mentee_idx] = {
+                "menteeId": mentees[mentee_idx].get("id"),
+                "mentorId": mentors[mentor_idx].get("id"),
+                "matchReason": template_reason(mentors[mentor_idx], mentees[mentee_idx]),
+                "compatibilityScore": to_compatibility_score(scores[mentee_idx, mentor_idx])
+            }
+            if on_match:
+                on_match(assigned[mentee_idx])
+
+    matches = [assigned[i] for i in sorted(assigned)]
+    logger.info(f"Sharded matching assigned {len(matches)} of {len(mentees)} mentees with "
+                f"{stats['llm_calls']} LLM calls ({stats['local_fallback']} assigned locally)")
+    return matches, unmatched, stats
+
+
+def plan_incremental(existing_matches, mentors, mentees, max_mentees_per_mentor, removed_ids=None):
+    """
+    Work out which mentees need a (new) mentor given the matches already stored
+
+    A match of someone who was explicitly removed is released whatever its status, so
+    the other person is planned again instead of staying matched to someone who left.
+    Otherwise confirmed and approved matches are fixed, and pending matches are kept
+    unless the mentee already has a kept match (duplicate) or the mentor is over
+    capacity. Someone who is merely left out of mentors/mentees keeps their matches, so
+    a partial payload never deletes anything. Mentees without a kept match (new,
+    rejected or whose partner was removed) are matched again against the mentors'
+    remaining capacity. Rejected matches stay
+    stored as a record, so a mentee is never re-matched with a mentor they rejected.
+
+    Args:
+        existing_matches: Stored match dicts (with 'id', 'mentorId', 'menteeId', 'status')
+        mentors: Current mentor profile dicts
+        mentees: Current mentee profile dicts
+        max_mentees_per_mentor: Capacity applied to every mentor
+        removed_ids: Optional IDs of mentors and mentees who left the program; all
+            their matches are removed, confirmed and approved ones included
+
+    Returns:
+        Dict with "unchanged" (kept matches), "removed" (matches to delete, each with a
+        "removeReason"), "mentors" and "capacities" (mentors with open slots and how many),
+        "mentees" (mentees to match) and "excluded_pairs"
+    """
+    removed_ids = set(removed_ids or ())
+    mentors = [m for m in mentors if m.get("id") not in removed_ids]
+    mentees = [m for m in mentees if m.get("id") not in removed_ids]
+    load = dict.fromkeys((m.get("id") for m in mentors), 0)
+    unchanged = []
+    removed = []
+    matched_mentees = set()
+    excluded_pairs = set()
+
+    def remove(match, reason):
+        removed.append(dict(match, removeReason=reason))
+
+    def keep(match):
+        unchanged.append(match)
+        matched_mentees.add(match.get("menteeId"))
+        if match.get("mentorId") in load:
+            load[match.get("mentorId")] += 1
+
+    ordered = sorted(existing_matches, key=lambda m: STATUS_PRIORITY.get(m.get("status"), len(STATUS_PRIORITY)))
+    for match in ordered:
+        mentor_id, mentee_id, status = match.get("mentorId"), match.get("menteeId"), match.get("status")
+        if status == "rejected":
+            excluded_pairs.add((mentee_id, mentor_id))
+        elif mentor_id in removed_ids or mentee_id in removed_ids:
+            remove(match, "participant_removed")
+        elif status in FIXED_STATUSES:
+            keep(match)
+        elif mentee_id in matched_mentees:
+            remove(match, "duplicate")
+        elif mentor_id in load and load[mentor_id] >= max_mentees_per_mentor:
+            remove(match, "over_capacity")
+        else:
+            # Kept even when a person is absent from this payload; only removed_ids delete
+            keep(match)
+
+    open_mentors = [m for m in mentors if load[m.get("id")] < max_mentees_per_mentor]
+    return {
+        "unchanged": unchanged,
+        "removed": removed,
+        "mentors": open_mentors,
+        "capacities": [max_mentees_per_mentor - load[m.get("id")] for m in open_mentors],
+        "mentees": [m for m in mentees if m.get("id") not in matched_mentees],
+        "excluded_pairs": excluded_pairs
+    }
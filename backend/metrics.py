@@ -0,0 +1,322 @@
+# Request metrics, timing spans and request IDs.
+# Counters and histograms are kept in process memory and served in the Prometheus text
+# format at /metrics. Every request gets an ID (taken from X-Request-ID when the client or
+# load balancer sends one) that is added to log lines and carried into the background
+# threads that work on the request. span() times one phase of the work, e.g. text
+# extraction or the LLM call, under the route that triggered it.
+# Under gunicorn each worker keeps its own metrics and /metrics shows the answering worker's.
+
+import bisect
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+import uuid
+
+from flask import request
+
+logger = logging.getLogger(__name__)
+# One line per finished request, replacing the server's own access log
+access_logger = logging.getLogger("access")
+
+# Seconds; the top buckets cover slow LLM calls and long match runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Phases timed by span(); other names work too but these are the ones the server uses
+PHASES = ("extraction", "prompt_build", "llm_call", "parse", "matching", "db_read", "db_write")
+
+# Repository methods that change data; every other repository call is timed as a read
+WRITE_METHODS = {"set", "set_many", "create_many", "update", "delete"}
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Request ID and route of the work running in the current thread or context. Work
+# started outside a request (recovered jobs, dependency checks) is labelled "background".
+request_id_var = contextvars.ContextVar("request_id", default=None)
+route_var = contextvars.ContextVar("route", default="background")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes the labels {', '.join(self.labels) or '(none)'}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Current value per label set, usually refreshed by a collector at scrape time"""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count of observed values per label set"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # One count per bucket plus +Inf, then the sum
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def _render_series(self, key, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', _format_value(bound))])} "
+                         f"{cumulative}")
+        labels = _format_labels(self.labels, key)
+        lines.append(f"{self.name}_sum{labels} {series[-1]!r}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The metrics of one process and the callbacks that refresh gauges before a scrape"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collector):
+        """Call collector() before every scrape, e.g. to set gauges from a pool's stats"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics.values())
+        for collector in collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route, method and status code", ("route", "method", "status"))
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Time to produce the response of an HTTP request", ("route", "method"))
+phase_duration = registry.histogram(
+    "phase_duration_seconds", "Time spent in one phase of the work for a route", ("route", "phase"))
+db_operations = registry.counter(
+    "db_operations_total", "Repository calls by collection and method", ("collection", "operation"))
+llm_calls = registry.counter(
+    "llm_calls_total", "LLM calls by backend and outcome (ok, failed)", ("backend", "outcome"))
+llm_rejections = registry.counter(
+    "llm_rejected_calls_total", "LLM calls turned away by admission control (queue_full, timeout)", ("reason",))
+llm_call_duration = registry.histogram(
+    "llm_call_duration_seconds", "Time from admission to the last response token, retries included", ("backend",))
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Tokens sent to and generated by the LLM", ("backend", "kind"))
+prompt_tokens = registry.histogram(
+    "prompt_tokens", "Estimated tokens of each prompt built, by prompt", ("prompt",),
+    buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000))
+cache_requests = registry.counter(
+    "content_cache_requests_total", "Generated content cache lookups by result (hit, miss)", ("result",))
+mock_fallbacks = registry.counter(
+    "mock_fallbacks_total", "Responses served from mock or template content instead of the LLM", ("reason",))
+rate_limited = registry.counter(
+    "rate_limited_requests_total", "Requests answered 429 by the per-client rate limits", ("route",))
+jobs_finished = registry.counter(
+    "jobs_finished_total", "Background jobs by type and final status", ("job_type", "status"))
+llm_in_flight = registry.gauge("llm_in_flight_calls", "LLM calls holding an admission slot")
+llm_waiting = registry.gauge("llm_waiting_calls", "LLM calls waiting for an admission slot")
+job_queue_depth = registry.gauge("job_queue_depth", "Background jobs waiting for a worker thread", ("job_type",))
+parse_pool_in_flight = registry.gauge("parse_pool_in_flight", "Documents being parsed or waiting for a parse worker")
+log_records_dropped = registry.counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+
+
+def current_request_id():
+    return request_id_var.get()
+
+
+def current_route():
+    return route_var.get()
+
+
+def observe_phase(phase, seconds, route=None):
+    """Record an already measured phase duration under the current route"""
+    phase_duration.observe(seconds, route=route or route_var.get(), phase=phase)
+
+
+@contextlib.contextmanager
+def span(phase, route=None):
+    """Time the block as one phase of the current route's work"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_phase(phase, time.perf_counter() - started, route)
+
+
+def bind_context(fn):
+    """
+    fn wrapped to run with the caller's request ID and route
+
+    Thread pools do not carry context variables into their threads; wrap the callable
+    when submitting it. Each call of bind_context copies the context once, so wrap per
+    submission rather than reusing one wrapped callable across threads.
+    """
+    context = contextvars.copy_context()
+
+    def bound(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return bound
+
+
+def _valid_request_id(value):
+    return value if value and len(value) <= 128 and value.isprintable() else None
+
+
+def init_app(app):
+    """Assign request IDs and time every request of a Flask app"""
+
+    @app.before_request
+    def start_request_metrics():
+        request_id_var.set(_valid_request_id(request.headers.get(REQUEST_ID_HEADER)) or uuid.uuid4().hex)
+        # The URL rule, not the path, so /jobs/<job_id> is one series
+        route_var.set(request.url_rule.rule if request.url_rule else "unmatched")
+        request.environ["metrics.started"] = time.perf_counter()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        started = request.environ.get("metrics.started")
+        if started is not None:
+            route = route_var.get()
+            elapsed = time.perf_counter() - started
+            # Streamed responses are timed up to their headers; their work shows in the phase spans
+            http_request_duration.observe(elapsed, route=route, method=request.method)
+            http_requests.inc(route=route, method=request.method, status=response.status_code)
+            access_logger.info(f"{request.method} {request.path} {response.status_code} {elapsed * 1000:.1f}ms",
+                               extra={"method": request.method, "path": request.path,
+                                      "status": response.status_code, "duration_ms": round(elapsed * 1000, 1),
+                                      "remote_addr": request.remote_addr})
+        if request_id_var.get():
+            response.headers[REQUEST_ID_HEADER] = request_id_var.get()
+        return response
+
+    @app.teardown_request
+    def clear_request_context(error=None):
+        # Server threads are reused; later work in this thread is not part of the request
+        request_id_var.set(None)
+        route_var.set("background")
+
+    return app
+
+
+class TimedRepository:
+    """Repository wrapper that times every call as a db_read or db_write span"""
+
+    def __init__(self, repository, collection):
+        self._repository = repository
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attribute = getattr(self._repository, name)
+        if name.startswith("_") or not callable(attribute):
+            return attribute
+        phase = "db_write" if name in WRITE_METHODS else "db_read"
+
+        def timed(*args, **kwargs):
+            db_operations.inc(collection=self._collection, operation=name)
+            with span(phase):
+                return attribute(*args, **kwargs)
+        return timed
+
+
+def instrument_storage(data_store):
+    """Time the repository calls of a storage.Storage in place; returns it for chaining"""
+    for collection in ("signups", "matches", "user_files"):
+        setattr(data_store, collection, TimedRepository(getattr(data_store, collection), collection))
+    return data_store
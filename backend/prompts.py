@@ -0,0 +1,150 @@
+# Prompt assembly with size budgets.
+# Text pasted into prompts (resumes, profile fields) is compacted first: layout
+# whitespace is collapsed, page numbers and similar boilerplate are dropped, and lines
+# repeated by PDF extraction (running headers and footers) are kept once. Whatever is
+# still over its token budget is cut at a line or word boundary. Every built prompt logs
+# its estimated size and is recorded in the prompt_tokens histogram.
+
+import logging
+import os
+import re
+
+import llm
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Estimated tokens of resume text in the form generation prompt
+DEFAULT_DOCUMENT_BUDGET = int(os.environ.get("PROMPT_DOCUMENT_TOKEN_BUDGET", 3000))
+
+# Estimated tokens per profile field in the matching prompts; fields not listed get DEFAULT_FIELD_BUDGET.
+# Override with PROMPT_FIELD_BUDGETS, e.g. academicInterests=120,challenges=60
+DEFAULT_FIELD_BUDGETS = {
+    "major": 12,
+    "academicInterests": 80,
+    "mentorStrengths": 60,
+    "careerGoals": 80,
+    "challenges": 60,
+    "expectations": 50
+}
+DEFAULT_FIELD_BUDGET = 60
+
+# Characters per estimated token (see llm.estimate_tokens)
+CHARS_PER_TOKEN = 4
+ELLIPSIS = "..."
+
+_SPACES = re.compile(r"[ \t\u00a0\u2000-\u200b\u3000]+")
+_BULLET = re.compile(r"^[\u2022\u25aa\u25cf\u25e6\u2023\u2043\u25a0\u25a1\u27a2*\u00b7]+\s*")
+_BOILERPLATE = [re.compile(pattern, re.I) for pattern in (
+    r"^(page\s*\d+(\s*(of|/)\s*\d+)?|\d+\s*(of|/)\s*\d+)$",  # page numbers, not bare years
+    r"^(resume|r[ée]sum[ée]|curriculum vitae|cv)$",   # document titles
+    r"^references( are)? available (up)?on request\.?$",
+    r"^[\W_]+$"                                        # rules and lone punctuation
+)]
+
+
+def parse_budgets(text):
+    """Field budgets from a "academicInterests=120,challenges=60" string, on top of the defaults"""
+    budgets = dict(DEFAULT_FIELD_BUDGETS)
+    for part in (text or "").split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+
+try:
+    FIELD_BUDGETS = parse_budgets(os.environ.get("PROMPT_FIELD_BUDGETS"))
+except ValueError as e:
+    logger.error(f"Invalid PROMPT_FIELD_BUDGETS ({str(e)}), using the defaults")
+    FIELD_BUDGETS = dict(DEFAULT_FIELD_BUDGETS)
+
+
+def compact_lines(text):
+    """
+    Lines of text without layout whitespace, boilerplate or repeats
+
+    Runs of spaces collapse to one, bullet glyphs are removed, and empty lines, page
+    numbers and lines seen before (compared case-insensitively) are dropped.
+    """
+    seen = set()
+    lines = []
+    for line in (text or "").splitlines():
+        line = _BULLET.sub("", _SPACES.sub(" ", line).strip())
+        if not line or any(pattern.match(line) for pattern in _BOILERPLATE):
+            continue
+        key = line.casefold()
+        if key in seen:
+            continue
+        seen.add(key)
+        lines.append(line)
+    return lines
+
+
+def truncate(text, max_tokens):
+    """text cut to about max_tokens estimated tokens at a word boundary, marked with an ellipsis"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars - len(ELLIPSIS)]
+    if " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip(" ,;:") + ELLIPSIS
+
+
+class Prompt:
+    """
+    Prompt text built line by line
+
+    document() and field() compact and budget the text they are given and keep count of
+    what was dropped; build() returns the prompt and logs its size.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lines = []
+        self.input_tokens = 0
+        self.truncated = 0
+
+    def add(self, *lines):
+        self.lines.extend(lines)
+        return self
+
+    def document(self, text, max_tokens=None):
+        """A whole document (e.g. resume text) as compact lines, keeping whole lines up to the budget"""
+        budget = DEFAULT_DOCUMENT_BUDGET if max_tokens is None else max_tokens
+        self.input_tokens += llm.estimate_tokens(text or "")
+        kept = []
+        used = 0
+        for line in compact_lines(text):
+            cost = llm.estimate_tokens(line + "\n")
+            if used + cost > budget:
+                self.truncated += 1
+                if used < budget:
+                    kept.append(truncate(line, budget - used))
+                break
+            kept.append(line)
+            used += cost
+        return "\n".join(kept)
+
+    def field(self, value, name):
+        """One profile field on a single line, cut to the field's budget"""
+        text = " ".join(compact_lines(str(value) if value is not None else ""))
+        if value:
+            self.input_tokens += llm.estimate_tokens(str(value))
+        budget = FIELD_BUDGETS.get(name, DEFAULT_FIELD_BUDGET)
+        if len(text) > budget * CHARS_PER_TOKEN:
+            self.truncated += 1
+            text = truncate(text, budget)
+        return text
+
+    def build(self):
+        text = "\n".join(self.lines)
+        tokens = llm.estimate_tokens(text)
+        metrics.prompt_tokens.observe(tokens, prompt=self.name)
+        logger.info(f"Built {self.name} prompt of ~{tokens} tokens ({len(text)} chars, "
+                    f"{self.truncated} inputs truncated)",
+                    extra={"prompt": self.name, "prompt_tokens_estimate": tokens, "prompt_chars": len(text),
+                           "input_tokens_estimate": self.input_tokens, "truncated_inputs": self.truncated})
+        return text
+
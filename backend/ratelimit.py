@@ -0,0 +1,200 @@
+# Per-client rate limits for the routes that spend LLM calls.
+# Each limited route allows a number of requests per period per user ID and per IP
+# address. Limits are token buckets kept in process memory, so under gunicorn every
+# worker enforces them separately.
+
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify, request
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Route name -> limits; override with RATE_LIMIT_<NAME>, e.g. RATE_LIMIT_PROCESS_FILE=user=5/minute,ip=20/minute
+DEFAULT_LIMITS = {
+    "process-file": "user=10/minute,ip=30/minute",
+    "generate-matches": "user=5/minute,ip=10/minute"
+}
+
+SCOPES = ("user", "ip")
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Buckets kept per process; the least recently used are dropped first
+DEFAULT_MAX_KEYS = 100000
+
+
+class Rate:
+    """count requests per period seconds, allowed in a burst of up to count"""
+
+    def __init__(self, count, period):
+        if count <= 0 or period <= 0:
+            raise ValueError("Rate limits need a positive count and period")
+        self.count = count
+        self.period = period
+
+    @property
+    def per_second(self):
+        return self.count / self.period
+
+    def __repr__(self):
+        return f"{self.count}/{self.period}s"
+
+
+def parse_limits(text):
+    """
+    Limits from a "user=10/minute,ip=30/minute" string
+
+    Returns:
+        Dict of scope ("user" or "ip") -> Rate; an empty string disables the route's limits
+    """
+    limits = {}
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        scope, _, rate = part.partition("=")
+        scope = scope.strip()
+        if scope not in SCOPES:
+            raise ValueError(f"Unknown rate limit scope: {scope}. Use one of: {', '.join(SCOPES)}")
+        count, _, period = rate.partition("/")
+        if period.strip() not in PERIODS:
+            raise ValueError(f"Unknown rate limit period: {period}. Use one of: {', '.join(PERIODS)}")
+        limits[scope] = Rate(int(count), PERIODS[period.strip()])
+    return limits
+
+
+class TokenBucketStore:
+    """Token buckets keyed by string; a bucket holds up to rate.count tokens and refills continuously"""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _refill(self, key, rate, now):
+        tokens, updated = self._buckets.get(key, (float(rate.count), now))
+        return min(float(rate.count), tokens + (now - updated) * rate.per_second)
+
+    def take(self, requests):
+        """
+        Take one token from every (key, rate) bucket, or from none of them
+
+        Returns:
+            Tuple of (allowed, retry_after_seconds)
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = [(key, rate, self._refill(key, rate, now)) for key, rate in requests]
+            short = [(1.0 - tokens) / rate.per_second for _, rate, tokens in levels if tokens < 1.0]
+            if short:
+                return False, max(short)
+            for key, rate, tokens in levels:
+                self._buckets[key] = (tokens - 1.0, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return True, 0.0
+
+    def size(self):
+        with self._lock:
+            return len(self._buckets)
+
+
+def request_user_id():
+    """User ID from the JSON body, form, query string or X-User-Id header, if any"""
+    body = request.get_json(silent=True)
+    user_id = body.get("userId") if isinstance(body, dict) else None
+    user_id = user_id or request.form.get("userId") or request.args.get("userId") or request.headers.get("X-User-Id")
+    if not user_id or user_id == "anonymous":
+        return None
+    return str(user_id)[:128]
+
+
+class RateLimiter:
+    """Route decorator enforcing per-user and per-IP token buckets"""
+
+    def __init__(self, limits=None, store=None, enabled=True):
+        self.limits = {name: parse_limits(text) for name, text in (limits or DEFAULT_LIMITS).items()}
+        self.store = store or TokenBucketStore()
+        self.enabled = enabled
+        self._rejected = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Limiter configured by environment variables
+
+        ENABLE_RATE_LIMITING: false turns every limit off
+        RATE_LIMIT_<ROUTE>: Limits of one route, e.g. RATE_LIMIT_GENERATE_MATCHES=user=5/minute,ip=10/minute
+        """
+        limits = {}
+        for name, default in DEFAULT_LIMITS.items():
+            text = os.environ.get(f"RATE_LIMIT_{name.upper().replace('-', '_')}", default)
+            try:
+                parse_limits(text)
+            except ValueError as e:
+                logger.error(f"Invalid rate limit for {name} ({str(e)}), using the default {default}")
+                text = default
+            limits[name] = text
+        enabled = os.environ.get("ENABLE_RATE_LIMITING", "true").lower() not in ("0", "false", "no")
+        return cls(limits, enabled=enabled)
+
+    def check(self, name):
+        """
+        Take a token for the current request
+
+        Returns:
+            Seconds the client should wait, or None when the request may proceed
+        """
+        limits = self.limits.get(name, {})
+        requests = []
+        user_id = request_user_id() if "user" in limits else None
+        if user_id:
+            requests.append((f"{name}:user:{user_id}", limits["user"]))
+        if "ip" in limits:
+            requests.append((f"{name}:ip:{request.remote_addr}", limits["ip"]))
+        if not requests:
+            return None
+        allowed, retry_after = self.store.take(requests)
+        if allowed:
+            return None
+        with self._lock:
+            self._rejected[name] = self._rejected.get(name, 0) + 1
+        return retry_after
+
+    def limit(self, name):
+        """Decorator that answers 429 with Retry-After once a client exceeds the route's limits"""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.enabled and request.method != "OPTIONS":
+                    retry_after = self.check(name)
+                    if retry_after is not None:
+                        seconds = max(1, math.ceil(retry_after))
+                        metrics.rate_limited.inc(route=name)
+                        logger.warning(f"Rate limit exceeded on {name} by {request.remote_addr}")
+                        return jsonify({
+                            "error": f"Too many requests, retry in {seconds} seconds",
+                            "retryAfter": seconds
+                        }), 429, {"Retry-After": str(seconds)}
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            rejected = dict(self._rejected)
+        return {
+            "enabled": self.enabled,
+            "limits": {name: {scope: repr(rate) for scope, rate in limits.items()}
+                       for name, limits in self.limits.items()},
+            "rejected": rejected,
+            "tracked_clients": self.store.size()
+        }
@@ -0,0 +1,228 @@
+# Deterministic mentor/mentee compatibility scoring.
+# Every component (same major, interest similarity, mentor strengths vs. mentee
+# challenges) is turned into feature columns scaled by its weight, so the whole
+# mentee x mentor matrix comes out of a single matrix product.
+
+import collections
+import hashlib
+import logging
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Hashed term space per text component; 256 keeps a 5000 x 5000 cohort well under a second
+SCORING_DIM = 256
+
+# Documents whose hashed terms are kept between scoring runs (two per profile)
+TERM_CACHE_SIZE = 50000
+
+# Profile fields compared by each text component (mentee side, mentor side)
+INTEREST_FIELDS = (
+    ("careerGoals", "academicInterests", "experienceSummary"),
+    ("academicInterests", "extracurriculars", "mentorMotivation")
+)
+SUPPORT_FIELDS = (
+    ("challenges", "expectations"),
+    ("mentorStrengths", "firstGenChallenges", "desiredSupport")
+)
+
+# Relative weight of each component; normalized to sum to 1 so scores stay in [0, 1]
+DEFAULT_WEIGHTS = {"major": 0.25, "interests": 0.40, "strengths": 0.35}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+    a an and are as at be been being but by can could do for from had has have how i
+    i'm im in into is it its my of on or our so that the their them they this to was
+    we were what when which who will with would you your me am not also more most
+    very about some any other than then there these those just like want help
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    if not text:
+        return []
+    if not isinstance(text, str):
+        text = str(text)
+    return [tok for tok in _TOKEN_RE.findall(text.lower())
+            if len(tok) > 1 and tok not in STOPWORDS]
+
+
+def profile_text(profile, fields):
+    """Concatenate the given profile fields into one document"""
+    parts = []
+    for field in fields:
+        value = profile.get(field)
+        if value and isinstance(value, str):
+            parts.append(value)
+    return " ".join(parts)
+
+
+def normalize_major(major):
+    """Canonical form of a major used for exact-match comparison"""
+    if not major or not isinstance(major, str):
+        return ""
+    return " ".join(tokenize(major))
+
+
+def parse_weights(text):
+    """Weights from a "major=0.3,interests=0.4,strengths=0.3" string; missing keys keep their default"""
+    weights = dict(DEFAULT_WEIGHTS)
+    for part in (text or "").split(","):
+        if not part.strip():
+            continue
+        key, _, value = part.partition("=")
+        key = key.strip()
+        if key not in DEFAULT_WEIGHTS:
+            raise ValueError(f"Unknown scoring weight: {key}. Use one of: {', '.join(DEFAULT_WEIGHTS)}")
+        weights[key] = float(value)
+    return weights
+
+
+class _TermCache:
+    """Hashed term IDs per document, keyed by a digest of its text, least recently used dropped first"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, texts, dim):
+        key = hashlib.blake2b("\x1f".join(texts).encode("utf-8"), digest_size=16, key=str(dim).encode()).digest()
+        with self._lock:
+            buckets = self._entries.get(key)
+            if buckets is not None:
+                self._entries.move_to_end(key)
+                return buckets
+        buckets = np.fromiter((zlib.crc32(tok.encode("utf-8")) % dim for text in texts for tok in tokenize(text)),
+                              dtype=np.uint16 if dim <= 65536 else np.int64)
+        with self._lock:
+            self._entries[key] = buckets
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return buckets
+
+
+# Profiles are rescored on every run, so tokenizing each document once is the main saving
+_term_cache = _TermCache(TERM_CACHE_SIZE)
+
+
+def hashed_tfidf(documents, dim=SCORING_DIM):
+    """
+    L2-normalized TF-IDF rows over a hashed vocabulary, with IDF fitted on the given documents
+
+    Args:
+        documents: List of documents, each a string or a tuple of field strings
+
+    Returns:
+        float32 array of shape (len(documents), dim)
+    """
+    term_ids = [_term_cache.get((document,) if isinstance(document, str) else document, dim)
+                for document in documents]
+    lengths = np.fromiter((len(ids) for ids in term_ids), dtype=np.int64, count=len(term_ids))
+    rows = np.repeat(np.arange(len(documents), dtype=np.int64), lengths)
+    cols = np.concatenate(term_ids).astype(np.int64) if term_ids else np.zeros(0, dtype=np.int64)
+    counts = np.bincount(rows * dim + cols, minlength=len(documents) * dim) \
+        .reshape(len(documents), dim).astype(np.float32)
+    matrix = np.zeros_like(counts)
+    present = counts > 0
+    matrix[present] = 1.0 + np.log(counts[present])
+
+    if len(documents):
+        doc_freq = np.count_nonzero(matrix, axis=0)
+        idf = np.log((1.0 + len(documents)) / (1.0 + doc_freq)) + 1.0
+        matrix *= idf.astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+    return matrix
+
+
+def _field_texts(profile, fields):
+    """The string values of the given profile fields, as one document"""
+    return tuple(value for value in (profile.get(field) for field in fields) if value and isinstance(value, str))
+
+
+class CompatibilityScorer:
+    """Weighted, vectorized compatibility of every mentee with every mentor"""
+
+    def __init__(self, weights=None, dim=SCORING_DIM):
+        weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        if any(value < 0 for value in weights.values()):
+            raise ValueError("Scoring weights must not be negative")
+        total = sum(weights.values())
+        if total <= 0:
+            raise ValueError("At least one scoring weight must be positive")
+        self.weights = {key: value / total for key, value in weights.items()}
+        self.dim = dim
+
+    def _text_features(self, mentors, mentees, fields):
+        """Hashed TF-IDF of one component, fitted on both sides so they share a space"""
+        mentee_fields, mentor_fields = fields
+        docs = [_field_texts(m, mentee_fields) for m in mentees] + [_field_texts(m, mentor_fields) for m in mentors]
+        vectors = hashed_tfidf(docs, self.dim)
+        return vectors[:len(mentees)], vectors[len(mentees):]
+
+    @staticmethod
+    def _major_features(mentors, mentees):
+        """One-hot major codes; blank majors get no column so they never count as equal"""
+        codes = {}
+        mentee_codes = [codes.setdefault(normalize_major(m.get("major")), len(codes)) for m in mentees]
+        mentor_codes = [codes.setdefault(normalize_major(m.get("major")), len(codes)) for m in mentors]
+        mentee_onehot = np.zeros((len(mentees), len(codes)), dtype=np.float32)
+        mentor_onehot = np.zeros((len(mentors), len(codes)), dtype=np.float32)
+        mentee_onehot[np.arange(len(mentees)), mentee_codes] = 1.0
+        mentor_onehot[np.arange(len(mentors)), mentor_codes] = 1.0
+        blank = codes.get("")
+        if blank is not None:
+            mentee_onehot[:, blank] = 0.0
+        return mentee_onehot, mentor_onehot
+
+    def score(self, mentors, mentees):
+        """
+        Compatibility matrix in [0, 1]
+
+        Args:
+            mentors: Mentor profile dicts
+            mentees: Mentee profile dicts
+
+        Returns:
+            float32 array of shape (len(mentees), len(mentors))
+        """
+        mentee_major, mentor_major = self._major_features(mentors, mentees)
+        mentee_parts = [self.weights["major"] * mentee_major]
+        mentor_parts = [mentor_major]
+
+        for key, fields in (("interests", INTEREST_FIELDS), ("strengths", SUPPORT_FIELDS)):
+            if self.weights[key] > 0:
+                mentee_vecs, mentor_vecs = self._text_features(mentors, mentees, fields)
+                mentee_parts.append(self.weights[key] * mentee_vecs)
+                mentor_parts.append(mentor_vecs)
+
+        # Sum of weighted dot products == one product of the concatenated feature blocks
+        return np.hstack(mentee_parts) @ np.hstack(mentor_parts).T
+
+
+_scorer = None
+
+
+def get_scorer():
+    """Process-wide scorer configured by SCORING_WEIGHTS"""
+    global _scorer
+    if _scorer is None:
+        try:
+            _scorer = CompatibilityScorer(parse_weights(os.environ.get("SCORING_WEIGHTS")))
+        except ValueError as e:
+            logger.error(f"Invalid SCORING_WEIGHTS ({str(e)}), using the defaults")
+            _scorer = CompatibilityScorer()
+    return _scorer
+
+
+def score_matrix(mentors, mentees):
+    """Compatibility of every mentee with every mentor using the configured scorer"""
+    return get_scorer().score(mentors, mentees)
@@ -3,105 +3,316 @@
 # Last updated: April 17th, 2025
 
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
-import google.generativeai as genai
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 import json
 import re
-import tempfile
+import base64
+import hashlib
+import threading
+import queue
 import datetime
 import logging
-import uuid
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 from flask_cors import CORS
 from dotenv import load_dotenv
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Load environment variables from .env file before the local modules below read their settings
+load_dotenv()
+
+import assignment
+import json_stream
+import matching
+import scoring
+import cache
+import jobs
+import extraction
+import llm
+import log_config
+import metrics
+import prompts
+import ratelimit
+import storage
+import embeddings
+
+# Structured logging through a background writer; every line carries the ID of the
+# request it belongs to (see log_config.py for the LOG_* settings)
+log_config.configure()
 logger = logging.getLogger(__name__)
 
-# Load environment variables from .env file
-load_dotenv()
+# PDF/DOCX text extraction (PyPDF2 and python-docx are optional)
+PDF_DOCX_AVAILABLE = extraction.PDF_DOCX_AVAILABLE
 
-# importing modules need for file processing
-try:
-    import PyPDF2
-    import docx
-    PDF_DOCX_AVAILABLE = True
-except ImportError:
-    PDF_DOCX_AVAILABLE = False
-    print("Warning: PyPDF2 or python-docx not available. Text extraction will be limited.")
+# Parse documents in warm worker processes so one large PDF cannot stall other requests
+parse_pool = extraction.ParsePool.from_env()
 
 # Get API keys and sensitive data from environment variables
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    print("WARNING: GEMINI_API_KEY environment variable is not set")
-    print("Running in mock mode without AI capabilities")
-    USE_AI = False
-else:
-    USE_AI = True
+if not GEMINI_API_KEY and os.environ.get("LLM_BACKEND", "gemini").lower() != "fake":
+    logger.warning("GEMINI_API_KEY environment variable is not set, running in mock mode without AI capabilities")
 
 # Get Firebase credentials path from environment variable
 FIREBASE_CREDENTIALS_PATH = os.environ.get("FIREBASE_CREDENTIALS_PATH")
 if not FIREBASE_CREDENTIALS_PATH:
-    print("WARNING: FIREBASE_CREDENTIALS_PATH environment variable is not set")
-    USE_FIREBASE = False
-
-# Make sure the credentials file exists, otherwise use mock mode
-if FIREBASE_CREDENTIALS_PATH and os.path.exists(FIREBASE_CREDENTIALS_PATH):
-    USE_FIREBASE = True
-else:
-    if FIREBASE_CREDENTIALS_PATH:
-        print(f"WARNING: Firebase credentials file not found at: {FIREBASE_CREDENTIALS_PATH}")
-    print("Running in mock mode without Firebase.")
-    USE_FIREBASE = False
-
-# Initialize Firebase Admin SDK if credentials are available
-if USE_FIREBASE:
-    try:
-        cred = credentials.Certificate(FIREBASE_CREDENTIALS_PATH)
-        firebase_admin.initialize_app(cred)
-        db = firestore.client()
-        print(f"Successfully initialized Firebase with credentials from: {FIREBASE_CREDENTIALS_PATH}")
-        # Test Firestore connection by accessing a simple collection
-        try:
-            test_doc = db.collection("mentorship_test").document("test").get()
-            print("Firestore connection test successful")
-        except Exception as conn_err:
-            print(f"Note: Firestore test read failed, but initialization succeeded: {str(conn_err)}")
-    except Exception as e:
-        print(f"Error initializing Firebase: {str(e)}")
-        USE_FIREBASE = False
-        db = None
-else:
-    db = None
+    logger.warning("FIREBASE_CREDENTIALS_PATH environment variable is not set")
 
 app = Flask(__name__)
+# Request IDs and per-route timings, registered first so they cover the other request hooks
+metrics.init_app(app)
 # Get allowed origins from environment variable with fallback for development
 allowed_origins = os.environ.get("ALLOWED_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000")
 allowed_origins_list = [origin.strip() for origin in allowed_origins.split(",")]
 CORS(app, origins=allowed_origins_list)  # Only allow specific origins
 
-# Configure Gemini API if API key is available
-if USE_AI:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        # Use a single model throughout the application
-        GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-experimental")
-        print(f"Successfully configured Gemini API with model: {GEMINI_MODEL}")
-    except Exception as e:
-        print(f"Error configuring Gemini API: {str(e)}")
-        USE_AI = False
-else:
-    GEMINI_MODEL = None
+# Behind a load balancer, take the client IP from the X-Forwarded-For entries it adds
+TRUSTED_PROXY_COUNT = int(os.environ.get("TRUSTED_PROXY_COUNT", 0))
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+
+# Per-user and per-IP limits on the routes that spend LLM calls
+limiter = ratelimit.RateLimiter.from_env()
+
+# Repository layer every route uses: Firestore when available, otherwise local SQLite in
+# LOCAL_DATA_DIR (with a one-time import of the old match file from MOCK_DATA_DIR)
+MOCK_DATA_DIR = os.path.join(os.path.dirname(__file__), "mock_data")
+LOCAL_DATA_DIR = os.path.join(os.path.dirname(__file__), "local_data")
+
+MATCH_STATUSES = ["pending", "approved", "confirmed", "rejected"]
+# Fields returned by the match listing endpoints unless the client asks for others;
+# matchReason is the bulk of each document, so it is only sent when requested
+MATCH_LIST_FIELDS = ["mentorId", "menteeId", "status", "compatibilityScore", "cohort", "createdAt",
+                     "updatedAt", "updatedBy", "aiGenerated", "isTestMatch"]
+MATCH_PAGE_SIZE = int(os.environ.get("MATCH_PAGE_SIZE", 50))
+MATCH_MAX_PAGE_SIZE = int(os.environ.get("MATCH_MAX_PAGE_SIZE", 500))
 
 # Create uploads directory if it doesn't exist
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "uploads")
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
     
+# Cache of generated form content keyed by (resume text, role, model, prompt version)
+# Bump ROLE_PROMPT_VERSION whenever the prompts in generate_role_specific_content change
+ROLE_PROMPT_VERSION = "2"
+
+# Form fields generated from a resume for each role, with the question asked for each
+ROLE_QUESTIONS = {
+    "Mentor": [
+        ("academicInterests", "Academic Interests: What are your academic interests and career goals?"),
+        ("extracurriculars", "Extracurricular Activities: What extracurricular activities, clubs, or organizations are you involved in?"),
+        ("mentorMotivation", "Mentor Motivation: Why do you want to be a mentor in this program?"),
+        ("firstGenChallenges", "First-Gen Challenges: What challenges did you face as a first-generation student that you want to help others navigate?"),
+        ("mentorStrengths", "Mentor Strengths: What strengths do you bring as a mentor?"),
+        ("communicationStyle", "Communication Style: How would you describe your communication and leadership style?"),
+        ("desiredSupport", "Desired Support: What kind of support do you wish you had when you started college?"),
+        ("additionalInfo", "Additional Info: Is there anything else you'd like us to know about your mentorship goals or expectations?"),
+        ("expectations", "Expectations: What are your expectations from this mentorship experience as a mentor?")
+    ],
+    "Mentee": [
+        ("careerGoals", "Career Goals: What are your short-term and long-term career aspirations?"),
+        ("experienceSummary", "Experience Summary: Describe your academic and professional experience so far."),
+        ("challenges", "Challenges: What challenges have you faced in your academic or career journey?"),
+        ("expectations", "Expectations: What are your expectations from this mentorship?"),
+        ("additionalInfo", "Additional Info: Is there anything else you'd like us to know about your mentorship goals or expectations?")
+    ]
+}
+
+# Clients and stores that hold sockets, threads or file handles. They are created by
+# init_services() in the process that serves requests, so under gunicorn every worker
+# gets its own Firebase and Gemini connections after the fork instead of sharing the master's.
+USE_FIREBASE = False
+db = None
+USE_AI = False
+GEMINI_MODEL = None
+data_store = None
+content_cache = None
+embedding_index = None
+job_queue = None
+
+# Jobs last updated before this moment belong to an earlier server and are re-queued on start
+# (gunicorn.conf.py sets it once in the master so every worker agrees on it)
+SERVER_STARTED_AT = float(os.environ.get("SERVER_STARTED_AT") or time.time())
+
+_services_pid = None
+_services_lock = threading.Lock()
+
+def init_firebase():
+    """
+    Firestore client when a credentials file is configured, otherwise None
+
+    The Firebase SDK is imported here rather than at module import, and connectivity
+    is checked later by the background dependency check instead of blocking start-up.
+    """
+    if not FIREBASE_CREDENTIALS_PATH or not os.path.exists(FIREBASE_CREDENTIALS_PATH):
+        if FIREBASE_CREDENTIALS_PATH:
+            logger.warning(f"Firebase credentials file not found at: {FIREBASE_CREDENTIALS_PATH}")
+        logger.info("Running in mock mode without Firebase.")
+        return None
+    try:
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+        try:
+            firebase_app = firebase_admin.get_app()
+        except ValueError:
+            firebase_app = firebase_admin.initialize_app(credentials.Certificate(FIREBASE_CREDENTIALS_PATH))
+        client = firestore.client(firebase_app)
+        logger.info(f"Successfully initialized Firebase with credentials from: {FIREBASE_CREDENTIALS_PATH}")
+        return client
+    except Exception as e:
+        logger.error(f"Error initializing Firebase: {str(e)}")
+        return None
+
+# State of each dependency /ready waits for: "pending", "ok", "failed" or "disabled"
+dependency_status = {}
+dependency_status_lock = threading.Lock()
+DEPENDENCY_RETRY_SECONDS = float(os.environ.get("DEPENDENCY_RETRY_SECONDS", 5))
+
+def set_dependency_status(name, status, error=None):
+    with dependency_status_lock:
+        dependency_status[name] = {"status": status, "error": error}
+
+def check_dependencies():
+    """
+    Warm up the slow dependencies off the request path (runs in a background thread)
+
+    Loads the Gemini SDK, then tests Firestore with a read of mentorship_test/test,
+    retrying every DEPENDENCY_RETRY_SECONDS until it succeeds.
+    """
+    global USE_AI, GEMINI_MODEL
+    started = time.perf_counter()
+    client = llm.get_client()
+    if client is None:
+        set_dependency_status("llm", "disabled")
+    else:
+        try:
+            client.warm()
+            set_dependency_status("llm", "ok")
+        except Exception as e:
+            # Same as a configuration error at start-up: serve mock content
+            logger.error(f"Error configuring Gemini API: {str(e)}")
+            llm.set_client(None)
+            USE_AI, GEMINI_MODEL = False, None
+            set_dependency_status("llm", "disabled", str(e))
+    if embedding_index:
+        try:
+            embedding_index.embedder.warm()
+        except Exception as e:
+            logger.error(f"Error loading the {embedding_index.embedder.name} embedder: {str(e)}")
+
+    if db is None:
+        set_dependency_status("firestore", "disabled")
+    else:
+        while True:
+            try:
+                db.collection("mentorship_test").document("test").get()
+                set_dependency_status("firestore", "ok")
+                logger.info("Firestore connection test successful")
+                break
+            except Exception as conn_err:
+                set_dependency_status("firestore", "failed", str(conn_err))
+                logger.warning(f"Firestore test read failed, retrying in {DEPENDENCY_RETRY_SECONDS}s: {str(conn_err)}")
+                time.sleep(DEPENDENCY_RETRY_SECONDS)
+    logger.info(f"Dependency checks finished in {time.perf_counter() - started:.2f}s")
+
+def init_services():
+    """
+    Create the per-process clients and start the worker pools, once per process
+
+    Called from gunicorn's post_fork hook, from the development server entry point,
+    and before the first request as a fallback (e.g. for the Flask test client).
+    """
+    global USE_FIREBASE, db, USE_AI, GEMINI_MODEL, data_store, content_cache, embedding_index, job_queue, \
+        _services_pid
+    if _services_pid == os.getpid():
+        return
+    with _services_lock:
+        if _services_pid == os.getpid():
+            return
+
+        db = init_firebase()
+        USE_FIREBASE = db is not None
+
+        # Build the shared LLM client once; every call site reuses its model handle and connection.
+        # A client installed beforehand (e.g. a FakeLLMClient in a benchmark) is kept.
+        if llm.get_client() is None:
+            try:
+                llm.set_client(llm.create_client_from_env(GEMINI_API_KEY,
+                                                          os.environ.get("GEMINI_MODEL", "gemini-2.5-experimental")))
+                if llm.get_client():
+                    logger.info(f"Successfully configured {llm.get_client().name} LLM client with model: {llm.get_client().model_name}")
+            except Exception as e:
+                logger.error(f"Error configuring Gemini API: {str(e)}")
+                llm.set_client(None)
+        USE_AI = llm.get_client() is not None
+        # Use a single model throughout the application
+        GEMINI_MODEL = llm.get_client().model_name if USE_AI else None
+
+        # Every repository call is timed as a db_read or db_write span
+        data_store = metrics.instrument_storage(storage.create_storage_from_env(db if USE_FIREBASE else None,
+                                                                                LOCAL_DATA_DIR, MOCK_DATA_DIR))
+        logger.info(f"Using {data_store.name} storage backend")
+
+        content_cache = cache.create_cache_from_env(os.path.join(os.path.dirname(__file__), "cache"))
+        if content_cache:
+            logger.info(f"Content cache enabled with {content_cache.backend.name} backend")
+
+        # Profile vectors computed once per signup, used for candidate retrieval and /similar-mentors
+        try:
+            embedding_index = embeddings.create_index_from_env(
+                os.path.join(os.path.dirname(__file__), "local_data", "embeddings"), GEMINI_API_KEY
+            )
+            logger.info(f"Embedding index enabled with {embedding_index.embedder.name} vectors")
+        except Exception as e:
+            logger.error(f"Error opening embedding index: {str(e)}")
+            embedding_index = None
+
+        # Fork the parse workers before the server starts its request threads; they
+        # import the document parsers in the background
+        parse_pool.start(wait=False)
+
+        job_queue = create_job_queue()
+        try:
+            job_queue.recover(started_before=SERVER_STARTED_AT)
+        except Exception as e:
+            logger.error(f"Error recovering jobs: {str(e)}")
+        # Jobs of a worker that crashes later are taken over once they go stale
+        job_queue.start_heartbeat()
+
+        for name in ("llm", "firestore"):
+            set_dependency_status(name, "pending")
+        threading.Thread(target=check_dependencies, name="dependency-check", daemon=True).start()
+
+        _services_pid = os.getpid()
+
+def shutdown_services(timeout=None):
+    """
+    Drain background work before the process exits
+
+    Running jobs get up to `timeout` seconds to finish; jobs that have not started
+    stay queued in the job store and run after the next start.
+    """
+    if _services_pid != os.getpid():
+        return
+    logger.info("Draining background jobs before shutdown")
+    drained = job_queue.drain(timeout)
+    match_stream_pool.shutdown(wait=drained, cancel_futures=True)
+    parse_pool.shutdown()
+
+@app.before_request
+def ensure_services():
+    """Initialize the per-process services if no server hook has done it yet"""
+    init_services()
+
+def create_app():
+    """
+    The Flask application for a WSGI server (see wsgi.py)
+
+    Per-process services are not started here: the server initializes them in each
+    worker after forking (gunicorn.conf.py) or before the first request.
+    """
+    return app
+
 # Default API port (can be overridden by PORT environment variable)
 # IMPORTANT: This should match the port used in frontend code (defaulting to 5001)
 DEFAULT_PORT = 5002
@@ -110,7 +321,7 @@ DEFAULT_PORT = 5002
 def get_mock_role_specific_content(role):
     """Generate mock content for mentorship forms when AI is not available"""
     timestamp = datetime.datetime.now().isoformat()
-    print(f"Generating mock content for role: {role} at {timestamp}")
+    logger.info(f"Generating mock content for role: {role}")
     
     if role == "Mentor":
         return {
@@ -156,12 +367,8 @@ def handle_error(error, error_type="server_error", status_code=500, log_level="e
     timestamp = datetime.datetime.now().isoformat()
     
     # Log the error with appropriate level
-    if log_level == "error":
-        print(f"ERROR [{timestamp}] {error_type}: {error_msg}")
-    elif log_level == "warning":
-        print(f"WARNING [{timestamp}] {error_type}: {error_msg}")
-    else:
-        print(f"INFO [{timestamp}] {error_type}: {error_msg}")
+    level = {"error": logging.ERROR, "warning": logging.WARNING}.get(log_level, logging.INFO)
+    logger.log(level, f"{error_type}: {error_msg}", extra={"error_type": error_type, "status_code": status_code})
     
     # Basic error response
     response = {
@@ -190,6 +397,26 @@ def handle_error(error, error_type="server_error", status_code=500, log_level="e
     
     return jsonify(response), status_code
 
+def llm_overloaded_response():
+    """503 with Retry-After when the LLM queue is already full, before any work is done"""
+    client = llm.get_client()
+    if client is None or not client.gate.saturated():
+        return None
+    retry_after = client.gate.retry_after()
+    logger.warning("LLM backend saturated, rejecting request")
+    return jsonify({
+        "error": f"The AI service is busy, retry in {retry_after} seconds",
+        "retryAfter": retry_after
+    }), 503, {"Retry-After": str(retry_after)}
+
+@app.errorhandler(llm.LLMOverloadedError)
+def handle_llm_overloaded(error):
+    """A call that waited too long for an LLM slot fails the request with 503"""
+    return jsonify({
+        "error": f"The AI service is busy, retry in {error.retry_after} seconds",
+        "retryAfter": error.retry_after
+    }), 503, {"Retry-After": str(error.retry_after)}
+
 #Returns error if it doesn't work
 def get_error_response(role, error_source="unknown"):
     """Legacy function for backward compatibility"""
@@ -202,12 +429,13 @@ def get_error_response(role, error_source="unknown"):
     return response_json.json  # Extract the dictionary from the response
 
 @app.route("/process-file", methods=["POST"])
+@limiter.limit("process-file")
 #Process uploaded file directly
 def process_file():
-    print("Received file upload request")
+    logger.debug("Received file upload request")
 
     if 'file' not in request.files:
-        print("No file part in the request")
+        logger.warning("No file part in the request")
         return jsonify({"error": "No file uploaded"}), 400
 
     file = request.files['file']
@@ -215,7 +443,7 @@ def process_file():
     role = request.form.get('role', 'Mentee')  # Default to mentee if not specified
 
     if file.filename == '':
-        print("No file selected")
+        logger.warning("No file selected")
         return jsonify({"error": "No file selected"}), 400
         
     # Validate file type and size
@@ -225,7 +453,7 @@ def process_file():
     # Check file extension
     file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
     if file_ext not in allowed_extensions:
-        print(f"Invalid file type: {file_ext}")
+        logger.warning(f"Invalid file type: {file_ext}")
         return jsonify({"error": f"Invalid file type. Allowed types: {', '.join(allowed_extensions)}"}), 400
     
     # Check file size
@@ -234,70 +462,98 @@ def process_file():
     file.seek(0)  # Reset file pointer
     
     if file_size > max_file_size:
-        print(f"File too large: {file_size} bytes")
+        logger.warning(f"File too large: {file_size} bytes")
         return jsonify({"error": f"File too large. Maximum size: 5MB"}), 400
 
-    print(f"Processing file: {file.filename} for user: {user_id}, role: {role}") #see in terminal
+    logger.info(f"Processing file: {file.filename} for user: {user_id}, role: {role}")
 
-    try:
-        # Validate user ID format if provided
-        if user_id != 'anonymous' and not re.match(r'^[a-zA-Z0-9_-]+$', user_id):
-            return jsonify({"error": "Invalid user ID format"}), 400
-        
-        # Save the file to a temporary location with secure path handling
-        filename = secure_filename(file.filename)
-        temp_dir = tempfile.gettempdir()
-        temp_path = os.path.join(temp_dir, filename)
-        
-        # Verify path is inside temp directory (prevent path traversal)
-        abs_temp_dir = os.path.abspath(temp_dir)
-        abs_temp_path = os.path.abspath(temp_path)
-        if not abs_temp_path.startswith(abs_temp_dir):
-            return jsonify({"error": "Invalid file path"}), 400
-            
-        file.save(temp_path)
-
-        # Extract text based on file type
-        extracted_text = ""
-        file_extension = os.path.splitext(filename)[1].lower()
-
-        if file_extension == '.pdf' and PDF_DOCX_AVAILABLE:
-            print("Processing PDF file")
-            pdf_reader = PyPDF2.PdfReader(temp_path)
-            for page in pdf_reader.pages:
-                extracted_text += page.extract_text() + "\n"
-
-        elif (file_extension == '.docx' or file_extension == '.doc') and PDF_DOCX_AVAILABLE:
-            print("Processing Word document")
-            doc = docx.Document(temp_path)
-            for para in doc.paragraphs:
-                extracted_text += para.text + "\n"
-        else:
-            print(f"Unsupported file format: {file_extension}")
-            os.remove(temp_path)  # Clean up temporary file
-            return jsonify(get_error_response(role, "unsupported_file_format"))
+    # Validate user ID format if provided
+    if user_id != 'anonymous' and not re.match(r'^[a-zA-Z0-9_-]+$', user_id):
+        return jsonify({"error": "Invalid user ID format"}), 400
 
-        # Clean up temporary file
-        os.remove(temp_path)
+    # Hand the upload to the job queue when the client asks for an asynchronous run
+    if is_async_request(request.form):
+        job_id = job_queue.submit("process-file", {
+            "filename": file.filename,
+            "content": base64.b64encode(file.read()).decode("ascii"),
+            "userId": user_id,
+            "role": role
+        })
+        return jsonify(job_accepted_response(job_id)), 202
 
-        print(f"Extracted text length: {len(extracted_text)}")
+    overloaded = llm_overloaded_response()
+    if overloaded:
+        return overloaded
 
-        if len(extracted_text) < 50:
-            print(f"Warning: Very little text extracted: {extracted_text}")
-            return jsonify(get_error_response(role, "insufficient_text"))
+    result, status_code = extract_and_generate(file.filename, file.read(), user_id, role)
+    return jsonify(result), status_code
+
+def extract_and_generate(original_filename, file_bytes, user_id, role, report_progress=None):
+    """
+    Extract text from an uploaded resume and generate the mentorship form content
 
-        # Generate content based on the extracted text
-        result = generate_role_specific_content(extracted_text, role)
+    Shared by the synchronous /process-file route and the process-file job handler.
+    The document is parsed in memory by the parse pool, never written to disk.
+
+    Returns:
+        Tuple of (response_dict, status_code)
+    """
+    try:
+        if report_progress:
+            report_progress("extracting_text")
+
+        # Extract text based on file type, stopping once the prompt budget is reached
+        file_extension = os.path.splitext(secure_filename(original_filename))[1].lower()
+        logger.debug(f"Processing {file_extension} file")
+        try:
+            with metrics.span("extraction"):
+                extracted_text, truncated = parse_pool.extract(file_bytes, file_extension)
+        except extraction.UnsupportedFormatError as e:
+            logger.warning(str(e))
+            return get_error_response(role, "unsupported_file_format"), 200
+        except extraction.DocumentTooLargeError as e:
+            logger.warning(str(e))
+            return get_error_response(role, "file_too_large"), 200
+        except extraction.ParseTimeoutError as e:
+            logger.warning(str(e))
+            return get_error_response(role, "file_processing_timeout"), 200
+
+        logger.debug(f"Extracted text length: {len(extracted_text)}{' (truncated)' if truncated else ''}")
+
+        if len(extracted_text) < 50:
+            logger.warning(f"Very little text extracted: {extracted_text}")
+            return get_error_response(role, "insufficient_text"), 200
+
+        if report_progress:
+            report_progress("generating_content", textLength=len(extracted_text))
+
+        # Reuse content generated earlier for the same text, role, model and prompt
+        cache_key = cache.make_key(extracted_text, role, GEMINI_MODEL, ROLE_PROMPT_VERSION)
+        cached_result = content_cache.get(cache_key) if content_cache else None
+        if content_cache:
+            metrics.cache_requests.inc(result="hit" if cached_result is not None else "miss")
+        if cached_result is not None:
+            logger.info("Content cache hit, skipping Gemini call")
+            result = dict(cached_result)
+            result["cacheHit"] = True
+        else:
+            # Generate content based on the extracted text
+            result = generate_role_specific_content(extracted_text, role)
+            # Only cache real AI output, never mock or error responses
+            if content_cache and result.get("source") == "ai_generated":
+                content_cache.set(cache_key, dict(result))
         
         # Add debug info
         result["source"] = "file_processing"
         result["timestamp"] = str(datetime.datetime.now())
         
-        return jsonify(result)
+        return result, 200
 
+    except llm.LLMOverloadedError:
+        raise
     except Exception as e:
-        print(f"Error processing file: {str(e)}")
-        return jsonify(get_error_response(role, "file_processing_error"))
+        logger.error(f"Error processing file: {str(e)}")
+        return get_error_response(role, "file_processing_error"), 200
 
 @app.route("/save-resume", methods=["POST"])
 #Save resume file to server storage 
@@ -322,7 +578,7 @@ def save_resume():
     # Check file extension
     file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
     if file_ext not in allowed_extensions:
-        print(f"Invalid file type: {file_ext}")
+        logger.warning(f"Invalid file type: {file_ext}")
         return jsonify({"error": f"Invalid file type. Allowed types: {', '.join(allowed_extensions)}"}), 400
     
     # Check file size
@@ -331,7 +587,7 @@ def save_resume():
     file.seek(0)  # Reset file pointer
     
     if file_size > max_file_size:
-        print(f"File too large: {file_size} bytes")
+        logger.warning(f"File too large: {file_size} bytes")
         return jsonify({"error": f"File too large. Maximum size: 5MB"}), 400
 
     try:
@@ -358,139 +614,109 @@ def save_resume():
         file_path = os.path.join(absolute_user_dir, filename)
         file.save(file_path)
 
-        # Add record to Firestore if available
-        if USE_FIREBASE and db:
-            try:
-                db.collection("user_files").document(user_id).set({
-                    "resumePath": file_path,
-                    "originalFilename": file.filename,
-                    "timestamp": firestore.SERVER_TIMESTAMP
-                }, merge=True)
-                print(f"Added file record to Firestore for user: {user_id}")
-            except Exception as e:
-                print(f"Error adding to Firestore: {str(e)}")
-                # Continue anyway since the file was successfully saved
-        else:
-            print("Firebase not available, skipping database record")
+        # Add file record to storage
+        try:
+            data_store.user_files.set(user_id, {
+                "resumePath": file_path,
+                "originalFilename": file.filename,
+                "timestamp": storage.SERVER_TIMESTAMP
+            }, merge=True)
+            logger.info(f"Added file record to {data_store.name} storage for user: {user_id}")
+        except Exception as e:
+            logger.error(f"Error adding file record: {str(e)}")
+            # Continue anyway since the file was successfully saved
 
         return jsonify({"message": "File saved successfully", "path": file_path})
     except Exception as e:
-        print(f"Error saving file: {str(e)}")
+        logger.error(f"Error saving file: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 #Generate content based on the user's role with guaranteed field coverage
 def generate_role_specific_content(text_content, role):
    
     try:
-        # Create prompt based on role with explicit field requirements
-        if role == "Mentor":
-            prompt = f"""
-            
-            Based on the following resume or profile information, generate thoughtful responses for a mentorship application where the user is applying to be a MENTOR. Write responses in first person, as if the user is describing themselves:
-
-            {text_content}
-
-            For each of the following categories, you MUST provide a paragraph (3-5 sentences) response. Each field is required and must have content:
-
-            1. Academic Interests: What are your academic interests and career goals?
-            2. Extracurricular Activities: What extracurricular activities, clubs, or organizations are you involved in?
-            3. Mentor Motivation: Why do you want to be a mentor in this program?
-            4. First-Gen Challenges: What challenges did you face as a first-generation student that you want to help others navigate?
-            5. Mentor Strengths: What strengths do you bring as a mentor?
-            6. Communication Style: How would you describe your communication and leadership style?
-            7. Desired Support: What kind of support do you wish you had when you started college?
-            8. Additional Info: Is there anything else you'd like us to know about your mentorship goals or expectations?
-            9. Expectations: What are your expectations from this mentorship experience as a mentor?
-
-            Format your response as a valid JSON object with exactly these keys: 
-            academicInterests, extracurriculars, mentorMotivation, firstGenChallenges, mentorStrengths, communicationStyle, desiredSupport, additionalInfo, expectations
-
-            Make sure ALL fields are included and have content, even if you have to creatively interpret the resume.
-            """
-        else:  # Mentee
-            prompt = f"""
-            Based on the following resume or profile information, generate thoughtful responses for a mentorship application where the user is applying to be a MENTEE. Write responses in first person, as if the user is describing themselves:
-
-            {text_content}
-
-            For each of the following categories, you MUST provide a paragraph (3-5 sentences) response. Each field is required and must have content:
-
-            1. Career Goals: What are your short-term and long-term career aspirations?
-            2. Experience Summary: Describe your academic and professional experience so far.
-            3. Challenges: What challenges have you faced in your academic or career journey?
-            4. Expectations: What are your expectations from this mentorship?
-            5. Additional Info: Is there anything else you'd like us to know about your mentorship goals or expectations?
-
-            Format your response as a valid JSON object with exactly these keys: 
-            careerGoals, experienceSummary, challenges, expectations, additionalInfo
-
-            Make sure ALL fields are included and have content, even if you have to creatively interpret the resume.
-            """
+        prompt_started = time.perf_counter()
+        # Create prompt based on role with explicit field requirements; the resume is
+        # compacted and cut to its token budget (see prompts.py)
+        role_name = "Mentor" if role == "Mentor" else "Mentee"
+        questions = ROLE_QUESTIONS[role_name]
+        expected_fields = [field for field, _ in questions]
+        prompt_builder = prompts.Prompt(f"{role_name.lower()}_form")
+        prompt_builder.add(
+            "Based on the following resume or profile information, generate thoughtful responses for a mentorship "
+            f"application where the user is applying to be a {role_name.upper()}. Write responses in first person, "
+            "as if the user is describing themselves:",
+            "",
+            prompt_builder.document(text_content),
+            "",
+            "For each of the following categories, you MUST provide a paragraph (3-5 sentences) response. "
+            "Each field is required and must have content:",
+            ""
+        )
+        prompt_builder.add(*[f"{number}. {question}" for number, (_, question) in enumerate(questions, start=1)])
+        prompt_builder.add(
+            "",
+            f"Format your response as a valid JSON object with exactly these keys: {', '.join(expected_fields)}",
+            "",
+            "Make sure ALL fields are included and have content, even if you have to creatively interpret the resume."
+        )
+        prompt = prompt_builder.build()
+
+        # Ask for exactly these keys as JSON so no free-form text has to be searched
+        response_schema = {
+            "type": "object",
+            "properties": {field: {"type": "string"} for field in expected_fields},
+            "required": expected_fields
+        }
 
-        print("Sending prompt to Gemini API")
+        metrics.observe_phase("prompt_build", time.perf_counter() - prompt_started)
+        logger.debug("Sending prompt to Gemini API")
 
-        # Use Gemini 1.5 Pro if available
-        if not USE_AI:
-            print("AI is not available, returning mock response")
+        # Use the shared LLM client if available
+        llm_client = llm.get_client()
+        if llm_client is None:
+            logger.warning("AI is not available, returning mock response")
+            metrics.mock_fallbacks.inc(reason="ai_unavailable")
             return get_mock_role_specific_content(role)
             
         try:
-            print(f"Generating content with {GEMINI_MODEL}")
-            # Check if API key is set and has at least some content
-            if not GEMINI_API_KEY or len(GEMINI_API_KEY) < 10:
-                print("WARNING: API key is missing or too short, likely invalid")
-                return get_mock_role_specific_content(role)
-            
-            response = genai.GenerativeModel(GEMINI_MODEL).generate_content(prompt)
-            print("Successfully generated content")
-        except Exception as e:
-            print(f"Error with model {GEMINI_MODEL}: {str(e)}")
-            print("Using mock response")
+            logger.debug(f"Generating content with {llm_client.model_name}")
+            response = llm_client.generate(prompt, schema=response_schema)
+            logger.info(f"Successfully generated content in {response.latency:.2f}s "
+                        f"({response.prompt_tokens} prompt / {response.output_tokens} output tokens)",
+                        extra={"latency_seconds": round(response.latency, 3), "prompt_tokens": response.prompt_tokens,
+                               "output_tokens": response.output_tokens})
+        except llm.LLMOverloadedError:
+            # Busy rather than broken: the caller answers 503 instead of serving mock content
+            raise
+        except llm.LLMError as e:
+            logger.error(f"Error with model {llm_client.model_name}: {str(e)}")
+            logger.warning("Using mock response")
+            metrics.mock_fallbacks.inc(reason="llm_error")
             return get_mock_role_specific_content(role)
 
         if not response:
-            print("No response object was created, returning error response")
+            logger.warning("No response object was created, returning error response")
             return get_error_response(role, "empty_response")
 
-        print(f"Raw response first 100 chars: {response.text[:100]}...")
+        logger.debug(f"Raw response first 100 chars: {response.text[:100]}...")
 
-        # Define expected fields based on role
-        if role == "Mentor":
-            expected_fields = [
-                "academicInterests", "extracurriculars", "mentorMotivation",
-                "firstGenChallenges", "mentorStrengths", "communicationStyle",
-                "desiredSupport", "additionalInfo", "expectations"
-            ]
-        else:  # Mentee
-            expected_fields = ["careerGoals", "experienceSummary", "challenges", "expectations", "additionalInfo"]
-
-        # Try multiple approaches to extract content
-        result = {}
-        
-        # Approach 1: Direct JSON parsing
+        # Schema-constrained output is plain JSON; older models may still wrap it in prose
         try:
-            content_json = json.loads(response.text)
-            result = content_json
-            print("Successfully parsed response as JSON")
-        except json.JSONDecodeError:
-            # Approach 2: Find JSON in text
-            json_pattern = r'({[\s\S]*})'
-            json_matches = re.findall(json_pattern, response.text)
-            
-            for potential_json in json_matches:
-                try:
-                    content_json = json.loads(potential_json)
-                    result = content_json
-                    print("Successfully extracted JSON from text")
-                    break
-                except json.JSONDecodeError:
-                    continue
+            with metrics.span("parse"):
+                result = json_stream.parse_json_object(response.text)
+            logger.debug("Successfully parsed response as JSON")
+        except ValueError:
+            logger.warning("No JSON object found in response")
+            result = {}
                             
         # Ensure all expected fields are present (empty if missing)
-        for field in expected_fields:
-            if field not in result:
-                print(f"Field {field} missing, setting empty string")
-                result[field] = ""
+        missing_fields = [field for field in expected_fields if field not in result]
+        if missing_fields:
+            logger.warning(f"Fields missing from response, setting empty strings: {', '.join(missing_fields)}",
+                           extra={"missing_fields": missing_fields})
+        for field in missing_fields:
+            result[field] = ""
         
         # Add meta information
         result["source"] = "ai_generated"
@@ -498,10 +724,10 @@ def generate_role_specific_content(text_content, role):
         
         return result
 
+    except llm.LLMOverloadedError:
+        raise
     except Exception as e:
-        print(f"Error generating content: {str(e)}")
-        import traceback
-        traceback.print_exc()  # Print stack trace for debugging
+        logger.exception(f"Error generating content: {str(e)}")
         return get_error_response(role, "content_generation_error")
 
 @app.route("/match", methods=["POST", "OPTIONS"])
@@ -516,35 +742,40 @@ def match():
         user_id = data.get("userId")
         force_signup = data.get("forceSignup", False)  # Add option to force signup for testing
 
-        print(f"Received signup for user {user_id}")
+        logger.info(f"Received signup for user {user_id}")
 
-        # Check if user has already signed up (if Firebase is available)
-        if user_id and USE_FIREBASE and db and not force_signup:
+        # Check if user has already signed up
+        if user_id and not force_signup:
             try:
-                existing_signup = db.collection("mentorship_signups").document(user_id).get()
-                if existing_signup.exists:
+                existing_signup = data_store.signups.get(user_id)
+                if existing_signup is not None:
                     # Store in variable to avoid repeated logging
-                    print(f"User {user_id} has already signed up")
+                    logger.info(f"User {user_id} has already signed up")
                     return jsonify({
                         "status": "error",
                         "message": "You have already signed up for the mentorship program.",
                         "timestamp": str(datetime.datetime.now())
                     }), 400
             except Exception as e:
-                print(f"Error checking signup status: {str(e)}")
+                logger.error(f"Error checking signup status: {str(e)}")
                 # Continue anyway since it's just a check
 
-        # Save data to Firestore if available
-        if USE_FIREBASE and db:
+        # Save signup data
+        try:
+            if user_id:
+                data_store.signups.set(user_id, data)
+                logger.info(f"Saved signup data for user {user_id} to {data_store.name} storage")
+        except Exception as e:
+            logger.error(f"Error saving signup: {str(e)}")
+            # Continue anyway to avoid blocking user signup
+
+        # Embed the profile now so matching never has to re-read the raw text
+        role = embeddings.normalize_role(data.get("mentorshipRole"))
+        if user_id and role and embedding_index:
             try:
-                if user_id:
-                    db.collection("mentorship_signups").document(user_id).set(data)
-                    print(f"Saved signup data for user {user_id} to Firestore")
+                embedding_index.upsert(user_id, role, data)
             except Exception as e:
-                print(f"Error saving to Firestore: {str(e)}")
-                # Continue anyway to avoid blocking user signup
-        else:
-            print("Firebase not available, skipping database storage")
+                logger.error(f"Error indexing profile for user {user_id}: {str(e)}")
 
         return jsonify({
             "matchResult": "Your application has been received successfully! We'll notify you when you've been matched with a mentor/mentee.",
@@ -552,7 +783,7 @@ def match():
             "timestamp": str(datetime.datetime.now())
         })
     except Exception as e:
-        print(f"Error in match endpoint: {e}")
+        logger.error(f"Error in match endpoint: {e}")
         return jsonify({"error": str(e)}), 500
 
 @app.route("/check-signup-status", methods=["POST"])
@@ -565,37 +796,26 @@ def check_signup_status():
         if not user_id:
             return jsonify({"error": "User ID is required"}), 400
             
-        if not USE_FIREBASE or not db:
-            # Without Firebase, just return a mock response
-            return jsonify({
-                "exists": False,
-                "role": None,
-                "mock": True
-            })
-            
         try:
             # Check if user has already signed up
-            existing_signup = db.collection("mentorship_signups").document(user_id).get()
+            existing_signup = data_store.signups.get(user_id)
             
-            # Check if user is already in a match
-            mentee_matches = db.collection("mentorship_matches").filter("menteeId", "==", user_id).get()
-            mentor_matches = db.collection("mentorship_matches").filter("mentorId", "==", user_id).get()
-            
-            has_match = len(list(mentee_matches)) > 0 or len(list(mentor_matches)) > 0
+            # Only users without a signup need the match lookup, a single index read
+            has_match = existing_signup is None and data_store.matches.has_matches(user_id)
             
             return jsonify({
-                "exists": existing_signup.exists or has_match,
-                "role": existing_signup.to_dict().get("mentorshipRole") if existing_signup.exists else None
+                "exists": existing_signup is not None or has_match,
+                "role": existing_signup.get("mentorshipRole") if existing_signup else None
             })
         except Exception as e:
-            print(f"Error checking signup status: {e}")
+            logger.error(f"Error checking signup status: {e}")
             return jsonify({
                 "exists": False,
                 "role": None,
                 "error": str(e)
             })
     except Exception as e:
-        print(f"Error checking signup status: {e}")
+        logger.error(f"Error checking signup status: {e}")
         return jsonify({"error": str(e)}), 500
         
 @app.route("/debug/get-error-response", methods=["GET"])
@@ -603,7 +823,7 @@ def get_error_response_endpoint():
     """Return error response for testing with role parameter"""
     role = request.args.get("role", "Mentee")
     
-    print(f"Generating error response for role: {role}")
+    logger.debug(f"Generating error response for role: {role}")
     
     # Get error response
     content = get_error_response(role, "debug_endpoint")
@@ -612,348 +832,360 @@ def get_error_response_endpoint():
     content["source"] = "server_error"
     content["generatedFor"] = role
     
-    print(f"Returning error response keys: {list(content.keys())}")
+    logger.debug(f"Returning error response keys: {list(content.keys())}")
     
     return jsonify(content)
 
-# Create a dummy limiter that doesn't do anything if not defined globally
-if 'limiter' not in globals():
-    class DummyLimiter:
-        def limit(self, *args, **kwargs):
-            def decorator(f):
-                return f
-            return decorator
-    
-    limiter = DummyLimiter()
-    print("Using dummy rate limiter")
-
 @app.route("/generate-matches", methods=["POST"])
+@limiter.limit("generate-matches")
 def generate_matches():
-    """AI-based mentorship matching using Gemini API with enhanced storage"""
+    """Mentorship matching with the local engine, optionally using Gemini to explain each pair"""
+    data = request.json
+
+    # Hand the run to the job queue when the client asks for an asynchronous run
+    if data and is_async_request(data):
+        job_id = job_queue.submit("generate-matches", data)
+        return jsonify(job_accepted_response(job_id)), 202
+
+    overloaded = llm_overloaded_response()
+    if overloaded:
+        return overloaded
+
+    result, status_code = run_generate_matches(data)
+    return jsonify(result), status_code
+
+def run_generate_matches(data, report_progress=None, on_match=None, on_retract=None):
+    """
+    Generate (and optionally store) matches for a /generate-matches request body
+
+    Shared by the synchronous route and the generate-matches job handler.
+    on_match, if given, is called with each sanitized match as soon as it is accepted,
+    before the whole run has finished; a later call for the same mentee replaces the
+    earlier match. on_retract, if given, is called with a match already handed to
+    on_match that the final repair left out, so its mentee ended up unmatched.
+
+    Returns:
+        Tuple of (response_dict, status_code)
+    """
     try:
         logger.info("Received request to generate matches")
-        data = request.json
         
         if not data:
             logger.warning("No data provided in generate-matches request")
-            return jsonify({"error": "No data provided"}), 400
+            return {"error": "No data provided"}, 400
             
         mentors = data.get('mentors', [])
         mentees = data.get('mentees', [])
         max_mentees_per_mentor = data.get('maxMenteesPerMentor', 3)  # Get setting from request
         save_to_db = data.get('saveToDatabase', True)  # Default to saving matches
+        generate_reasons = data.get('generateReasons', True)  # Let Gemini write matchReason text
+        matching_mode = data.get('matchingMode', 'local')  # 'local' or sharded 'llm' ranking
+        cohort = data.get('cohort')  # Optional label (e.g. "2025-fall") for filtering matches later
+        incremental = data.get('incremental', False)  # Only reassign new, rejected or orphaned mentees
+        removed_user_ids = data.get('removedUserIds') or []  # Incremental only: people who left the program
+        assignment_method = data.get('assignmentMethod', 'auto')  # 'optimal', 'greedy' or size-based 'auto'
          
         if not mentors:
             logger.warning("No mentors provided in generate-matches request")
-            return jsonify({"error": "No mentors provided"}), 400
+            return {"error": "No mentors provided"}, 400
         if not mentees:
             logger.warning("No mentees provided in generate-matches request")
-            return jsonify({"error": "No mentees provided"}), 400
+            return {"error": "No mentees provided"}, 400
+
+        try:
+            max_mentees_per_mentor = max(1, int(max_mentees_per_mentor))
+        except (ValueError, TypeError):
+            return {"error": "maxMenteesPerMentor must be a positive integer"}, 400
             
         logger.info(f"Processing match request with {len(mentors)} mentors and {len(mentees)} mentees")
         logger.info(f"Max mentees per mentor: {max_mentees_per_mentor}, Save to DB: {save_to_db}")
-            
-        # Create prompt for Gemini
-        prompt = f"""
-        You are an AI assistant helping match mentors with mentees in a college mentorship program at Trinity.
-        Below are the details of available mentors and mentees. Please create optimal mentor-mentee pairs based on:
-        1. Academic interests and major alignment
-        2. Mentorship strengths matching mentee challenges
-        3. Career goals and expertise alignment
-
-        CONSTRAINTS:
-        - Each mentee should be matched with exactly one mentor
-        - A mentor can have up to {max_mentees_per_mentor} mentees
-        - Assign higher compatibility scores (between 0-100) for better matches
-        - Every mentee MUST be matched with someone
-
-        Provide your response as a JSON array of matches with the following structure for each match:
-        {{
-            "menteeId": "[mentee id]",
-            "mentorId": "[mentor id]",
-            "reason": "[detailed explanation of why this is a good match]",
-            "score": [compatibility score between 0-100]
-        }}
-
-        MENTORS:
-        """
-
-        # Add mentor details
-        for mentor in mentors:
-            prompt += f"""
-            Mentor ID: {mentor.get('id')}
-            Name: {mentor.get('name', 'Unnamed Mentor')}
-            Major: {mentor.get('major', 'Not specified')}
-            Academic Interests: {mentor.get('academicInterests', 'Not specified')}
-            Mentor Strengths: {mentor.get('mentorStrengths', 'Not specified')}
-            """
-
-        prompt += "\nMENTEES:"
-
-        # Add mentee details
-        for mentee in mentees:
-            prompt += f"""
-            Mentee ID: {mentee.get('id')}
-            Name: {mentee.get('name', 'Unnamed Mentee')}
-            Major: {mentee.get('major', 'Not specified')}
-            Career Goals: {mentee.get('careerGoals', 'Not specified')}
-            Challenges: {mentee.get('challenges', 'Not specified')}
-            Expectations: {mentee.get('expectations', 'Not specified')}
-            """
-
-        prompt += """
-        Return ONLY a valid JSON array of matches, with NO additional text before or after the JSON.
-        """
-
-        print("Sending prompt to Gemini API")
-        # Check if AI is available first
-        if not USE_AI or not GEMINI_API_KEY:
-            print("AI is not available, returning mock matches")
-            return generate_mock_matches(mentors, mentees)
-            
+
+        if not isinstance(removed_user_ids, list):
+            return {"error": "removedUserIds must be a list of user IDs"}, 400
+
+        if matching_mode not in ("local", "llm"):
+            return {"error": "matchingMode must be 'local' or 'llm'"}, 400
+        if assignment_method not in assignment.METHODS:
+            return {"error": f"assignmentMethod must be one of: {', '.join(assignment.METHODS)}"}, 400
+        llm_client = llm.get_client()
+        if matching_mode == "llm" and llm_client is None:
+            logger.warning("LLM matching requested but AI is not available, using local matching")
+            matching_mode = "local"
+
+        mentors_by_id = {m.get('id'): m for m in mentors}
+        mentees_by_id = {m.get('id'): m for m in mentees}
+        # Stream responses so each match can be used as soon as its JSON element is complete
+        generate_text = lambda prompt, schema=None: llm_client.stream(prompt, schema=schema)
+        shard_stats = None
+
+        # Matches handed to on_match as soon as they are final, keyed by the raw match object
+        streamed = {}
+
+        def emit_match(match):
+            sanitized_match = sanitize_match(match, cohort)
+            if sanitized_match is not None:
+                streamed[id(match)] = sanitized_match
+                if on_match:
+                    on_match(sanitized_match)
+
+        def retract_match(match):
+            sanitized_match = streamed.pop(id(match), None)
+            if sanitized_match is not None and on_retract:
+                on_retract(sanitized_match)
+
+        # By default every mentee is (re)matched; incremental runs keep the stored matches
+        # that are still valid and only match the mentees left without a mentor
+        plan = None
+        match_mentors, match_mentees, capacities, excluded_pairs = mentors, mentees, max_mentees_per_mentor, None
+        if incremental:
+            try:
+                existing_matches = load_existing_matches(cohort)
+            except Exception as e:
+                logger.error(f"Error loading existing matches: {str(e)}")
+                return {"error": f"Could not load existing matches: {str(e)}"}, 500
+            plan = matching.plan_incremental(existing_matches, mentors, mentees, max_mentees_per_mentor,
+                                            removed_ids=removed_user_ids)
+            match_mentors, match_mentees = plan["mentors"], plan["mentees"]
+            capacities, excluded_pairs = plan["capacities"], plan["excluded_pairs"]
+            logger.info(f"Incremental run: {len(plan['unchanged'])} matches kept, {len(plan['removed'])} removed, "
+                        f"{len(match_mentees)} mentees to match against {len(match_mentors)} open mentors")
+
+        if report_progress:
+            report_progress("matching", mentors=len(match_mentors), mentees=len(match_mentees))
+
         try:
-            # Use Gemini 2.5
-            print(f"Attempting to generate matches with model: {GEMINI_MODEL}")
-            response = genai.GenerativeModel(GEMINI_MODEL).generate_content(prompt)
-            print(f"Successfully generated matches with {GEMINI_MODEL}")
+            if matching_mode == "llm":
+                # Shortlists come from the embedding index; scores stay the weighted components
+                text_vectors = cohort_vectors(match_mentors, match_mentees)
+                # Many small concurrent prompts, each with a pre-filtered mentor shortlist
+                matches, unmatched_mentee_ids, shard_stats = matching.match_cohort_sharded(
+                    match_mentors, match_mentees, capacities, generate_text, excluded_pairs=excluded_pairs,
+                    text_vectors=text_vectors, method=assignment_method, on_match=emit_match,
+                    on_retract=retract_match
+                )
+                if shard_stats["local_fallback"]:
+                    metrics.mock_fallbacks.inc(shard_stats["local_fallback"], reason="shard_local_assignment")
+            else:
+                # Score and assign locally so cost does not depend on the LLM context window
+                matches, unmatched_mentee_ids = matching.match_cohort(
+                    match_mentors, match_mentees, capacities, excluded_pairs=excluded_pairs,
+                    method=assignment_method
+                )
         except Exception as e:
-            print(f"Error with {GEMINI_MODEL}: {str(e)}")
-            return generate_mock_matches(mentors, mentees)
+            logger.error(f"{matching_mode} matching failed: {str(e)}")
+            metrics.mock_fallbacks.inc(reason="matching_error")
+            return generate_mock_matches(match_mentors, match_mentees, cohort, capacities), 200
 
-        # Parse the response text
-        print("Parsing AI response")
-        response_text = response.text.strip()
-        
-        # Extract JSON from the response if needed
-        if "```json" in response_text:
-            # Extract JSON from code block
-            json_text = response_text.split("```json")[1].split("```")[0].strip()
-            print("Extracted JSON from code block")
-        elif "```" in response_text:
-            # Extract from generic code block
-            json_text = response_text.split("```")[1].strip()
-            print("Extracted from generic code block")
-        else:
-            # Use response text directly
-            json_text = response_text
-            print("Using response text directly")
-            
-        try:
-            matches = json.loads(json_text)
-            
-            # Validate the matches
-            if not isinstance(matches, list):
-                print("Error: Response is not a list")
-                return generate_mock_matches(mentors, mentees)
-                
+        if unmatched_mentee_ids:
+            logger.warning(f"{len(unmatched_mentee_ids)} mentees left unmatched: mentor capacity exhausted")
+
+        # In local mode Gemini only writes the explanations for the pairs that were chosen
+        if matching_mode == "local" and generate_reasons and llm_client is not None and matches:
+            if report_progress:
+                report_progress("writing_reasons", matches=len(matches))
+            try:
+                written = matching.write_match_reasons(matches, mentors_by_id, mentees_by_id, generate_text,
+                                                       on_match=emit_match)
+                logger.info(f"Gemini wrote match reasons for {written} of {len(matches)} matches")
+            except Exception as e:
+                written = 0
+                logger.error(f"Error generating match reasons with {llm_client.model_name}: {str(e)}")
+            if written < len(matches):
+                metrics.mock_fallbacks.inc(len(matches) - written, reason="template_match_reason")
+        if matching_mode == "local":
+            # Matches without an LLM-written reason are final as soon as they are assigned
             for match in matches:
-                if not (("menteeId" in match and "mentorId" in match) or 
-                        ("mentee" in match and "mentor" in match)):
-                    print("Error: Missing required fields in match")
-                    return generate_mock_matches(mentors, mentees)
-                
-                # Standardize field names
-                if "mentee" in match and "menteeId" not in match:
-                    match["menteeId"] = match["mentee"]
-                if "mentor" in match and "mentorId" not in match:
-                    match["mentorId"] = match["mentor"]
-                if "matchReason" in match and "reason" not in match:
-                    match["reason"] = match["matchReason"]
-                elif "reason" in match and "matchReason" not in match:
-                    match["matchReason"] = match["reason"]
-                if "compatibilityScore" in match and "score" not in match:
-                    match["score"] = match["compatibilityScore"]
-                elif "score" in match and "compatibilityScore" not in match:
-                    match["compatibilityScore"] = match["score"]
+                if id(match) not in streamed:
+                    emit_match(match)
                     
-            logger.info(f"Successfully generated {len(matches)} matches")
-            
-            # Validate and standardize the matches
-            sanitized_matches = []
-            for match in matches:
-                # Create a sanitized match object with standardized fields
-                sanitized_match = {}
-                
-                # Standardize field names
-                sanitized_match["menteeId"] = match.get("menteeId", match.get("mentee", ""))
-                sanitized_match["mentorId"] = match.get("mentorId", match.get("mentor", ""))
-                sanitized_match["matchReason"] = match.get("matchReason", match.get("reason", "AI-generated match"))
-                
-                # Ensure compatibility score is a number
-                try:
-                    sanitized_match["compatibilityScore"] = float(match.get("compatibilityScore", match.get("score", 80)))
-                except (ValueError, TypeError):
-                    sanitized_match["compatibilityScore"] = 80
-                    
-                sanitized_match["status"] = "pending"
-                sanitized_match["createdAt"] = datetime.datetime.now().isoformat()
-                sanitized_match["aiGenerated"] = True
-                sanitized_match["generatedAt"] = datetime.datetime.now().isoformat()
-                
-                # Validate required fields
-                if not sanitized_match["menteeId"] or not sanitized_match["mentorId"]:
-                    logger.warning(f"Skipping match with missing IDs: {sanitized_match}")
-                    continue
-                    
-                # Add to sanitized matches list
-                sanitized_matches.append(sanitized_match)
-            
-            # Save matches to Firestore if requested 
-            stored_match_ids = []
-            if save_to_db:
-                if USE_FIREBASE and db:
-                    try:
-                        logger.info(f"Saving {len(sanitized_matches)} matches to Firestore")
-                        for match in sanitized_matches:
-                            # Create a document with auto-generated ID
-                            match_ref = db.collection("mentorship_matches").document()
-                            match_id = match_ref.id
-                            
-                            # Add ID to the match data
-                            match["id"] = match_id
-                            
-                            # Save to Firestore
-                            match_ref.set(match)
-                            
-                            # Track saved IDs
-                            stored_match_ids.append(match_id)
-                            
-                        logger.info(f"Successfully saved {len(stored_match_ids)} matches to Firestore")
-                    except Exception as e:
-                        logger.error(f"Error saving matches to Firestore: {str(e)}")
-                        # Continue anyway since we'll return the matches to the client
-                else:
-                    # Create a local storage for mock mode
-                    logger.info("Firebase not available, using local storage for matches")
-                    
-                    # Create mock_data directory if it doesn't exist
-                    mock_data_dir = os.path.join(os.path.dirname(__file__), "mock_data")
-                    os.makedirs(mock_data_dir, exist_ok=True)
-                    
-                    # Load existing matches or create empty array
-                    mock_matches_file = os.path.join(mock_data_dir, "mentorship_matches.json")
-                    existing_matches = []
-                    
-                    if os.path.exists(mock_matches_file):
-                        try:
-                            with open(mock_matches_file, 'r') as f:
-                                existing_matches = json.load(f)
-                                logger.info(f"Loaded {len(existing_matches)} existing matches from mock storage")
-                        except Exception as e:
-                            logger.error(f"Error loading mock matches: {str(e)}")
-                    
-                    # Add new matches with generated IDs
-                    for match in sanitized_matches:
-                        # Generate a unique ID
-                        match_id = f"mock-match-{len(existing_matches) + len(stored_match_ids) + 1}"
-                        match["id"] = match_id
-                        
-                        # Add to storage
-                        existing_matches.append(match)
-                        stored_match_ids.append(match_id)
-                    
-                    # Save updated matches
-                    try:
-                        with open(mock_matches_file, 'w') as f:
-                            json.dump(existing_matches, f, indent=2)
-                        logger.info(f"Successfully saved {len(sanitized_matches)} matches to mock storage")
-                    except Exception as e:
-                        logger.error(f"Error saving to mock storage: {str(e)}")
-            else:
-                logger.info("Skipping database storage as requested by user")
-                # Add mock IDs for consistency
-                for i, match in enumerate(sanitized_matches):
-                    match["id"] = f"mock-match-{i+1}"
-            
-            # Return the matches with tracking data
-            return jsonify({
-                "message": f"Successfully generated {len(sanitized_matches)} matches",
-                "matches": sanitized_matches,
-                "stored_match_ids": stored_match_ids,
-                "saved_to_database": len(stored_match_ids) > 0
-            })
-                
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON: {str(e)}")
-            # Return mock data as fallback
-            return generate_mock_matches(mentors, mentees)
+        logger.info(f"Successfully generated {len(matches)} matches")
+        
+        # Validate and standardize the matches (streamed ones were already sanitized)
+        sanitized_matches = []
+        for match in matches:
+            sanitized_match = streamed.get(id(match)) or sanitize_match(match, cohort)
+            if sanitized_match is None:
+                logger.warning(f"Skipping match with missing IDs: {match}")
+                continue
+            sanitized_matches.append(sanitized_match)
+        
+        # Save matches if requested
+        stored_match_ids = []
+        failed_match_ids = {}
+        if save_to_db:
+            if report_progress:
+                report_progress("saving", matches=len(sanitized_matches))
+            try:
+                logger.info(f"Saving {len(sanitized_matches)} matches to {data_store.name} storage")
+                # Batched writes instead of one round trip per match
+                stored_match_ids, failed_match_ids = data_store.matches.create_many(sanitized_matches)
+                logger.info(f"Successfully saved {len(stored_match_ids)} matches")
+            except Exception as e:
+                logger.error(f"Error saving matches: {str(e)}")
+                # Continue anyway since we'll return the matches to the client
+        else:
+            logger.info("Skipping database storage as requested by user")
+            # Add mock IDs for consistency
+            for i, match in enumerate(sanitized_matches):
+                match["id"] = f"mock-match-{i+1}"
+        
+        result = {
+            "message": f"Successfully generated {len(sanitized_matches)} matches",
+            "matches": sanitized_matches,
+            "stored_match_ids": stored_match_ids,
+            "failed_match_ids": failed_match_ids,
+            "saved_to_database": len(stored_match_ids) > 0,
+            "unmatched_mentee_ids": unmatched_mentee_ids,
+            "matching_mode": matching_mode,
+            "shard_stats": shard_stats,
+            "settings": {"maxMenteesPerMentor": max_mentees_per_mentor, "assignmentMethod": assignment_method}
+        }
+        if plan is not None:
+            result["diff"] = apply_incremental_removals(plan, save_to_db, sanitized_matches)
+        
+        # Return the matches with tracking data
+        return result, 200
             
     except Exception as e:
-        print(f"Error in generate_matches: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        logger.error(f"Error in generate_matches: {str(e)}")
+        return {"error": str(e)}, 500
         
-def generate_mock_matches(mentors, mentees):
-    """Generate mock matches when AI generation fails"""
-    logger.info("Generating mock matches as fallback")
+def sanitize_match(match, cohort=None):
+    """Standardized match record for storage, or None if it lacks a mentee or mentor ID"""
+    sanitized_match = {}
+    
+    # Standardize field names
+    sanitized_match["menteeId"] = match.get("menteeId", match.get("mentee", ""))
+    sanitized_match["mentorId"] = match.get("mentorId", match.get("mentor", ""))
+    sanitized_match["matchReason"] = match.get("matchReason", match.get("reason", "AI-generated match"))
+    
+    # Ensure compatibility score is a number
+    try:
+        sanitized_match["compatibilityScore"] = float(match.get("compatibilityScore", match.get("score", 80)))
+    except (ValueError, TypeError):
+        sanitized_match["compatibilityScore"] = 80
+        
+    sanitized_match["status"] = "pending"
+    sanitized_match["createdAt"] = datetime.datetime.now().isoformat()
+    sanitized_match["aiGenerated"] = True
+    sanitized_match["generatedAt"] = datetime.datetime.now().isoformat()
+    if cohort:
+        sanitized_match["cohort"] = cohort
+    
+    # Validate required fields
+    if not sanitized_match["menteeId"] or not sanitized_match["mentorId"]:
+        return None
+    return sanitized_match
+
+def cohort_vectors(mentors, mentees):
+    """(mentee_vectors, mentor_vectors) from the embedding index, or None to shortlist by score"""
+    if not embedding_index or not mentors or not mentees:
+        return None
+    try:
+        # Only profiles that are new or changed since their last signup get embedded here
+        return embedding_index.ensure(mentees, "mentee"), embedding_index.ensure(mentors, "mentor")
+    except Exception as e:
+        logger.error(f"Embedding index lookup failed, scoring from profile text: {str(e)}")
+        return None
+
+def load_existing_matches(cohort=None):
+    """Every stored match (of one cohort if given), read a page at a time"""
+    existing = []
+    cursor = None
+    while True:
+        page, cursor = data_store.matches.page(cohort=cohort, start_after=cursor, limit=MATCH_MAX_PAGE_SIZE,
+                                               fields=["mentorId", "menteeId", "status"])
+        existing.extend(page)
+        if cursor is None:
+            return existing
+
+def apply_incremental_removals(plan, save_to_db, added_matches):
+    """
+    Delete the matches an incremental run replaces and describe the change
+
+    Returns:
+        Dict with the "added", "removed" and "unchanged" matches (removed entries carry a
+        "removeReason"; nothing is deleted when save_to_db is False)
+    """
+    failed_removals = {}
+    if save_to_db:
+        for match in plan["removed"]:
+            try:
+                data_store.matches.delete(match["id"])
+            except Exception as e:
+                logger.error(f"Error removing match {match['id']}: {str(e)}")
+                failed_removals[match["id"]] = str(e)
+    return {
+        "added": [match.get("id") for match in added_matches],
+        "removed": [{"id": m.get("id"), "menteeId": m.get("menteeId"), "mentorId": m.get("mentorId"),
+                     "status": m.get("status"), "removeReason": m["removeReason"]} for m in plan["removed"]],
+        "unchanged": [match.get("id") for match in plan["unchanged"]],
+        "failed_removals": failed_removals
+    }
+
+def generate_mock_matches(mentors, mentees, cohort=None, max_mentees_per_mentor=None):
+    """Fallback matches from the deterministic scorer when the matching run fails"""
+    logger.info("Generating fallback matches with the local scorer")
     matches = []
-    stored_match_ids = []
+    unmatched_mentee_ids = []
+    if max_mentees_per_mentor is None:
+        # Spread mentees evenly when no capacity was requested
+        max_mentees_per_mentor = -(-len(mentees) // max(1, len(mentors)))
+    
+    try:
+        scores = scoring.score_matrix(mentors, mentees)
+        assigned = assignment.assign_greedy(scores, matching.capacity_array(max_mentees_per_mentor, len(mentors)))
+    except Exception as e:
+        # Last resort: distribute mentees across mentors in order
+        logger.error(f"Scoring failed, assigning round-robin: {str(e)}")
+        scores = None
+        assigned = [i % len(mentors) for i in range(len(mentees))] if mentors else [-1] * len(mentees)
     
-    # Distribute mentees across mentors
-    mentor_index = 0
     for i, mentee in enumerate(mentees):
-        mentor = mentors[mentor_index]
-        
-        # Create compatibility score (70-95 range)
-        score = 70 + (i % 25)
-        
-        # Get IDs, ensuring they exist
+        mentor_index = int(assigned[i])
         mentee_id = mentee.get("id", f"mentee-{i}")
-        mentor_id = mentor.get("id", f"mentor-{mentor_index}")
+        if mentor_index < 0:
+            unmatched_mentee_ids.append(mentee_id)
+            continue
+        mentor = mentors[mentor_index]
         
         # Create standardized match object
         match = {
             "menteeId": mentee_id,
-            "mentorId": mentor_id,
-            "matchReason": f"Match based on compatible academic interests and mentorship expectations.",
-            "compatibilityScore": score,
+            "mentorId": mentor.get("id", f"mentor-{mentor_index}"),
+            "matchReason": matching.template_reason(mentor, mentee),
+            "compatibilityScore": matching.to_compatibility_score(scores[i, mentor_index]) if scores is not None else 50,
             "status": "pending",
             "createdAt": datetime.datetime.now().isoformat(),
-            "aiGenerated": True,
+            "aiGenerated": False,
             "isMockData": True,
             "generatedAt": datetime.datetime.now().isoformat()
         }
+        if cohort:
+            match["cohort"] = cohort
         
         matches.append(match)
-        
-        # Move to next mentor, loop back if needed
-        mentor_index = (mentor_index + 1) % len(mentors)
     
     logger.info(f"Generated {len(matches)} mock matches")
     
-    # Save mock matches to Firestore if available
-    if USE_FIREBASE and db:
-        try:
-            logger.info("Saving mock matches to Firestore")
-            for match in matches:
-                # Create a document with auto-generated ID
-                match_ref = db.collection("mentorship_matches").document()
-                match_id = match_ref.id
-                
-                # Add ID to the match data
-                match["id"] = match_id
-                
-                # Save to Firestore
-                match_ref.set(match)
-                
-                # Track saved IDs
-                stored_match_ids.append(match_id)
-                
-            logger.info(f"Successfully saved {len(stored_match_ids)} mock matches to Firestore")
-        except Exception as e:
-            logger.error(f"Error saving mock matches to Firestore: {str(e)}")
-    else:
-        logger.info("Firebase not available, skipping database storage for mock matches")
-        # Add mock IDs for consistency
-        for i, match in enumerate(matches):
-            match["id"] = f"mock-match-{i+1}"
+    # Save mock matches
+    stored_match_ids, failed_match_ids = [], {}
+    try:
+        logger.info(f"Saving mock matches to {data_store.name} storage")
+        stored_match_ids, failed_match_ids = data_store.matches.create_many(matches)
+        logger.info(f"Successfully saved {len(stored_match_ids)} mock matches")
+    except Exception as e:
+        logger.error(f"Error saving mock matches: {str(e)}")
     
-    return jsonify({
-        "message": "Generated mock matches (AI matching failed)",
+    return {
+        "message": "Generated fallback matches (matching failed)",
         "matches": matches,
         "stored_match_ids": stored_match_ids,
+        "failed_match_ids": failed_match_ids,
         "saved_to_database": len(stored_match_ids) > 0,
+        "unmatched_mentee_ids": unmatched_mentee_ids,
         "is_mock_data": True
-    })
+    }
 
 @app.route("/delete-match", methods=["POST"])
 def delete_match():
@@ -965,32 +1197,30 @@ def delete_match():
         if not match_id:
             return jsonify({"error": "No match ID provided"}), 400
         
-        # Delete the match from Firestore if available
-        if not USE_FIREBASE or not db:
-            return jsonify({
-                "status": "success",
-                "message": "Match successfully deleted (mock mode - no database)",
-                "timestamp": str(datetime.datetime.now())
-            })
-            
         try:
-            # Delete the match from Firestore
-            db.collection("mentorship_matches").document(match_id).delete()
+            deleted = data_store.matches.delete(match_id)
         except Exception as e:
-            print(f"Error deleting match: {str(e)}")
+            logger.error(f"Error deleting match: {str(e)}")
             return jsonify({
                 "status": "error",
                 "message": f"Error deleting match: {str(e)}",
                 "timestamp": str(datetime.datetime.now())
             }), 500
         
+        if not deleted:
+            return jsonify({
+                "status": "error",
+                "message": f"Match with ID {match_id} not found",
+                "timestamp": str(datetime.datetime.now())
+            }), 404
+        
         return jsonify({
             "status": "success",
             "message": "Match successfully deleted",
             "timestamp": str(datetime.datetime.now())
         })
     except Exception as e:
-        print(f"Error deleting match: {e}")
+        logger.error(f"Error deleting match: {e}")
         return jsonify({"error": str(e)}), 500
 
 @app.route("/create-test-match", methods=["POST"])
@@ -1018,21 +1248,10 @@ def create_test_match():
         
         logger.info(f"Creating test match between mentor {mentor_id} and mentee {mentee_id}")
         
-        # For testing in mock mode
-        if not USE_FIREBASE or not db:
-            logger.info("Creating mock test match")
-            match_data["id"] = "test-match-" + str(uuid.uuid4())[:8]
-            return jsonify({
-                "success": True,
-                "message": "Test match created successfully (MOCK)",
-                "match": match_data
-            })
-            
-        # Add to Firestore
-        match_ref = db.collection("mentorship_matches").document()
-        match_id = match_ref.id
-        match_data["id"] = match_id
-        match_ref.set(match_data)
+        stored_ids, failed = data_store.matches.create_many([match_data])
+        if failed or not stored_ids:
+            return jsonify({"error": f"Error creating test match: {failed}"}), 500
+        match_id = stored_ids[0]
         
         logger.info(f"Created test match {match_id} between mentor {mentor_id} and mentee {mentee_id}")
         
@@ -1063,81 +1282,19 @@ def update_match_status():
             }), 400
             
         # Validate status
-        valid_statuses = ["pending", "approved", "confirmed", "rejected"]
-        if status not in valid_statuses:
+        if status not in MATCH_STATUSES:
             return jsonify({
-                "error": f"Invalid status. Must be one of: {', '.join(valid_statuses)}"
+                "error": f"Invalid status. Must be one of: {', '.join(MATCH_STATUSES)}"
             }), 400
             
-        # For mock mode - update in local storage
-        if not USE_FIREBASE or not db:
-            print(f"Using local storage to update match {match_id} to status {status}")
-            mock_data_dir = os.path.join(os.path.dirname(__file__), "mock_data")
-            mock_matches_file = os.path.join(mock_data_dir, "mentorship_matches.json")
-            
-            if os.path.exists(mock_matches_file):
-                try:
-                    # Load existing matches
-                    with open(mock_matches_file, 'r') as f:
-                        all_matches = json.load(f)
-                    
-                    # Find and update the match
-                    found_match = False
-                    for match in all_matches:
-                        if match.get("id") == match_id:
-                            # Verify user is authorized
-                            if match.get("mentorId") != user_id and match.get("menteeId") != user_id:
-                                return jsonify({
-                                    "error": "Unauthorized. User is not associated with this match."
-                                }), 403
-                            
-                            # Update match status
-                            match["status"] = status
-                            match["updatedAt"] = datetime.datetime.now().isoformat()
-                            match["updatedBy"] = user_id
-                            found_match = True
-                            break
-                    
-                    if not found_match:
-                        return jsonify({
-                            "error": f"Match with ID {match_id} not found"
-                        }), 404
-                    
-                    # Save updated matches
-                    with open(mock_matches_file, 'w') as f:
-                        json.dump(all_matches, f, indent=2)
-                    
-                    print(f"Successfully updated match {match_id} status to {status}")
-                    return jsonify({
-                        "success": True,
-                        "message": f"Match status updated to {status}",
-                        "timestamp": datetime.datetime.now().isoformat()
-                    })
-                    
-                except Exception as e:
-                    print(f"Error updating match in mock storage: {str(e)}")
-                    return jsonify({
-                        "error": str(e)
-                    }), 500
-            
-            # If file doesn't exist, return success anyway for testing
-            return jsonify({
-                "success": True,
-                "message": f"Match status updated to {status} (mock mode)",
-                "timestamp": datetime.datetime.now().isoformat()
-            })
-            
         try:
             # Get the match to verify the user is authorized to update it
-            match_ref = db.collection("mentorship_matches").document(match_id)
-            match_doc = match_ref.get()
+            match_data = data_store.matches.get(match_id)
             
-            if not match_doc.exists:
+            if match_data is None:
                 return jsonify({
                     "error": f"Match with ID {match_id} not found"
                 }), 404
-                
-            match_data = match_doc.to_dict()
             
             # Verify user is authorized (must be the mentor or mentee of this match)
             if match_data.get("mentorId") != user_id and match_data.get("menteeId") != user_id:
@@ -1145,14 +1302,17 @@ def update_match_status():
                     "error": "Unauthorized. User is not associated with this match."
                 }), 403
                 
-            # Update the match status
+            # Update only this match
             update_data = {
                 "status": status,
                 "updatedAt": datetime.datetime.now().isoformat(),
                 "updatedBy": user_id
             }
             
-            match_ref.update(update_data)
+            if data_store.matches.update(match_id, update_data) is None:
+                return jsonify({
+                    "error": f"Match with ID {match_id} not found"
+                }), 404
             
             return jsonify({
                 "success": True,
@@ -1161,17 +1321,354 @@ def update_match_status():
             })
             
         except Exception as e:
-            print(f"Error updating match status in Firestore: {str(e)}")
+            logger.error(f"Error updating match status: {str(e)}")
             return jsonify({
                 "error": str(e)
             }), 500
             
     except Exception as e:
-        print(f"Error in update_match_status: {str(e)}")
+        logger.error(f"Error in update_match_status: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+
+@app.route("/similar-mentors", methods=["POST"])
+def similar_mentors():
+    """Top-k mentors closest to a user's profile, straight from the embedding index"""
+    try:
+        data = request.json or {}
+        user_id = data.get("userId")
+        profile = data.get("profile")
+        
+        if not user_id and not profile:
+            return jsonify({"error": "Provide a userId or a profile"}), 400
+        if not embedding_index:
+            return jsonify({"error": "Embedding index is not available"}), 503
+        try:
+            k = max(1, min(int(data.get("k", 5)), 100))
+        except (ValueError, TypeError):
+            return jsonify({"error": "k must be an integer"}), 400
+        
+        if profile is None:
+            profile = data_store.signups.get(user_id)
+            if profile is None:
+                return jsonify({"error": f"No signup found for user {user_id}"}), 404
+        role = embeddings.normalize_role(profile.get("mentorshipRole")) or "mentee"
+        
+        # A stored signup is normally indexed already, so this is a lookup, not an embedding call
+        query = embedding_index.ensure([dict(profile, id=user_id or profile.get("id", "query"))], role)[0] \
+            if user_id else embedding_index.embedder.embed(
+                [matching.profile_text(profile, embeddings.ROLE_FIELDS[role])])[0]
+        results = embedding_index.search(query, "mentor", k=k, exclude_ids=[user_id] if user_id else [])
+        
+        return jsonify({
+            "mentors": [{"mentorId": mentor_id, "similarity": round(similarity, 4)}
+                        for mentor_id, similarity in results],
+            "k": k
+        })
+    except Exception as e:
+        logger.error(f"Error finding similar mentors: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def match_listing_options(params, default_page_size):
+    """
+    Page size, filters and projection shared by the match listing endpoints
+
+    Returns:
+        Tuple of (options_dict, error_message)
+    """
+    try:
+        page_size = int(params.get("pageSize", default_page_size))
+    except (ValueError, TypeError):
+        return None, "pageSize must be an integer"
+    if page_size < 1 or page_size > MATCH_MAX_PAGE_SIZE:
+        return None, f"pageSize must be between 1 and {MATCH_MAX_PAGE_SIZE}"
+
+    status = params.get("status") or None
+    if status is not None and status not in MATCH_STATUSES:
+        return None, f"Invalid status. Must be one of: {', '.join(MATCH_STATUSES)}"
+
+    fields = params.get("fields")
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(",") if field.strip()]
+    fields = list(fields) if fields else list(MATCH_LIST_FIELDS)
+    include_reason = params.get("includeReason", False)
+    if isinstance(include_reason, str):
+        include_reason = include_reason.lower() in ("1", "true", "yes")
+    if include_reason and "matchReason" not in fields:
+        fields.append("matchReason")
+
+    return {
+        "limit": page_size,
+        "status": status,
+        "cohort": params.get("cohort") or None,
+        "fields": fields
+    }, None
+
+def conditional_json(payload):
+    """JSON response with an ETag over its body; a matching If-None-Match gets an empty 304"""
+    response = jsonify(payload)
+    etag = hashlib.sha256(response.get_data()).hexdigest()[:32]
+    # Werkzeug's make_conditional only honours If-None-Match on GET and HEAD, and
+    # /get-user-matches is a POST, so the comparison is done here for every method
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    response.set_etag(etag)
+    # Clients may keep the page but must revalidate before reusing it
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@app.route("/get-user-matches", methods=["POST"])
+def get_user_matches():
+    """Matches where the user is the mentee or the mentor, one page of each"""
+    try:
+        data = request.json or {}
+        user_id = data.get("userId")
+        
+        if not user_id:
+            return jsonify({"error": "No user ID provided"}), 400
+            
+        options, error = match_listing_options(data, MATCH_PAGE_SIZE)
+        if error:
+            return jsonify({"error": error}), 400
+        
+        mentee_matches, mentee_cursor = data_store.matches.page(
+            menteeId=user_id, start_after=data.get("menteeStartAfter"), **options
+        )
+        mentor_matches, mentor_cursor = data_store.matches.page(
+            mentorId=user_id, start_after=data.get("mentorStartAfter"), **options
+        )
+        
+        return conditional_json({
+            "menteeMatches": mentee_matches,
+            "mentorMatches": mentor_matches,
+            "menteeNextCursor": mentee_cursor,
+            "mentorNextCursor": mentor_cursor
+        })
+    except Exception as e:
+        logger.error(f"Error getting user matches: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/get-all-matches", methods=["GET"])
+def get_all_matches():
+    """One page of all matches, ordered by match ID and filtered by status and cohort"""
+    try:
+        options, error = match_listing_options(request.args, MATCH_PAGE_SIZE)
+        if error:
+            return jsonify({"error": error}), 400
+        
+        matches, next_cursor = data_store.matches.page(start_after=request.args.get("startAfter"), **options)
+        
+        return conditional_json({
+            "matches": matches,
+            "nextCursor": next_cursor,
+            "pageSize": options["limit"]
+        })
+    except Exception as e:
+        logger.error(f"Error getting all matches: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
 
+# Background jobs for the slow endpoints (submitted with "async": true)
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", os.path.join(os.path.dirname(__file__), "local_data", "jobs.db"))
+JOB_CONCURRENCY = {
+    "process-file": int(os.environ.get("JOB_CONCURRENCY_PROCESS_FILE", 4)),
+    "generate-matches": int(os.environ.get("JOB_CONCURRENCY_GENERATE_MATCHES", 2))
+}
+
+def is_async_request(params):
+    """True when the request body or query string asks for a background job"""
+    value = params.get("async", request.args.get("async", False))
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+def job_accepted_response(job_id):
+    """Body returned with 202 when a job is queued"""
+    return {
+        "jobId": job_id,
+        "status": jobs.QUEUED,
+        "statusUrl": f"/jobs/{job_id}",
+        "eventsUrl": f"/jobs/{job_id}/events"
+    }
+
+# Seconds after which a job its process stopped refreshing (the worker died) is taken over
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", jobs.DEFAULT_STALE_SECONDS))
+
+# Longest a background job waits out LLM overload before it fails
+JOB_LLM_WAIT_SECONDS = float(os.environ.get("JOB_LLM_WAIT_SECONDS", 300))
+
+def process_file_job(payload, report_progress):
+    # No client is waiting on the connection, so a busy LLM delays the job instead of failing it
+    deadline = time.time() + JOB_LLM_WAIT_SECONDS
+    while True:
+        try:
+            return extract_and_generate(payload["filename"], base64.b64decode(payload["content"]),
+                                        payload["userId"], payload["role"], report_progress)
+        except llm.LLMOverloadedError as e:
+            if time.time() + e.retry_after > deadline:
+                raise
+            report_progress("waiting_for_llm", retryAfter=e.retry_after)
+            time.sleep(e.retry_after)
+
+def generate_matches_job(payload, report_progress):
+    return run_generate_matches(payload, report_progress)
+
+def create_job_queue():
+    """Job queue with a handler per background job type"""
+    runner = jobs.JobQueue(jobs.JobStore(JOB_STORE_PATH), context_factory=app.app_context,
+                           stale_seconds=JOB_STALE_SECONDS)
+    runner.register("process-file", process_file_job, JOB_CONCURRENCY["process-file"])
+    runner.register("generate-matches", generate_matches_job, JOB_CONCURRENCY["generate-matches"])
+    return runner
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Poll the status and result of a background job"""
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job with ID {job_id} not found"}), 404
+    return jsonify(job)
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def stream_job_events(job_id):
+    """Server-Sent Events stream of a background job's progress"""
+    if job_queue.store.get(job_id) is None:
+        return jsonify({"error": f"Job with ID {job_id} not found"}), 404
+    return Response(
+        stream_with_context(job_queue.events(job_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Streamed match runs share the generate-matches concurrency limit
+MATCH_STREAM_KEEPALIVE_SECONDS = 15
+match_stream_pool = ThreadPoolExecutor(max_workers=JOB_CONCURRENCY["generate-matches"],
+                                       thread_name_prefix="generate-matches-stream")
+
+@app.route("/generate-matches/stream", methods=["POST"])
+@limiter.limit("generate-matches")
+def generate_matches_stream():
+    """
+    /generate-matches as Server-Sent Events
+
+    Emits a "match" event for each validated match as soon as it is accepted, "progress"
+    events as the run moves through its stages, and a closing "done" event with the
+    persistence summary (or "error"). When the final repair changes a match that was
+    already sent, a "replace" event carries the mentee's new match and a "retract" event
+    withdraws it if the mentee ended up unmatched, so the client always converges on the
+    stored result. The run continues and saves its matches even if the client disconnects.
+    """
+    data = request.json
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+    overloaded = llm_overloaded_response()
+    if overloaded:
+        return overloaded
+
+    events = queue.Queue()
+
+    def run():
+        def report_progress(stage, **details):
+            events.put(("progress", dict(details, stage=stage)))
+        try:
+            with app.app_context():
+                result, status_code = run_generate_matches(
+                    data, report_progress,
+                    on_match=lambda match: events.put(("match", dict(match))),
+                    on_retract=lambda match: events.put(("retract", dict(match)))
+                )
+        except Exception as e:
+            logger.error(f"Streamed match run failed: {str(e)}")
+            result, status_code = {"error": str(e)}, 500
+        events.put(("done", (result, status_code)))
+
+    match_stream_pool.submit(metrics.bind_context(run))
+    return Response(
+        stream_with_context(match_stream_events(events)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def match_stream_events(events):
+    """SSE messages for one streamed match run, with keepalives while nothing happens"""
+    yield jobs.format_sse({"stage": "queued"}, event="progress")
+    # Mentor each mentee was last shown with, so later changes go out as replace/retract
+    streamed = {}
+
+    def show(match):
+        previous = streamed.get(match["menteeId"])
+        if previous == match["mentorId"]:
+            return None
+        streamed[match["menteeId"]] = match["mentorId"]
+        if previous is None:
+            return jobs.format_sse({"match": match, "matched": len(streamed)}, event="match")
+        return jobs.format_sse({"match": match, "previousMentorId": previous, "matched": len(streamed)},
+                               event="replace")
+
+    def retract(mentee_id):
+        mentor_id = streamed.pop(mentee_id)
+        return jobs.format_sse({"menteeId": mentee_id, "mentorId": mentor_id, "matched": len(streamed)},
+                               event="retract")
+
+    while True:
+        try:
+            kind, payload = events.get(timeout=MATCH_STREAM_KEEPALIVE_SECONDS)
+        except queue.Empty:
+            # Comment lines keep proxies from closing an idle connection
+            yield ": keepalive\n\n"
+            continue
+
+        if kind == "match":
+            message = show(payload)
+            if message:
+                yield message
+        elif kind == "retract":
+            if streamed.get(payload["menteeId"]) == payload["mentorId"]:
+                yield retract(payload["menteeId"])
+        elif kind == "progress":
+            yield jobs.format_sse(dict(payload, matched=len(streamed)), event="progress")
+        else:
+            result, status_code = payload
+            if status_code != 200:
+                yield jobs.format_sse(dict(result, statusCode=status_code), event="error")
+                return
+            # The returned matches are what was stored: fallback runs only produce them here,
+            # and anything sent earlier that they do not contain is withdrawn
+            final = result.get("matches", [])
+            final_mentees = {match["menteeId"] for match in final}
+            for mentee_id in [mentee_id for mentee_id in streamed if mentee_id not in final_mentees]:
+                yield retract(mentee_id)
+            for match in final:
+                message = show(match)
+                if message:
+                    yield message
+            summary = {key: value for key, value in result.items() if key != "matches"}
+            summary["matched"] = len(streamed)
+            summary["match_ids"] = {match["menteeId"]: match["id"] for match in result.get("matches", [])
+                                    if match.get("id")}
+            yield jobs.format_sse(summary, event="done")
+            return
+
+@app.route("/ready", methods=["GET"])
+def readiness_check():
+    """
+    Readiness probe: 200 once the dependencies are warm, 503 until then
+
+    Unlike /health (liveness), this stays 503 while Firestore cannot be reached, so
+    a load balancer only routes traffic to workers that can serve it.
+    """
+    with dependency_status_lock:
+        checks = {name: dict(state) for name, state in dependency_status.items()}
+    checks["parse_pool"] = {"status": "ok" if parse_pool.ready() else "pending", "error": None}
+    ready = all(check["status"] in ("ok", "disabled") for check in checks.values())
+    return jsonify({
+        "status": "ready" if ready else "starting",
+        "checks": checks,
+        "uptime_seconds": round(time.time() - SERVER_STARTED_AT, 3)
+    }), 200 if ready else 503
+
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
@@ -1180,11 +1677,42 @@ def health_check():
         "service": "Mentorship API",
         "timestamp": datetime.datetime.now().isoformat(),
         "firebase_available": USE_FIREBASE,
-        "ai_available": USE_AI,
-        "pdf_processing_available": PDF_DOCX_AVAILABLE
+        "storage": data_store.name,
+        "ai_available": llm.get_client() is not None,
+        "llm": llm.get_client().stats() if llm.get_client() else None,
+        "pdf_processing_available": PDF_DOCX_AVAILABLE,
+        "content_cache": content_cache.stats() if content_cache else None,
+        "jobs": job_queue.stats(),
+        "rate_limits": limiter.stats(),
+        "logging": log_config.stats(),
+        "parse_pool": parse_pool.stats(),
+        "embeddings": embedding_index.stats() if embedding_index else None
     })
 
+def collect_gauges():
+    """Refresh the pool and admission gauges when /metrics is scraped"""
+    if llm.get_client() is not None:
+        admission = llm.get_client().gate.stats()
+        metrics.llm_in_flight.set(admission["in_flight"])
+        metrics.llm_waiting.set(admission["waiting"])
+    if job_queue is not None:
+        for job_type, depth in job_queue.stats()["queue_depth"].items():
+            metrics.job_queue_depth.set(depth, job_type=job_type)
+    metrics.parse_pool_in_flight.set(parse_pool.stats()["in_flight"])
+
+metrics.registry.add_collector(collect_gauges)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus metrics of this worker process"""
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
+    # Development server; production runs under gunicorn (gunicorn -c gunicorn.conf.py wsgi:app).
+    # debug=True runs this file twice: a reloader parent that only watches the sources and
+    # the child (WERKZEUG_RUN_MAIN=true) that serves requests, so only the child starts services
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        init_services()
     # Use environment variable for port with fallback to default
     port = int(os.environ.get("PORT", DEFAULT_PORT))
     app.run(debug=True, host='0.0.0.0', port=port)
@@ -0,0 +1,77 @@
+# Storage abstraction used by every route.
+# Routes talk to storage.signups, storage.matches and storage.user_files; the backend
+# (Firestore, SQLite or in-memory) is chosen once at startup.
+
+import logging
+import os
+
+from .base import SERVER_TIMESTAMP, DocumentRepository, MatchRepository, Storage
+from .memory import create_memory_storage
+from .sqlite import create_sqlite_storage
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("firestore", "sqlite", "memory")
+
+
+def create_storage(backend, db=None, sqlite_path=None, legacy_json_path=None):
+    """
+    Build a Storage for the named backend
+
+    Args:
+        backend: "firestore", "sqlite" or "memory"
+        db: Firestore client (firestore backend only)
+        sqlite_path: Database file (sqlite backend only)
+        legacy_json_path: Old mock_data match file to import once (sqlite backend only)
+    """
+    if backend == "firestore":
+        if db is None:
+            raise ValueError("The firestore storage backend needs a Firestore client")
+        # Imported here so the local backends work without the Firebase SDK installed
+        from .firestore import create_firestore_storage
+        return create_firestore_storage(db)
+    if backend == "sqlite":
+        return create_sqlite_storage(sqlite_path, legacy_json_path)
+    if backend == "memory":
+        return create_memory_storage()
+    raise ValueError(f"Unknown storage backend: {backend}. Use one of: {', '.join(BACKENDS)}")
+
+
+def default_sqlite_path(data_dir, legacy_dir):
+    """
+    data_dir/mentorship.db, or the database an older version created in legacy_dir
+
+    The database used to live next to the mock data; an existing one is kept where it is
+    so its matches are not silently left behind.
+    """
+    legacy_path = os.path.join(legacy_dir, "mentorship.db")
+    if os.path.exists(legacy_path):
+        logger.warning(f"Using the SQLite store at its old location {legacy_path}; move it to {data_dir} "
+                       f"or set STORAGE_SQLITE_PATH")
+        return legacy_path
+    return os.path.join(data_dir, "mentorship.db")
+
+
+def create_storage_from_env(db, data_dir, legacy_dir):
+    """
+    Storage selected by STORAGE_BACKEND, defaulting to Firestore when a client is
+    available and SQLite (STORAGE_SQLITE_PATH, else data_dir/mentorship.db) otherwise
+
+    legacy_dir holds the old mentorship_matches.json that SQLite imports once.
+    """
+    backend = os.environ.get("STORAGE_BACKEND", "firestore" if db is not None else "sqlite").lower()
+    sqlite_path = os.environ.get("STORAGE_SQLITE_PATH")
+    if backend == "sqlite" and not sqlite_path:
+        sqlite_path = default_sqlite_path(data_dir, legacy_dir)
+    return create_storage(
+        backend,
+        db=db,
+        sqlite_path=sqlite_path,
+        legacy_json_path=os.path.join(legacy_dir, "mentorship_matches.json")
+    )
+
+
+__all__ = [
+    "SERVER_TIMESTAMP", "BACKENDS", "DocumentRepository", "MatchRepository", "Storage",
+    "create_storage", "create_storage_from_env"
+]
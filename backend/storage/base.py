@@ -0,0 +1,128 @@
+# Repository interfaces shared by every storage backend.
+
+import datetime
+import uuid
+
+
+class _ServerTimestamp:
+    """Placeholder replaced by the backend's notion of "now" when a document is written"""
+
+    def __repr__(self):
+        return "SERVER_TIMESTAMP"
+
+    # Stay a singleton when documents are copied, so identity checks keep working
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+SERVER_TIMESTAMP = _ServerTimestamp()
+
+# Fields of a match that backends index for lookups
+MATCH_INDEX_FIELDS = ("mentorId", "menteeId", "status", "cohort")
+
+
+def new_match_id():
+    """Collision-free ID for a match stored by a local backend"""
+    return f"local-match-{uuid.uuid4().hex}"
+
+
+def resolve_timestamps(data):
+    """Copy of data with SERVER_TIMESTAMP placeholders replaced by the current ISO time"""
+    now = datetime.datetime.now().isoformat()
+    return {key: (now if value is SERVER_TIMESTAMP else value) for key, value in data.items()}
+
+
+def project(match, fields):
+    """Copy of a match holding only the given fields (plus "id"); fields=None keeps everything"""
+    if fields is None:
+        return match
+    return {key: value for key, value in match.items() if key in fields or key == "id"}
+
+
+class DocumentRepository:
+    """Documents keyed by ID (signups and user_files are keyed by user ID)"""
+
+    def get(self, doc_id):
+        """The document as a dict, or None"""
+        raise NotImplementedError
+
+    def get_many(self, doc_ids):
+        """Dict of doc_id -> document for the IDs that exist, in one round trip"""
+        raise NotImplementedError
+
+    def set(self, doc_id, data, merge=False):
+        """Create or replace a document; merge=True only overwrites the given fields"""
+        raise NotImplementedError
+
+    def set_many(self, documents):
+        """Create or replace several documents given as a dict of doc_id -> data"""
+        raise NotImplementedError
+
+    def delete(self, doc_id):
+        """True if a document was deleted"""
+        raise NotImplementedError
+
+
+class MatchRepository:
+    """Mentorship matches with generated IDs and lookups by mentor, mentee and status"""
+
+    def create_many(self, matches):
+        """
+        Store new matches, setting each match's "id"
+
+        Returns:
+            Tuple of (stored_ids, failed) where failed maps match ID -> error message
+        """
+        raise NotImplementedError
+
+    def get(self, match_id):
+        """The match as a dict, or None"""
+        raise NotImplementedError
+
+    def get_many(self, match_ids):
+        """Dict of match_id -> match for the IDs that exist, in one round trip"""
+        raise NotImplementedError
+
+    def update(self, match_id, fields):
+        """Merge fields into a match; returns the updated match or None if it does not exist"""
+        raise NotImplementedError
+
+    def delete(self, match_id):
+        """True if a match was deleted"""
+        raise NotImplementedError
+
+    def find(self, mentorId=None, menteeId=None, status=None, limit=None):
+        """Matches equal to every given filter, oldest first"""
+        raise NotImplementedError
+
+    def page(self, mentorId=None, menteeId=None, status=None, cohort=None, start_after=None, limit=50,
+             fields=None):
+        """
+        One page of matches equal to every given filter, ordered by match ID
+
+        Args:
+            start_after: Match ID cursor from the previous page, or None for the first page
+            limit: Page size
+            fields: Field names to return (each match always keeps its "id"), or None for all
+
+        Returns:
+            Tuple of (matches, next_cursor) where next_cursor is None on the last page
+        """
+        raise NotImplementedError
+
+    def has_matches(self, user_id):
+        """True if the user is the mentor or mentee of any match"""
+        return bool(self.find(menteeId=user_id, limit=1)) or bool(self.find(mentorId=user_id, limit=1))
+
+
+class Storage:
+    """The repositories every route uses, backed by one storage backend"""
+
+    def __init__(self, name, signups, matches, user_files):
+        self.name = name
+        self.signups = signups
+        self.matches = matches
+        self.user_files = user_files
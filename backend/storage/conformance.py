@@ -0,0 +1,132 @@
+# Conformance checks every storage backend must pass.
+# Run against the local backends with:  python -m storage.conformance
+# A Firestore project (e.g. the emulator) can be checked by calling run_conformance
+# with a factory that returns create_storage("firestore", db=...).
+
+import os
+import sys
+import tempfile
+import threading
+
+from . import create_storage, SERVER_TIMESTAMP
+
+
+def check_documents(repo):
+    assert repo.get("user-1") is None
+    repo.set("user-1", {"name": "Ana", "mentorshipRole": "Mentee", "timestamp": SERVER_TIMESTAMP})
+    doc = repo.get("user-1")
+    # Local backends store an ISO string, Firestore a datetime; never the placeholder itself
+    assert doc["name"] == "Ana" and doc["timestamp"] not in (None, SERVER_TIMESTAMP), doc
+
+    repo.set("user-1", {"major": "Biology"}, merge=True)
+    assert repo.get("user-1")["name"] == "Ana" and repo.get("user-1")["major"] == "Biology"
+    repo.set("user-1", {"major": "History"})
+    assert "name" not in repo.get("user-1")
+
+    repo.set_many({f"bulk-{i}": {"n": i} for i in range(1200)})
+    found = repo.get_many([f"bulk-{i}" for i in range(1200)] + ["missing"])
+    assert len(found) == 1200 and found["bulk-7"]["n"] == 7
+
+    assert repo.delete("user-1") is True
+    assert repo.delete("user-1") is False
+    assert repo.get("user-1") is None
+
+
+def check_matches(repo):
+    matches = [{"mentorId": f"mentor-{i % 3}", "menteeId": f"mentee-{i}", "status": "pending"} for i in range(30)]
+    stored_ids, failed = repo.create_many(matches)
+    assert not failed and len(stored_ids) == 30 and len(set(stored_ids)) == 30
+    assert all(match["id"] for match in matches)
+
+    first = repo.get(stored_ids[0])
+    assert first["menteeId"] == "mentee-0" and first["id"] == stored_ids[0]
+    assert repo.get("no-such-match") is None
+    assert set(repo.get_many(stored_ids[:5] + ["no-such-match"])) == set(stored_ids[:5])
+
+    assert len(repo.find(mentorId="mentor-1")) == 10
+    assert [m["menteeId"] for m in repo.find(menteeId="mentee-4")] == ["mentee-4"]
+    assert len(repo.find(mentorId="mentor-1", limit=3)) == 3
+
+    updated = repo.update(stored_ids[1], {"status": "confirmed", "updatedBy": "mentee-1"})
+    assert updated["status"] == "confirmed" and updated["menteeId"] == "mentee-1"
+    assert repo.update("no-such-match", {"status": "confirmed"}) is None
+    assert [m["id"] for m in repo.find(status="confirmed")] == [stored_ids[1]]
+    assert len(repo.find(mentorId="mentor-1", status="pending")) == 9
+
+    assert repo.delete(stored_ids[2]) is True
+    assert repo.delete(stored_ids[2]) is False
+    assert repo.get(stored_ids[2]) is None
+    assert all(m["id"] != stored_ids[2] for m in repo.find(mentorId="mentor-2"))
+
+    assert repo.has_matches("mentor-1") and repo.has_matches("mentee-4")
+    assert not repo.has_matches("mentee-2") and not repo.has_matches("nobody")
+
+
+def check_pages(repo):
+    matches = [{"mentorId": f"mentor-{i % 2}", "menteeId": f"mentee-{i}", "status": "pending",
+                "cohort": "2025" if i < 25 else "2026", "matchReason": "long text"} for i in range(35)]
+    repo.create_many(matches)
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = repo.page(start_after=cursor, limit=10)
+        seen.extend(m["id"] for m in page)
+        if cursor is None:
+            break
+    assert seen == sorted(m["id"] for m in matches), seen
+    assert len(page) == 5
+
+    page, cursor = repo.page(cohort="2026", limit=10)
+    assert len(page) == 10 and cursor is None and all(m["cohort"] == "2026" for m in page)
+    page, cursor = repo.page(mentorId="mentor-1", cohort="2025", limit=100, fields=["status"])
+    assert len(page) == 12 and cursor is None
+    assert all(set(m) == {"id", "status"} for m in page), page[0]
+    assert repo.page(status="confirmed")[0] == []
+
+
+def check_concurrent_updates(repo):
+    stored_ids, _ = repo.create_many([{"mentorId": "m", "menteeId": f"c-{i}", "status": "pending"} for i in range(200)])
+
+    def worker(offset):
+        for match_id in stored_ids[offset::8]:
+            repo.update(match_id, {"status": "approved"})
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(m["status"] == "approved" for m in repo.get_many(stored_ids).values())
+
+
+def run_conformance(storage_factory):
+    """Run every check against fresh storage instances; raises AssertionError on failure"""
+    checks = [
+        ("signups", lambda s: check_documents(s.signups)),
+        ("user_files", lambda s: check_documents(s.user_files)),
+        ("matches", lambda s: check_matches(s.matches)),
+        ("match pages", lambda s: check_pages(s.matches)),
+        ("concurrent match updates", lambda s: check_concurrent_updates(s.matches))
+    ]
+    for name, check in checks:
+        storage = storage_factory()
+        check(storage)
+        print(f"  ok  {storage.name}: {name}")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        counter = iter(range(1000))
+        factories = {
+            "memory": lambda: create_storage("memory"),
+            "sqlite": lambda: create_storage("sqlite", sqlite_path=os.path.join(tmp, f"conformance-{next(counter)}.db"))
+        }
+        for name, factory in factories.items():
+            print(f"Checking {name} backend")
+            run_conformance(factory)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+# Firestore storage backend.
+
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_admin import firestore
+from google.api_core import exceptions as google_exceptions
+from google.cloud.firestore_v1 import ArrayRemove, ArrayUnion, FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+
+import firestore_writes
+
+from .base import DocumentRepository, MatchRepository, Storage, SERVER_TIMESTAMP
+
+logger = logging.getLogger(__name__)
+
+# Documents fetched per get_all call
+READ_CHUNK_SIZE = 300
+
+# user_match_index/{userId} = {"matchIds": [...], "complete": bool} lists the matches a user
+# belongs to, so "is this user matched?" is one point read instead of two collection queries.
+# Writes keep matchIds current; "complete" is set once the list has been backfilled from the
+# matches collection, after which an empty list is a reliable "no matches".
+MATCH_INDEX_COLLECTION = "user_match_index"
+
+# Threads used to run the mentor and mentee queries side by side when a user has no index document
+INDEX_FALLBACK_WORKERS = 8
+
+
+def _to_firestore(data):
+    """Swap the backend-neutral SERVER_TIMESTAMP placeholder for Firestore's sentinel"""
+    return {key: (firestore.SERVER_TIMESTAMP if value is SERVER_TIMESTAMP else value) for key, value in data.items()}
+
+
+def _get_all(db, refs):
+    """Fetch many documents with batched get_all calls"""
+    found = {}
+    for start in range(0, len(refs), READ_CHUNK_SIZE):
+        for snapshot in db.get_all(refs[start:start + READ_CHUNK_SIZE]):
+            if snapshot.exists:
+                found[snapshot.id] = snapshot.to_dict()
+    return found
+
+
+class FirestoreDocumentRepository(DocumentRepository):
+
+    def __init__(self, db, collection):
+        self.db = db
+        self.collection = collection
+
+    def _ref(self, doc_id):
+        return self.db.collection(self.collection).document(doc_id)
+
+    def get(self, doc_id):
+        snapshot = self._ref(doc_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def get_many(self, doc_ids):
+        return _get_all(self.db, [self._ref(doc_id) for doc_id in doc_ids])
+
+    def set(self, doc_id, data, merge=False):
+        self._ref(doc_id).set(_to_firestore(data), merge=merge)
+
+    def set_many(self, documents):
+        items = list(documents.items())
+        for start in range(0, len(items), firestore_writes.MAX_BATCH_SIZE):
+            batch = self.db.batch()
+            for doc_id, data in items[start:start + firestore_writes.MAX_BATCH_SIZE]:
+                batch.set(self._ref(doc_id), _to_firestore(data))
+            batch.commit()
+
+    def delete(self, doc_id):
+        ref = self._ref(doc_id)
+        if not ref.get().exists:
+            return False
+        ref.delete()
+        return True
+
+
+class FirestoreMatchRepository(MatchRepository):
+
+    collection = "mentorship_matches"
+
+    def __init__(self, db):
+        self.db = db
+        self._query_pool = ThreadPoolExecutor(max_workers=INDEX_FALLBACK_WORKERS, thread_name_prefix="match-index")
+
+    def _ref(self, match_id):
+        return self.db.collection(self.collection).document(match_id)
+
+    def _index_ref(self, user_id):
+        return self.db.collection(MATCH_INDEX_COLLECTION).document(user_id)
+
+    @staticmethod
+    def _members(match):
+        return {user_id for user_id in (match.get("mentorId"), match.get("menteeId")) if user_id}
+
+    def _add_to_index(self, match_ids_by_user):
+        """Union match IDs into each user's index document"""
+        items = list(match_ids_by_user.items())
+        for start in range(0, len(items), firestore_writes.MAX_BATCH_SIZE):
+            chunk = items[start:start + firestore_writes.MAX_BATCH_SIZE]
+            batch = self.db.batch()
+            for user_id, match_ids in chunk:
+                batch.set(self._index_ref(user_id), {"matchIds": ArrayUnion(list(match_ids))}, merge=True)
+            try:
+                batch.commit()
+            except Exception as e:
+                # A missing index document only costs a query fallback; a stale one gives wrong answers
+                logger.error(f"Updating the match index for {len(chunk)} users failed: {str(e)}")
+                self._drop_index([user_id for user_id, _ in chunk])
+
+    def _drop_index(self, user_ids):
+        for user_id in user_ids:
+            try:
+                self._index_ref(user_id).delete()
+            except Exception as e:
+                logger.error(f"Could not drop match index for user {user_id}: {str(e)}")
+
+    def _remove_from_index(self, batch, user_ids, match_id):
+        """Queue ArrayRemove updates on the index documents that exist"""
+        refs = [self._index_ref(user_id) for user_id in user_ids]
+        for snapshot in self.db.get_all(refs):
+            if snapshot.exists:
+                batch.update(snapshot.reference, {"matchIds": ArrayRemove([match_id])})
+
+    def create_many(self, matches):
+        # Batched, parallel commits instead of one round trip per match
+        stored_ids, failed = firestore_writes.save_documents_batched(self.db, self.collection, matches)
+        stored = set(stored_ids)
+        match_ids_by_user = defaultdict(list)
+        for match in matches:
+            if match.get("id") in stored:
+                for user_id in self._members(match):
+                    match_ids_by_user[user_id].append(match["id"])
+        self._add_to_index(match_ids_by_user)
+        return stored_ids, failed
+
+    def get(self, match_id):
+        snapshot = self._ref(match_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def get_many(self, match_ids):
+        return _get_all(self.db, [self._ref(match_id) for match_id in match_ids])
+
+    def update(self, match_id, fields):
+        ref = self._ref(match_id)
+        before = None
+        if "mentorId" in fields or "menteeId" in fields:
+            before = self.get(match_id)
+            if before is None:
+                return None
+        try:
+            ref.update(_to_firestore(fields))
+        except google_exceptions.NotFound:
+            return None
+        snapshot = ref.get()
+        if not snapshot.exists:
+            return None
+        match = snapshot.to_dict()
+        if before is not None:
+            left = self._members(before) - self._members(match)
+            joined = self._members(match) - self._members(before)
+            if left:
+                batch = self.db.batch()
+                self._remove_from_index(batch, left, match_id)
+                batch.commit()
+            self._add_to_index({user_id: [match_id] for user_id in joined})
+        return match
+
+    def delete(self, match_id):
+        ref = self._ref(match_id)
+        snapshot = ref.get()
+        if not snapshot.exists:
+            return False
+        # The match and its index entries go in one atomic batch
+        batch = self.db.batch()
+        batch.delete(ref)
+        self._remove_from_index(batch, self._members(snapshot.to_dict()), match_id)
+        batch.commit()
+        return True
+
+    def _query(self, mentorId=None, menteeId=None, status=None, limit=None):
+        query = self.db.collection(self.collection)
+        for field, value in (("mentorId", mentorId), ("menteeId", menteeId), ("status", status)):
+            if value is not None:
+                query = query.where(filter=FieldFilter(field, "==", value))
+        if limit is not None:
+            query = query.limit(int(limit))
+        return query
+
+    def find(self, mentorId=None, menteeId=None, status=None, limit=None):
+        query = self._query(mentorId=mentorId, menteeId=menteeId, status=status, limit=limit)
+        return [dict(snapshot.to_dict(), id=snapshot.id) for snapshot in query.stream()]
+
+    def page(self, mentorId=None, menteeId=None, status=None, cohort=None, start_after=None, limit=50,
+             fields=None):
+        query = self._query(mentorId=mentorId, menteeId=menteeId, status=status)
+        if cohort is not None:
+            query = query.where(filter=FieldFilter("cohort", "==", cohort))
+        query = query.order_by(FieldPath.document_id())
+        if start_after is not None:
+            query = query.start_after({FieldPath.document_id(): start_after})
+        if fields is not None:
+            # Projection happens server side, so skipped fields are never transferred
+            query = query.select(list(fields))
+        # One extra document tells us whether another page follows
+        snapshots = list(query.limit(int(limit) + 1).stream())
+        matches = [dict(snapshot.to_dict(), id=snapshot.id) for snapshot in snapshots[:int(limit)]]
+        next_cursor = matches[-1]["id"] if len(snapshots) > int(limit) else None
+        return matches, next_cursor
+
+    def _match_ids_for(self, field, user_id, limit=None):
+        query = self._query(limit=limit, **{field: user_id}).select([FieldPath.document_id()])
+        return [snapshot.id for snapshot in query.stream()]
+
+    def has_matches(self, user_id):
+        snapshot = self._index_ref(user_id).get()
+        if snapshot.exists:
+            index = snapshot.to_dict()
+            if index.get("matchIds"):
+                return True
+            if index.get("complete"):
+                return False
+        return self._has_matches_by_query(user_id)
+
+    def _has_matches_by_query(self, user_id):
+        """Fallback for users without a complete index: both limit(1) queries in parallel, then backfill"""
+        futures = [self._query_pool.submit(self._match_ids_for, field, user_id, 1)
+                   for field in ("menteeId", "mentorId")]
+        found = any(future.result() for future in futures)
+        try:
+            if found:
+                futures = [self._query_pool.submit(self._match_ids_for, field, user_id)
+                           for field in ("menteeId", "mentorId")]
+                match_ids = [match_id for future in futures for match_id in future.result()]
+                # ArrayUnion with merge never clobbers IDs added by a concurrent create_many
+                self._index_ref(user_id).set({"matchIds": ArrayUnion(match_ids), "complete": True}, merge=True)
+            else:
+                self._index_ref(user_id).set({"complete": True}, merge=True)
+        except Exception as e:
+            logger.error(f"Could not backfill match index for user {user_id}: {str(e)}")
+        return found
+
+
+def create_firestore_storage(db):
+    return Storage(
+        "firestore",
+        FirestoreDocumentRepository(db, "mentorship_signups"),
+        FirestoreMatchRepository(db),
+        FirestoreDocumentRepository(db, "user_files")
+    )
@@ -0,0 +1,164 @@
+# In-memory storage backend for local development and load tests.
+
+import bisect
+import copy
+import threading
+
+from .base import (DocumentRepository, MatchRepository, Storage, MATCH_INDEX_FIELDS, new_match_id, project,
+                   resolve_timestamps)
+
+
+class MemoryDocumentRepository(DocumentRepository):
+
+    def __init__(self):
+        self._docs = {}
+        self._lock = threading.Lock()
+
+    def get(self, doc_id):
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            return copy.deepcopy(doc) if doc is not None else None
+
+    def get_many(self, doc_ids):
+        with self._lock:
+            return {doc_id: copy.deepcopy(self._docs[doc_id]) for doc_id in doc_ids if doc_id in self._docs}
+
+    def set(self, doc_id, data, merge=False):
+        data = resolve_timestamps(copy.deepcopy(data))
+        with self._lock:
+            if merge and doc_id in self._docs:
+                self._docs[doc_id].update(data)
+            else:
+                self._docs[doc_id] = data
+
+    def set_many(self, documents):
+        for doc_id, data in documents.items():
+            self.set(doc_id, data)
+
+    def delete(self, doc_id):
+        with self._lock:
+            return self._docs.pop(doc_id, None) is not None
+
+
+def _insort(ids, match_id):
+    bisect.insort(ids, match_id)
+
+
+def _remove_sorted(ids, match_id):
+    position = bisect.bisect_left(ids, match_id)
+    if position < len(ids) and ids[position] == match_id:
+        del ids[position]
+
+
+class MemoryMatchRepository(MatchRepository):
+    """
+    Matches in a dict with a secondary index per indexed field
+
+    Every ID list (all matches, and each indexed value) is kept sorted on write, so a
+    page is found by bisecting to the cursor instead of sorting the whole collection.
+    """
+
+    def __init__(self):
+        self._matches = {}
+        self._sequence = {}
+        self._next_sequence = 0
+        self._ids = []
+        self._index = {field: {} for field in MATCH_INDEX_FIELDS}
+        self._lock = threading.Lock()
+
+    def _index_add(self, match):
+        for field in MATCH_INDEX_FIELDS:
+            _insort(self._index[field].setdefault(match.get(field), []), match["id"])
+
+    def _index_remove(self, match):
+        for field in MATCH_INDEX_FIELDS:
+            ids = self._index[field].get(match.get(field))
+            if ids is not None:
+                _remove_sorted(ids, match["id"])
+
+    def create_many(self, matches):
+        stored_ids = []
+        with self._lock:
+            for match in matches:
+                match["id"] = new_match_id()
+                stored = resolve_timestamps(copy.deepcopy(match))
+                self._matches[match["id"]] = stored
+                self._sequence[match["id"]] = self._next_sequence
+                self._next_sequence += 1
+                _insort(self._ids, match["id"])
+                self._index_add(stored)
+                stored_ids.append(match["id"])
+        return stored_ids, {}
+
+    def get(self, match_id):
+        with self._lock:
+            match = self._matches.get(match_id)
+            return copy.deepcopy(match) if match is not None else None
+
+    def get_many(self, match_ids):
+        with self._lock:
+            return {match_id: copy.deepcopy(self._matches[match_id])
+                    for match_id in match_ids if match_id in self._matches}
+
+    def update(self, match_id, fields):
+        with self._lock:
+            match = self._matches.get(match_id)
+            if match is None:
+                return None
+            self._index_remove(match)
+            match.update(resolve_timestamps(copy.deepcopy(fields)))
+            self._index_add(match)
+            return copy.deepcopy(match)
+
+    def delete(self, match_id):
+        with self._lock:
+            match = self._matches.pop(match_id, None)
+            if match is None:
+                return False
+            del self._sequence[match_id]
+            _remove_sorted(self._ids, match_id)
+            self._index_remove(match)
+            return True
+
+    def find(self, mentorId=None, menteeId=None, status=None, limit=None):
+        filters = {"mentorId": mentorId, "menteeId": menteeId, "status": status}
+        with self._lock:
+            candidate_sets = [set(self._index[field].get(value, ()))
+                              for field, value in filters.items() if value is not None]
+            if candidate_sets:
+                ids = set.intersection(*candidate_sets)
+                matches = [self._matches[i] for i in sorted(ids, key=self._sequence.__getitem__)]
+            else:
+                matches = list(self._matches.values())
+            if limit is not None:
+                matches = matches[:int(limit)]
+            return copy.deepcopy(matches)
+
+    def page(self, mentorId=None, menteeId=None, status=None, cohort=None, start_after=None, limit=50,
+             fields=None):
+        filters = [(field, value) for field, value in
+                   (("mentorId", mentorId), ("menteeId", menteeId), ("status", status), ("cohort", cohort))
+                   if value is not None]
+        limit = int(limit)
+        with self._lock:
+            # Walk the shortest sorted ID list from the cursor, checking the other filters per match
+            candidates = [self._index[field].get(value, []) for field, value in filters]
+            ids = min(candidates, key=len) if candidates else self._ids
+            position = bisect.bisect_right(ids, start_after) if start_after is not None else 0
+            selected = []
+            while position < len(ids) and len(selected) <= limit:
+                match = self._matches[ids[position]]
+                if all(match.get(field) == value for field, value in filters):
+                    selected.append(match)
+                position += 1
+            matches = [project(copy.deepcopy(match), fields) for match in selected[:limit]]
+        next_cursor = matches[-1]["id"] if len(selected) > limit else None
+        return matches, next_cursor
+
+    def has_matches(self, user_id):
+        with self._lock:
+            return bool(self._index["menteeId"].get(user_id)) or bool(self._index["mentorId"].get(user_id))
+
+
+def create_memory_storage():
+    return Storage("memory", MemoryDocumentRepository(), MemoryMatchRepository(), MemoryDocumentRepository())
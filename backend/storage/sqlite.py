@@ -0,0 +1,314 @@
+# Embedded SQLite storage backend for running without Firebase.
+# Matches are JSON rows with indexed mentorId/menteeId/status/cohort columns: O(1) lookups
+# by ID, atomic single-row updates and safe concurrent access from several worker
+# threads or processes. Signups and user files share the same database file.
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from .base import DocumentRepository, MatchRepository, Storage, new_match_id, project, resolve_timestamps
+
+logger = logging.getLogger(__name__)
+
+# Columns kept outside the JSON document so they can be indexed
+INDEXED_FIELDS = {"mentorId": "mentor_id", "menteeId": "mentee_id", "status": "status", "cohort": "cohort"}
+
+# SQLite's default limit on bound parameters per statement is 999
+MAX_PARAMS = 900
+
+
+class SQLiteDatabase:
+    """Per-thread connections to one SQLite file; WAL lets readers proceed while another worker writes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def write(self, statements):
+        """Run (sql, params) pairs in one IMMEDIATE transaction"""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in statements:
+                if params and isinstance(params, list):
+                    conn.executemany(sql, params)
+                else:
+                    conn.execute(sql, params or ())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _chunks(items, size=MAX_PARAMS):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class SQLiteDocumentRepository(DocumentRepository):
+    """Documents of one collection stored as JSON rows"""
+
+    def __init__(self, database, collection):
+        self.database = database
+        self.collection = collection
+        self.database.connect().execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                collection TEXT NOT NULL,
+                id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (collection, id)
+            )
+        """)
+
+    def get(self, doc_id):
+        row = self.database.connect().execute(
+            "SELECT data FROM documents WHERE collection = ? AND id = ?", (self.collection, doc_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, doc_ids):
+        found = {}
+        for chunk in _chunks(doc_ids):
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.database.connect().execute(
+                f"SELECT id, data FROM documents WHERE collection = ? AND id IN ({placeholders})",
+                [self.collection] + chunk
+            )
+            found.update({doc_id: json.loads(data) for doc_id, data in rows})
+        return found
+
+    def set(self, doc_id, data, merge=False):
+        data = resolve_timestamps(data)
+        conn = self.database.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if merge:
+                row = conn.execute("SELECT data FROM documents WHERE collection = ? AND id = ?",
+                                   (self.collection, doc_id)).fetchone()
+                if row:
+                    data = dict(json.loads(row[0]), **data)
+            conn.execute("INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)",
+                         (self.collection, doc_id, json.dumps(data)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def set_many(self, documents):
+        self.database.write([(
+            "INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)",
+            [(self.collection, doc_id, json.dumps(resolve_timestamps(data))) for doc_id, data in documents.items()]
+        )])
+
+    def delete(self, doc_id):
+        cursor = self.database.connect().execute(
+            "DELETE FROM documents WHERE collection = ? AND id = ?", (self.collection, doc_id)
+        )
+        return cursor.rowcount > 0
+
+
+class SQLiteMatchRepository(MatchRepository):
+    """Match documents stored as JSON rows with indexed lookup columns"""
+
+    def __init__(self, database, legacy_json_path=None):
+        self.database = database
+        self.database.write([
+            ("""
+                CREATE TABLE IF NOT EXISTS matches (
+                    id TEXT PRIMARY KEY,
+                    mentor_id TEXT,
+                    mentee_id TEXT,
+                    status TEXT,
+                    cohort TEXT,
+                    data TEXT NOT NULL
+                )
+            """, None)
+        ])
+        self._add_cohort_column()
+        self.database.write([
+            ("CREATE INDEX IF NOT EXISTS idx_matches_mentor ON matches (mentor_id)", None),
+            ("CREATE INDEX IF NOT EXISTS idx_matches_mentee ON matches (mentee_id)", None),
+            ("CREATE INDEX IF NOT EXISTS idx_matches_status ON matches (status)", None),
+            ("CREATE INDEX IF NOT EXISTS idx_matches_cohort ON matches (cohort)", None)
+        ])
+        if legacy_json_path:
+            self._import_legacy_json(legacy_json_path)
+
+    def _import_legacy_json(self, legacy_json_path):
+        """
+        One-time import of the old mock_data JSON file, keeping the existing match IDs
+
+        Every gunicorn worker opens the storage after the fork, so several processes can
+        get here at once: the emptiness check and the insert share one IMMEDIATE
+        transaction, and exactly one of them imports and renames the file.
+        """
+        if not os.path.exists(legacy_json_path):
+            return
+        try:
+            with open(legacy_json_path, 'r') as f:
+                legacy_matches = [m for m in json.load(f) if isinstance(m, dict) and m.get("id")]
+        except FileNotFoundError:
+            # Another worker imported and renamed it in the meantime
+            return
+        except Exception as e:
+            logger.error(f"Could not read legacy match file {legacy_json_path}: {str(e)}")
+            return
+        conn = self.database.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM matches LIMIT 1").fetchone() is not None:
+                conn.execute("ROLLBACK")
+                return
+            conn.executemany(
+                "INSERT OR REPLACE INTO matches (id, mentor_id, mentee_id, status, cohort, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [self._row_values(resolve_timestamps(match)) for match in legacy_matches]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        try:
+            os.replace(legacy_json_path, legacy_json_path + ".migrated")
+        except FileNotFoundError:
+            pass
+        logger.info(f"Imported {len(legacy_matches)} matches from {legacy_json_path}")
+
+    def _add_cohort_column(self):
+        """Databases created before cohorts were indexed get the column, filled from the JSON"""
+        columns = [row[1] for row in self.database.connect().execute("PRAGMA table_info(matches)")]
+        if "cohort" not in columns:
+            self.database.write([
+                ("ALTER TABLE matches ADD COLUMN cohort TEXT", None),
+                ("UPDATE matches SET cohort = json_extract(data, '$.cohort')", None)
+            ])
+
+    @staticmethod
+    def _row_values(match):
+        return (match["id"], match.get("mentorId"), match.get("menteeId"), match.get("status"), match.get("cohort"),
+                json.dumps(match))
+
+    def _insert(self, matches):
+        self.database.write([(
+            "INSERT OR REPLACE INTO matches (id, mentor_id, mentee_id, status, cohort, data) VALUES (?, ?, ?, ?, ?, ?)",
+            [self._row_values(resolve_timestamps(match)) for match in matches]
+        )])
+
+    def create_many(self, matches):
+        for match in matches:
+            match["id"] = new_match_id()
+        if matches:
+            self._insert(matches)
+        return [match["id"] for match in matches], {}
+
+    def get(self, match_id):
+        row = self.database.connect().execute("SELECT data FROM matches WHERE id = ?", (match_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, match_ids):
+        found = {}
+        for chunk in _chunks(match_ids):
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.database.connect().execute(
+                f"SELECT id, data FROM matches WHERE id IN ({placeholders})", chunk
+            )
+            found.update({match_id: json.loads(data) for match_id, data in rows})
+        return found
+
+    def update(self, match_id, fields):
+        conn = self.database.connect()
+        # IMMEDIATE takes the write lock up front so concurrent updates cannot interleave
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM matches WHERE id = ?", (match_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            match = json.loads(row[0])
+            match.update(resolve_timestamps(fields))
+            conn.execute(
+                "UPDATE matches SET mentor_id = ?, mentee_id = ?, status = ?, cohort = ?, data = ? WHERE id = ?",
+                self._row_values(match)[1:] + (match_id,)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return match
+
+    def delete(self, match_id):
+        cursor = self.database.connect().execute("DELETE FROM matches WHERE id = ?", (match_id,))
+        return cursor.rowcount > 0
+
+    def find(self, mentorId=None, menteeId=None, status=None, limit=None):
+        clauses = []
+        values = []
+        for field, value in (("mentorId", mentorId), ("menteeId", menteeId), ("status", status)):
+            if value is not None:
+                clauses.append(f"{INDEXED_FIELDS[field]} = ?")
+                values.append(value)
+        query = "SELECT data FROM matches"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY rowid"
+        if limit is not None:
+            query += " LIMIT ?"
+            values.append(int(limit))
+        return [json.loads(row[0]) for row in self.database.connect().execute(query, values)]
+
+    def page(self, mentorId=None, menteeId=None, status=None, cohort=None, start_after=None, limit=50,
+             fields=None):
+        clauses = []
+        values = []
+        filters = (("mentorId", mentorId), ("menteeId", menteeId), ("status", status), ("cohort", cohort))
+        for field, value in filters:
+            if value is not None:
+                clauses.append(f"{INDEXED_FIELDS[field]} = ?")
+                values.append(value)
+        if start_after is not None:
+            clauses.append("id > ?")
+            values.append(start_after)
+        query = "SELECT data FROM matches"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        # One extra row tells us whether another page follows
+        query += " ORDER BY id LIMIT ?"
+        values.append(int(limit) + 1)
+        rows = self.database.connect().execute(query, values).fetchall()
+        matches = [project(json.loads(row[0]), fields) for row in rows[:int(limit)]]
+        next_cursor = matches[-1]["id"] if len(rows) > int(limit) else None
+        return matches, next_cursor
+
+    def has_matches(self, user_id):
+        # Two index probes; stops at the first hit
+        row = self.database.connect().execute(
+            "SELECT EXISTS (SELECT 1 FROM matches WHERE mentee_id = ?) "
+            "OR EXISTS (SELECT 1 FROM matches WHERE mentor_id = ?)", (user_id, user_id)
+        ).fetchone()
+        return bool(row[0])
+
+    def count(self):
+        return self.database.connect().execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+
+def create_sqlite_storage(path, legacy_json_path=None):
+    database = SQLiteDatabase(path)
+    return Storage(
+        "sqlite",
+        SQLiteDocumentRepository(database, "mentorship_signups"),
+        SQLiteMatchRepository(database, legacy_json_path),
+        SQLiteDocumentRepository(database, "user_files")
+    )
@@ -0,0 +1,7 @@
+# WSGI entry point for production servers:  gunicorn -c gunicorn.conf.py wsgi:app
+# Importing this module only builds the Flask app; Firebase, Gemini and the worker pools
+# are set up per worker process by the post_fork hook in gunicorn.conf.py.
+
+from server01 import create_app
+
+app = create_app()
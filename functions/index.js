@@ -7,13 +7,49 @@
  * See a full list of supported triggers at https://firebase.google.com/docs/functions
  */
 
-const {onRequest} = require("firebase-functions/v2/https");
+const {onDocumentWritten} = require("firebase-functions/v2/firestore");
 const logger = require("firebase-functions/logger");
+const {initializeApp} = require("firebase-admin/app");
+const {getFirestore, FieldValue} = require("firebase-admin/firestore");
 
-// Create and deploy your first functions
-// https://firebase.google.com/docs/functions/get-started
+initializeApp();
 
-// exports.helloWorld = onRequest((request, response) => {
-//   logger.info("Hello logs!", {structuredData: true});
-//   response.send("Hello from Firebase!");
-// });
+/**
+ * Users (mentor and mentee) that belong to a match document.
+ * @param {object|undefined} match Match data
+ * @return {Set<string>} User IDs
+ */
+function matchMembers(match) {
+  return new Set([match?.mentorId, match?.menteeId].filter(Boolean));
+}
+
+// Keeps user_match_index/{userId} in sync for matches written directly by
+// the web app (the Flask backend maintains it for its own writes; both use
+// arrayUnion/arrayRemove, so applying a change twice is harmless).
+exports.syncUserMatchIndex = onDocumentWritten(
+    "mentorship_matches/{matchId}",
+    async (event) => {
+      const matchId = event.params.matchId;
+      const before = matchMembers(event.data.before.data());
+      const after = matchMembers(event.data.after.data());
+      const db = getFirestore();
+      const batch = db.batch();
+
+      for (const userId of after) {
+        if (!before.has(userId)) {
+          batch.set(db.collection("user_match_index").doc(userId), {
+            matchIds: FieldValue.arrayUnion(matchId),
+          }, {merge: true});
+        }
+      }
+      for (const userId of before) {
+        if (!after.has(userId)) {
+          batch.set(db.collection("user_match_index").doc(userId), {
+            matchIds: FieldValue.arrayRemove(matchId),
+          }, {merge: true});
+        }
+      }
+      await batch.commit();
+      logger.debug(`Match index updated for ${matchId}`);
+    },
+);
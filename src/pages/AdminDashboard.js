@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from "react";
 import { firestore } from "../firebase";
+import { streamGeneratedMatches } from "../services/api";
 
 import { 
   collection, 
@@ -27,6 +28,7 @@ const AdminDashboard = () => {
   const [signups, setSignups] = useState([]);
   const [mentorshipMatches, setMentorshipMatches] = useState([]);
   const [generating, setGenerating] = useState(false);
+  const [generationProgress, setGenerationProgress] = useState("");
   const [maxMenteesPerMentor, setMaxMenteesPerMentor] = useState(3);
   const [mentorshipSettings, setMentorshipSettings] = useState({});
   const [activeTab, setActiveTab] = useState("signups"); 
@@ -258,7 +260,7 @@ const AdminDashboard = () => {
         maxMenteesPerMentor: mentorshipSettings.maxMenteesPerMentor || maxMenteesPerMentor
       };
       
-      console.log("Sending request to /generate-matches with settings:", {
+      console.log("Sending request to /generate-matches/stream with settings:", {
         maxMenteesPerMentor: matchingData.maxMenteesPerMentor
       });
       
@@ -266,20 +268,33 @@ const AdminDashboard = () => {
       const apiUrl = process.env.REACT_APP_API_URL || "http://127.0.0.1:5002";
       console.log("Using API URL:", apiUrl);
       
-      const response = await fetch(`${apiUrl}/generate-matches`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(matchingData)
-      });
-
-      if (!response.ok) {
-        throw new Error(`Server responded with ${response.status}`);
-      }
-
-      const result = await response.json();
+      // Show each match as soon as the server streams it instead of waiting for the whole run
+      const namesById = Object.fromEntries(signups.map(signup => [signup.id, signup.name]));
+      // One match per mentee: "replace" and "retract" correct a match that was already shown
+      const streamedMatches = new Map();
+      setGenerationProgress("Starting...");
+      const result = await streamGeneratedMatches(matchingData, (eventName, data) => {
+        if (eventName === "match" || eventName === "replace" || eventName === "retract") {
+          if (eventName === "retract") {
+            streamedMatches.delete(data.menteeId);
+          } else {
+            streamedMatches.set(data.match.menteeId, {
+              ...data.match,
+              id: `pending-${data.match.menteeId}`,
+              mentee: namesById[data.match.menteeId] || data.match.menteeId,
+              mentor: namesById[data.match.mentorId] || data.match.mentorId
+            });
+          }
+          const shown = [...streamedMatches.values()];
+          setMentorshipMatches(previous => [...previous.filter(m => m.manuallyCreated), ...shown]);
+          setGenerationProgress(`${data.matched} of ${mentees.length} mentees matched`);
+        } else if (eventName === "progress") {
+          setGenerationProgress(`${data.stage.replace(/_/g, " ")} (${data.matched} matched)`);
+        }
+      }, apiUrl);
       console.log("AI Matching Response:", result);
       
-      if (result.matches && result.matches.length > 0) {
+      if (result.matched > 0) {
         // Update local settings if they changed on the server
         if (result.settings && result.settings.maxMenteesPerMentor) {
           setMaxMenteesPerMentor(result.settings.maxMenteesPerMentor);
@@ -289,7 +304,7 @@ const AdminDashboard = () => {
           });
         }
         
-        alert(`Successfully generated ${result.matches.length} matches!`);
+        alert(`Successfully generated ${result.matched} matches!`);
         
         // Refresh mentorship data
         await fetchMentorshipData();
@@ -300,6 +315,7 @@ const AdminDashboard = () => {
       console.error("Error generating matches:", error);
       alert(`Error generating matches: ${error.message}`);
     }
+    setGenerationProgress("");
     setGenerating(false);
   };
 
@@ -1110,7 +1126,7 @@ const AdminDashboard = () => {
                 style={styles.primaryButton} 
                 disabled={generating}
               >
-                {generating ? "Generating Matches..." : "Generate AI Matches"}
+                {generating ? `Generating Matches... ${generationProgress}` : "Generate AI Matches"}
               </button>
             </div>
           </div>
@@ -110,7 +110,7 @@ const MenteeDashboard = () => {
               "Content-Type": "application/json",
               "X-Requested-With": "XMLHttpRequest"
             },
-            body: JSON.stringify({ userId: user.uid }),
+            body: JSON.stringify({ userId: user.uid, includeReason: true }),
             credentials: "same-origin"
           });
           
@@ -90,7 +90,7 @@ export const getUserMatches = async (userId) => {
         'Content-Type': 'application/json',
         'X-Requested-With': 'XMLHttpRequest'
       },
-      body: JSON.stringify({ userId }),
+      body: JSON.stringify({ userId, includeReason: true }),
       credentials: 'same-origin'
     });
     
@@ -185,10 +185,11 @@ export const updateMatchStatus = async (matchId, status, userId) => {
 };
 
 /**
- * Get all mentorship matches (admin only)
- * @returns {Promise<Object>} - Object containing matches array
+ * Get one page of mentorship matches (admin only)
+ * @param {Object} options - Optional pageSize, startAfter cursor, status, cohort and includeReason
+ * @returns {Promise<Object>} - Object containing matches array and the nextCursor for the following page
  */
-export const getAllMatches = async () => {
+export const getAllMatches = async (options = {}) => {
   try {
     // Verify user is authenticated
     const user = auth.currentUser;
@@ -196,7 +197,15 @@ export const getAllMatches = async () => {
       throw new Error("User must be authenticated to access matches");
     }
 
-    const response = await fetch(`${API_URL}/get-all-matches`, {
+    const params = new URLSearchParams();
+    Object.entries(options).forEach(([key, value]) => {
+      if (value !== undefined && value !== null) {
+        params.append(key, value);
+      }
+    });
+    const query = params.toString() ? `?${params.toString()}` : '';
+
+    const response = await fetch(`${API_URL}/get-all-matches${query}`, {
       method: 'GET',
       headers: {
         'X-Requested-With': 'XMLHttpRequest',
@@ -213,21 +222,85 @@ export const getAllMatches = async () => {
     const data = await response.json();
     return {
       matches: data.matches || [],
+      nextCursor: data.nextCursor || null,
       error: null
     };
   } catch (error) {
     console.error('Error fetching all matches:', error);
     return { 
       matches: [], 
+      nextCursor: null,
       error: error.message 
     };
   }
 };
 
+/**
+ * Generate matches and receive each one as soon as the server has it (admin only)
+ * @param {Object} matchingData - Same request body as /generate-matches
+ * @param {Function} onEvent - Called as onEvent(eventName, data) for every "match", "replace", "retract",
+ *   "progress", "done" or "error" event; "replace" and "retract" correct a match sent earlier for the same mentee
+ * @param {string} apiUrl - Backend URL (defaults to REACT_APP_API_URL)
+ * @returns {Promise<Object>} - Data of the final "done" event
+ */
+export const streamGeneratedMatches = async (matchingData, onEvent, apiUrl = API_URL) => {
+  const response = await fetch(`${apiUrl}/generate-matches/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'Accept': 'text/event-stream',
+      'X-Requested-With': 'XMLHttpRequest'
+    },
+    body: JSON.stringify(matchingData)
+  });
+
+  if (!response.ok) {
+    const errorText = await response.text();
+    throw new Error(`Server error: ${response.status} - ${errorText}`);
+  }
+
+  // Server-Sent Events arrive as "event: name\ndata: json" blocks separated by blank lines
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let summary = null;
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let eventName = 'message';
+      let data = '';
+      block.split('\n').forEach((line) => {
+        if (line.startsWith('event: ')) eventName = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      });
+      if (!data) continue; // keepalive comment
+
+      const payload = JSON.parse(data);
+      onEvent(eventName, payload);
+      if (eventName === 'done') summary = payload;
+      if (eventName === 'error') throw new Error(payload.error || 'Match generation failed');
+    }
+  }
+
+  if (!summary) {
+    throw new Error('Match stream ended before the run finished');
+  }
+  return summary;
+};
+
 // Export the API as a default object
 export default {
   checkExistingSignup,
   getUserMatches,
   updateMatchStatus,
-  getAllMatches
+  getAllMatches,
+  streamGeneratedMatches
 };